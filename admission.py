@@ -0,0 +1,200 @@
+"""
+Admission control for DIA.
+Bounds the number of in-flight and queued /api/process requests and sheds
+load early (HTTP 429 + Retry-After) when the queue stops draining, so that
+latency stays bounded when the LLM backend slows down.
+
+Queue waits follow the CoDel idea used for RPC servers: while the queue has
+drained recently a request may wait up to `interval`; once it has stayed
+non-empty for a whole interval the server is overloaded and requests only
+wait up to `target` before being rejected.
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('granted', 'wake', 'enqueued')
+
+    def __init__(self, wake, enqueued: float):
+        self.granted = False
+        self.wake = wake
+        self.enqueued = enqueued
+
+
+class AdmissionController:
+    """In-flight and queue limits with CoDel-style latency-aware shedding."""
+
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64,
+                 target_ms: float = 500, interval_ms: float = 10000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.target = target_ms / 1000
+        self.interval = interval_ms / 1000
+
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+        self._in_flight = 0
+        self._last_empty = time.monotonic()
+        self._service_time = 5.0  # EWMA of request service time (seconds)
+        self._counters = {
+            'admitted': 0,
+            'completed': 0,
+            'shed_queue_full': 0,
+            'shed_queue_timeout': 0
+        }
+        self._max_queue_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Internal state (call with self._lock held)
+    # ------------------------------------------------------------------
+
+    def _try_admit(self, now: float) -> bool:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._last_empty = now
+            self._counters['admitted'] += 1
+            return True
+        return False
+
+    def _wait_limit(self, now: float) -> float:
+        overloaded = now - self._last_empty > self.interval
+        return self.target if overloaded else self.interval
+
+    def _retry_after(self) -> int:
+        backlog = (len(self._waiters) + self._in_flight) / max(1, self.max_in_flight)
+        return int(min(60, max(1, round(backlog * self._service_time))))
+
+    def _shed(self, reason: str) -> Overloaded:
+        self._counters[f'shed_{reason}'] += 1
+        return Overloaded(reason, self._retry_after())
+
+    def _enqueue(self, wake, now: float) -> _Waiter:
+        if len(self._waiters) >= self.max_queue:
+            raise self._shed('queue_full')
+        waiter = _Waiter(wake, now)
+        self._waiters.append(waiter)
+        return waiter
+
+    def _settle(self, waiter: _Waiter) -> None:
+        """After waiting: either the slot was handed over, or the request is shed."""
+        if waiter.granted:
+            self._counters['admitted'] += 1
+            self._max_queue_wait = max(self._max_queue_wait, time.monotonic() - waiter.enqueued)
+            return
+        self._waiters.remove(waiter)
+        raise self._shed('queue_timeout')
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def acquire(self) -> None:
+        """Wait for an in-flight slot (blocking). Raises Overloaded when shed."""
+        now = time.monotonic()
+        with self._lock:
+            if self._try_admit(now):
+                return
+            event = threading.Event()
+            waiter = self._enqueue(event.set, now)
+            limit = self._wait_limit(now)
+
+        event.wait(limit)
+        with self._lock:
+            self._settle(waiter)
+
+    async def acquire_async(self) -> None:
+        """Wait for an in-flight slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+        now = time.monotonic()
+        with self._lock:
+            if self._try_admit(now):
+                return
+            waiter = self._enqueue(wake, now)
+            limit = self._wait_limit(now)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), limit)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away while queued: give back a slot handed to us
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+                self._counters['admitted'] += 1
+            self.release(0.0)
+            raise
+
+        with self._lock:
+            self._settle(waiter)
+
+    def release(self, service_time: float) -> None:
+        """Free a slot, handing it straight to the oldest queued request."""
+        with self._lock:
+            self._counters['completed'] += 1
+            if service_time > 0:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._in_flight -= 1
+                self._last_empty = time.monotonic()
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight slot for the duration of a request."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def slot_async(self):
+        """Async version of slot()."""
+        await self.acquire_async()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def metrics(self) -> Dict:
+        """Snapshot of limits, current load and shedding counters."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queued': len(self._waiters),
+                'overloaded': bool(self._waiters) and now - self._last_empty > self.interval,
+                'avg_service_ms': round(self._service_time * 1000, 1),
+                'max_queue_wait_ms': round(self._max_queue_wait * 1000, 1),
+                **self._counters
+            }
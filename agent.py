@@ -4,57 +4,137 @@ Production-ready document processing with LLM integration.
 """
 
 import os
+import re
 import json
-from typing import Dict, Optional
+import time
+import random
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
-import PyPDF2
-from docx import Document
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from answer_cache import SemanticAnswerCache
+from citations import CitationIndex, verify
+from compare import compare_pair, delta_rows, render_rows, render_similarity
+from corpus import CorpusIndex
+from dedup import MinHashIndex, document_diff
+from documents import DOC_ID, PATH, DocumentHandle, DocumentNotFound, DocumentRecord, DocumentRegistry, parse_handle
+from extraction import NOT_AVAILABLE, chunk_ranges, format_fields, merge_fields, parse_fields
+from lineage import LineageStore
+from normalize import estimate_tokens, normalize_pages_with_offsets
+from page_index import PageIndex
+from parsers import parser_registry
+from persistence import text_fingerprint
+from profiler import ProfileStore, SamplingProfiler, call_in_profile
+from scheduler import BATCH, FairScheduler, current_tenant, tenant_context
+from shared_cache import SharedCache
+from storage import upload_store
+from tracing import tracer
+from transport import LLMTransport, request_key
+from sections import section_hash, split_sections
+from summary_tree import FANOUT, IdleBuilder, SummaryTree, group_children, node_key
 
 # Load environment variables
 load_dotenv()
 
+# Local cache for indexes and reusable results (use /tmp on serverless platforms)
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "/tmp/dia_cache" if os.environ.get("VERCEL") else ".dia_cache")
+
+# Set for requests served by process_async(): LLM calls use AsyncOpenAI instead of a worker thread
+_native_async = contextvars.ContextVar("dia_native_async", default=False)
+
+# Background summary tree builds run as this tenant at batch priority
+SUMMARY_TREE_TENANT = "summary-tree"
+# Largest outline of a summary tree put in a prompt
+SUMMARY_OUTLINE_CHARS = 6000
+
+# Instruction before the query and closing instruction of qa and extract prompts
+_ANSWER_PROMPTS = {
+    "qa": (
+        "Based ONLY on the provided document, answer this question:",
+        'If the answer is not available in the document, respond: "Not available in provided document".\n'
+        'Be precise and cite relevant parts of the document.'
+    ),
+    "extract": (
+        "Extract the following information from the document:",
+        'Provide structured, precise extraction. If information is not available, state: '
+        '"Not available in provided document".'
+    )
+}
+
+# Phrases by which the model says the document lacks something (one case-insensitive
+# scan instead of lowercasing the output once per phrase)
+_MISSING_INFO = re.compile(
+    r"not available in provided document|information is missing|"
+    r"not mentioned in the document|unclear from the document",
+    re.IGNORECASE
+)
+
+
+def _join_pages(pages: List[str]) -> Tuple[str, None, List[int]]:
+    """Join raw pages with newlines, keeping the offset of each page."""
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1
+    text = "\n".join(pages)
+    # strip() drops leading whitespace, so shift the offsets with it
+    lead = len(text) - len(text.lstrip())
+    text = text.strip()
+    return text, None, [min(max(0, o - lead), len(text)) for o in offsets]
+
 
 class DocumentParser:
     """Handle document parsing for various formats."""
     
+    @staticmethod
+    def parse_pdf_pages(file_path: str) -> List[str]:
+        """Extract text from PDF file, one entry per page."""
+        return DocumentParser.parse_pages(file_path)
+    
     @staticmethod
     def parse_pdf(file_path: str) -> str:
         """Extract text from PDF file."""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
-        except Exception as e:
-            raise Exception(f"Error parsing PDF: {str(e)}")
+        return "\n".join(DocumentParser.parse_pdf_pages(file_path)).strip()
     
     @staticmethod
     def parse_docx(file_path: str) -> str:
         """Extract text from DOCX file."""
-        try:
-            doc = Document(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error parsing DOCX: {str(e)}")
+        return "\n".join(DocumentParser.parse_pages(file_path)).strip()
+    
+    @staticmethod
+    def parse_pages(file_path: str) -> List[str]:
+        """Parse file into pages with the selected backend for its format."""
+        return parser_registry.parse_pages(file_path)
+    
+    @staticmethod
+    def parse_file_with_stats(file_path: str, normalize: bool = True) -> Tuple[str, Optional[Dict]]:
+        """Parse file and strip page furniture, reporting tokens saved."""
+        text, stats, _ = DocumentParser.parse_document(file_path, normalize)
+        return text, stats
+    
+    @staticmethod
+    def parse_document(file_path: str, normalize: bool = True,
+                       pages: Optional[List[str]] = None) -> Tuple[str, Optional[Dict], List[int]]:
+        """Parse file into text, normalization stats and the offset of each page in the text."""
+        with tracer.span("parse", format=Path(file_path).suffix.lower().lstrip("."),
+                         bytes=os.path.getsize(file_path), pages_given=pages is not None) as span:
+            if pages is None:
+                pages = DocumentParser.parse_pages(file_path)
+            span.set(backend=parser_registry.backend_for(file_path).name, pages=len(pages))
+            if not normalize:
+                return _join_pages(pages)
+            text, stats, offsets = normalize_pages_with_offsets(pages)
+            span.set(chars=len(text), tokens=stats["tokens_after"])
+            return text, stats, offsets
     
     @staticmethod
-    def parse_file(file_path: str) -> str:
+    def parse_file(file_path: str, normalize: bool = True) -> str:
         """Parse file based on extension."""
-        ext = Path(file_path).suffix.lower()
-        if ext == '.pdf':
-            return DocumentParser.parse_pdf(file_path)
-        elif ext == '.docx':
-            return DocumentParser.parse_docx(file_path)
-        elif ext == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        else:
-            raise ValueError(f"Unsupported file format: {ext}")
+        return DocumentParser.parse_file_with_stats(file_path, normalize)[0]
 
 
 class DocumentIntelligenceAgent:
@@ -66,32 +146,242 @@ class DocumentIntelligenceAgent:
         
         # Initialize OpenAI client
         api_key = os.getenv("OPENAI_API_KEY")
+        self.model = os.getenv("OPENAI_MODEL", "gpt-4")
+        self.temperature = float(os.getenv("TEMPERATURE", "0.3"))
+        
+        # Live, record or replay LLM calls (replay needs no API key)
+        self.transport = LLMTransport(
+            mode=os.getenv("LLM_TRANSPORT", "live"),
+            cassette_path=os.getenv("LLM_CASSETTE"),
+            replay_latency=os.getenv("LLM_REPLAY_LATENCY", "recorded")
+        )
+        
         if api_key:
             self.client = OpenAI(api_key=api_key)
-            self.model = os.getenv("OPENAI_MODEL", "gpt-4")
+            self.async_client = AsyncOpenAI(api_key=api_key)
         else:
             self.client = None
-            print("Warning: OPENAI_API_KEY not found. Using mock responses.")
+            self.async_client = None
+            if not self.transport.replaying:
+                print("Warning: OPENAI_API_KEY not found. Using mock responses.")
+        
+        # Strip headers, footers and page numbers before prompting
+        self.normalize_documents = os.getenv("NORMALIZE_DOCUMENTS", "true").lower() == "true"
+        
+        # Parsed text, section indexes and LLM responses shared by all workers on the host
+        self.shared_cache = SharedCache(
+            os.path.join(CACHE_FOLDER, "shared_cache.db"),
+            max_bytes=int(os.getenv("SHARED_CACHE_MAX_MB", "512")) * 1024 * 1024
+        )
+        self.llm_cache_ttl = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "604800"))
+        
+        # Near-duplicate index for reusing results of re-issued documents
+        self.dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+        self.dedup_max_diff_lines = int(os.getenv("DEDUP_MAX_DIFF_LINES", "40"))
+        self.dedup_index = MinHashIndex(self.shared_cache, threshold=float(os.getenv("DEDUP_THRESHOLD", "0.9")))
+        
+        # Version lineage for incremental re-summarization of long documents
+        self.lineage_store = LineageStore(self.shared_cache)
+        self.lineage_threshold = float(os.getenv("LINEAGE_THRESHOLD", "0.6"))
+        self.incremental_min_chars = int(os.getenv("INCREMENTAL_SUMMARY_MIN_CHARS", "12000"))
+        
+        # Map-and-merge extraction over chunks of large documents
+        self.extract_chunk_min_chars = int(os.getenv("EXTRACT_CHUNK_MIN_CHARS", "24000"))
+        self.extract_chunk_chars = int(os.getenv("EXTRACT_CHUNK_CHARS", "8000"))
+        
+        # qa and extract on long PDFs not parsed yet read only the pages the query needs
+        self.lazy_pdf_min_pages = int(os.getenv("LAZY_PDF_MIN_PAGES", "50"))
+        self.lazy_pdf_pages = int(os.getenv("LAZY_PDF_PAGES", "4"))
+        self.lazy_pdf_scan_pages = int(os.getenv("LAZY_PDF_SCAN_PAGES", "48"))
+        
+        # Check the quotes and figures of qa and extract answers against the document
+        self.citation_check = os.getenv("CITATION_CHECK", "true").lower() == "true"
+        self.citation_threshold = float(os.getenv("CITATION_MATCH_THRESHOLD", "0.8"))
+        
+        # Paraphrase-tolerant answer cache for qa and extract
+        self.semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.answer_cache = SemanticAnswerCache(
+            self.shared_cache,
+            os.path.join(CACHE_FOLDER, "answers"),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+        )
+        
+        # Full-text index of every parsed upload for cross-document search
+        self.corpus_index = CorpusIndex(os.path.join(CACHE_FOLDER, "corpus.db"))
+        
+        # Page count, per-page text and keyword signatures of PDFs read page by page
+        self.page_index = PageIndex(self.shared_cache)
+        
+        # "translate": generate once in English and translate the short output for or/bilingual,
+        # so switching language reuses the English result; "direct": generate in each language
+        self.language_rendering = os.getenv("LANGUAGE_RENDERING", "translate")
+        if self.language_rendering not in ("translate", "direct"):
+            raise ValueError(f"Invalid LANGUAGE_RENDERING: {self.language_rendering}. Must be one of: translate, direct")
+        
+        # Resolved documents by doc_id, so clients can refer back to them without re-sending
+        self.document_registry = DocumentRegistry(
+            self.shared_cache,
+            max_docs=int(os.getenv("DOCUMENT_REGISTRY_SIZE", "256"))
+        )
+        
+        # Trace spans (off, jsonl or otlp) appended to TRACE_FILE
+        tracer.configure(
+            mode=os.getenv("TRACE_EXPORT", "off"),
+            path=os.getenv("TRACE_FILE", os.path.join(CACHE_FOLDER, "traces.jsonl")),
+            max_bytes=int(os.getenv("TRACE_MAX_MB", "50")) * 1024 * 1024
+        )
+        
+        # Opt-in sampling profiler for slow requests
+        self.profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.profile_interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.profile_store = ProfileStore(
+            os.path.join(CACHE_FOLDER, "profiles"),
+            max_files=int(os.getenv("PROFILE_MAX_FILES", "100"))
+        )
+        
+        # Parser engine per format: config override, else the calibrated fastest
+        parser_registry.configure(
+            overrides=self.config.get("parsers", {}),
+            calibration_path=os.path.join(CACHE_FOLDER, "parser_calibration.json")
+        )
+        
+        # Fair sharing of LLM capacity between tenants (policies in config.json)
+        self.llm_scheduler = FairScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            policies=self.config.get("tenants", {})
+        )
+        
+        # Summary trees of long documents: "idle" also builds them in the background after
+        # upload while the LLM has nothing else to do; "off" builds them only when summarizing
+        self.summary_tree_build = os.getenv("SUMMARY_TREE_BUILD", "off" if os.environ.get("VERCEL") else "idle")
+        if self.summary_tree_build not in ("idle", "off"):
+            raise ValueError(f"Invalid SUMMARY_TREE_BUILD: {self.summary_tree_build}. Must be one of: idle, off")
+        self.tree_builder = IdleBuilder(self._build_summary_tree_job, idle=self.llm_scheduler.idle)
     
-    def process(self, task: str, language: str, document_1: str, 
-                document_2: Optional[str] = None, query: Optional[str] = None) -> Dict[str, str]:
+    def process(self, task: str, language: str, document_1: Union[str, Dict, DocumentHandle],
+                document_2: Union[str, Dict, DocumentHandle, None] = None, query: Optional[str] = None,
+                profile: Optional[bool] = None,
+                documents: Optional[List[Union[str, Dict, DocumentHandle]]] = None) -> Dict[str, str]:
         """
         Process documents based on task type.
         
         Args:
             task: One of [summarize, extract, compare, qa]
             language: One of [en, or, bilingual]
-            document_1: First document text or file path
-            document_2: Second document text or file path (for compare)
+            document_1: First document: {"doc_id"}, {"path"} or {"text"} handle (plain strings are
+                treated as a path if they name an existing file, else as text)
+            document_2: Second document handle (for compare)
             query: Query string (for extract/qa)
+            profile: Profile this request (None: decided by PROFILE_SAMPLE_RATE)
+            documents: Further document handles for an N-way compare against document_1
         
         Returns:
-            Dict with 'output' and 'missing_info' keys
+            Dict with 'output' and 'missing_info' keys, and 'documents' with the doc_id of each input
+        """
+        return self._run_sync(self._process(task, language, document_1, document_2, query, profile, documents,
+                                            native_async=False))
+    
+    async def process_async(self, task: str, language: str, document_1: Union[str, Dict, DocumentHandle],
+                            document_2: Union[str, Dict, DocumentHandle, None] = None, query: Optional[str] = None,
+                            profile: Optional[bool] = None,
+                            documents: Optional[List[Union[str, Dict, DocumentHandle]]] = None) -> Dict[str, str]:
+        """
+        Async version of process() for ASGI serving.
+        
+        LLM calls are awaited on AsyncOpenAI, so an in-flight request holds no
+        thread; parsing and other blocking work runs in the default executor.
         """
-        # Parse documents if they are file paths
-        doc1_text = self._get_document_text(document_1)
-        doc2_text = self._get_document_text(document_2) if document_2 else None
+        return await self._process(task, language, document_1, document_2, query, profile, documents,
+                                   native_async=True)
+    
+    @staticmethod
+    def _run_sync(coro):
+        """Run a coroutine to completion from synchronous code."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # Already inside an event loop (e.g. a notebook): use a helper thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+    
+    @staticmethod
+    async def _run_blocking(func, *args):
+        """Run blocking work (parsing, hashing) off the event loop, keeping the request context."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(context.run, call_in_profile, func, *args)
+        )
+    
+    async def _process(self, task: str, language: str, document_1, document_2, query: Optional[str],
+                       profile: Optional[bool], documents: Optional[list], native_async: bool) -> Dict:
+        """Shared implementation of process() and process_async()."""
+        _native_async.set(native_async)
+        document_1 = parse_handle(document_1)
+        document_2 = parse_handle(document_2) if document_2 else None
+        more = [parse_handle(d) for d in documents or []]
+        
+        if profile is None:
+            profile = random.random() < self.profile_sample_rate
+        if not profile:
+            return await self._process_documents(task, language, document_1, document_2, query, more)
+        
+        profiler = SamplingProfiler(interval=self.profile_interval, shared_loop=native_async)
+        with profiler.activate():
+            result = await self._process_documents(task, language, document_1, document_2, query, more)
+        meta = {
+            "task": task,
+            "language": language,
+            "documents": [d.describe() for d in (document_1, document_2, *more) if d],
+            "native_async": native_async
+        }
+        result["profile_id"] = await self._run_blocking(self.profile_store.save, profiler, meta)
+        return result
+    
+    async def _process_documents(self, task: str, language: str, document_1: DocumentHandle,
+                                 document_2: Optional[DocumentHandle], query: Optional[str],
+                                 more: List[DocumentHandle]) -> Dict:
+        """Parse the inputs, run the task and attach normalization stats."""
+        with tracer.span("process", task=task, language=language, model=self.model,
+                         native_async=_native_async.get()):
+            return await self._process_traced(task, language, document_1, document_2, query, more)
+    
+    async def _process_traced(self, task: str, language: str, document_1: DocumentHandle,
+                              document_2: Optional[DocumentHandle], query: Optional[str],
+                              more: List[DocumentHandle]) -> Dict:
+        """Body of _process_documents(), inside its trace span."""
+        if task in _ANSWER_PROMPTS and query and document_2 is None and document_1.kind == PATH:
+            lazy = await self._answer_from_pages(task, language, document_1.value, query)
+            if lazy is not None:
+                return lazy
+        
+        handles = [d for d in (document_1, document_2) if d]
+        if task == "compare":
+            handles.extend(more)
+        records = await asyncio.gather(*(self._run_blocking(self._load_document, h) for h in handles))
+        doc2_text = records[1].text if len(records) > 1 else None
+        # Indexed for citation checks while the LLM answers (nothing to check without an LLM)
+        citation_index = None
+        if self.citation_check and task in _ANSWER_PROMPTS and (self.async_client or self.transport.replaying):
+            citation_index = asyncio.ensure_future(self._run_blocking(self._citation_index, records[0]))
+        
+        if task == "compare" and len(records) > 2:
+            result = await self._compare_many(records, query, self._generation_language(language))
+        else:
+            result = await self._run_task(task, self._generation_language(language), records[0].text, doc2_text, query)
+        if citation_index is not None:
+            result = await self._verify_citations(result, await citation_index)
+        result = await self._render_language(result, language)
+        result["documents"] = [record.summary() for record in records]
         
+        normalization = self._combine_normalization_stats(*(record.stats for record in records))
+        if normalization:
+            result["normalization"] = normalization
+        return result
+    
+    async def _run_task(self, task: str, language: str, doc1_text: str,
+                  doc2_text: Optional[str], query: Optional[str]) -> Dict:
+        """Dispatch to the task handler, reusing earlier results when possible."""
         handlers = {
             "summarize": self._summarize,
             "extract": self._extract,
@@ -99,31 +389,446 @@ class DocumentIntelligenceAgent:
             "qa": self._qa
         }
         
-        return handlers[task](doc1_text, doc2_text, query, language)
+        if task == "compare" or not self.dedup_enabled:
+            return await handlers[task](doc1_text, doc2_text, query, language)
+        
+        # Reuse results of identical documents; update those of near-identical ones
+        doc_id = text_fingerprint(doc1_text)
+        result_key = f"{task}|{language}|{(query or '').strip().lower()}"
+        with tracer.span("dedup_lookup") as span:
+            reused = await self._run_blocking(self._find_reusable_result, doc_id, doc1_text, result_key)
+            near = None if reused else await self._run_blocking(
+                self._find_near_duplicate, doc_id, doc1_text, result_key)
+            span.set(hit=reused is not None, near_duplicate=near is not None)
+        if reused:
+            return reused
+        
+        if near:
+            result = await self._update_near_duplicate(task, near, query, language)
+        else:
+            result = await handlers[task](doc1_text, doc2_text, query, language)
+        if self.is_reusable(result):
+            self.dedup_index.store_result(doc_id, result_key, dict(result))
+        return result
+    
+    def _find_reusable_result(self, doc_id: str, text: str, result_key: str) -> Optional[Dict]:
+        """Index the document, then find a stored result for the identical document."""
+        signature = self.dedup_index.get_signature(doc_id) or self.dedup_index.signature(text)
+        self.dedup_index.add(doc_id, signature)
+        
+        cached = self.dedup_index.get_result(doc_id, result_key)
+        if cached:
+            cached["cache_note"] = "Reused the result of an identical document processed earlier."
+        return cached
+    
+    def _find_near_duplicate(self, doc_id: str, text: str, result_key: str) -> Optional[Dict]:
+        """
+        A near-duplicate with a stored result: its id, similarity, the changed
+        lines and its result's output.
+        """
+        signature = self.dedup_index.get_signature(doc_id) or self.dedup_index.signature(text)
+        for match_id, score in self.dedup_index.find_similar(signature, exclude=doc_id):
+            prior = self.dedup_index.get_result(match_id, result_key)
+            # Every indexed document was registered, so its text is in the shared cache
+            prior_record = self.document_registry.get(match_id) if prior else None
+            if prior_record is None:
+                continue
+            
+            changes = document_diff(prior_record.text, text, self.dedup_max_diff_lines)
+            if not changes:
+                continue
+            return {
+                "doc_id": match_id,
+                "similarity": round(score, 3),
+                "changes": changes,
+                "output": prior["output"]
+            }
+        return None
+    
+    async def _update_near_duplicate(self, task: str, near: Dict, query: Optional[str], lang: str) -> Dict:
+        """
+        Result for a near-duplicate of an earlier document: the earlier result
+        is sent with the changed lines only, and the LLM updates whatever they
+        affect (e.g. a changed deadline) instead of reading the whole document.
+        """
+        request = {
+            "summarize": "Summarize the document.",
+            "qa": f"Answer this question about the document: {query}",
+            "extract": f"Extract the following information from the document: {query}"
+        }[task]
+        closing = _ANSWER_PROMPTS[task][1] if task in _ANSWER_PROMPTS else ""
+        changes = "\n".join(near["changes"])
+        user_prompt = f"""
+{self._get_language_instruction(lang)}
+
+An earlier version of a government document was processed with this request:
+{request}
+
+Result for the earlier version:
+{near["output"]}
+
+The new version differs from the earlier one only in these lines ('-' removed, '+' added):
+{changes}
+
+Write the result for the new version. Keep what the changes do not affect, and correct every
+statement they do affect (dates, amounts, names, conditions).
+{closing}
+"""
+        
+        output = await self._complete(self.config['system_prompt'], user_prompt)
+        return {
+            "output": output,
+            "missing_info": self._check_missing_info(output),
+            "cache_note": (
+                f"This document is a near-duplicate ({near['similarity']:.0%} similar) of one processed earlier; "
+                f"its result was updated for the {len(near['changes'])} changed lines listed below."
+            ),
+            "near_duplicate": {
+                "doc_id": near["doc_id"],
+                "similarity": near["similarity"],
+                "changes": near["changes"]
+            }
+        }
+    
+    @staticmethod
+    def is_reusable(result: Dict) -> bool:
+        """Whether a result is a successful LLM answer, worth caching and storing (False for LLM errors)."""
+        output = result.get("output", "")
+        return bool(output) and not output.startswith(("Error calling LLM", "LLM not configured"))
+    
+    def search_corpus(self, query: str, limit: int = 10) -> list:
+        """Ranked passage search across every parsed document."""
+        return self.corpus_index.search(query, limit=limit)
+    
+    def corpus_qa(self, query: str, language: str, limit: int = 8) -> Dict:
+        """Answer a question from passages retrieved across the whole corpus."""
+        return self._run_sync(self._corpus_qa(query, language, limit, native_async=False))
+    
+    async def corpus_qa_async(self, query: str, language: str, limit: int = 8) -> Dict:
+        """Async version of corpus_qa()."""
+        return await self._corpus_qa(query, language, limit, native_async=True)
+    
+    async def _corpus_qa(self, query: str, language: str, limit: int, native_async: bool) -> Dict:
+        """Shared implementation of corpus_qa() and corpus_qa_async()."""
+        _native_async.set(native_async)
+        if not query:
+            return {
+                "output": "",
+                "missing_info": "Query required for Q&A"
+            }
+        
+        passages = await self._run_blocking(self.search_corpus, query, limit)
+        if not passages:
+            return {
+                "output": "Not available in provided document",
+                "missing_info": "No indexed document matches the question",
+                "sources": []
+            }
+        
+        system_prompt = self.config['system_prompt']
+        lang_instruction = self._get_language_instruction(self._generation_language(language))
+        context = "\n\n".join(
+            f"[Source {i}: {p['source'] or p['doc_id'][:12]}, part {p['section'] + 1}]\n{p['text']}"
+            for i, p in enumerate(passages, 1)
+        )
+        
+        user_prompt = f"""
+{lang_instruction}
+
+Based ONLY on the passages below, retrieved from several government documents, answer this question:
+{query}
+
+Passages:
+{context}
+
+If the answer is not available in the passages, respond: "Not available in provided document".
+Cite the source number (e.g. [Source 2]) for every fact you use.
+"""
+        
+        output = await self._complete(system_prompt, user_prompt)
+        return await self._render_language({
+            "output": output,
+            "missing_info": self._check_missing_info(output),
+            "sources": [
+                {"source": p["source"], "doc_id": p["doc_id"], "section": p["section"], "snippet": p["snippet"]}
+                for p in passages
+            ]
+        }, language)
+    
+    def _get_document_text(self, doc_input: Union[str, Dict, DocumentHandle]) -> str:
+        """Get document text for a handle (doc_id, file path or direct text)."""
+        return self._load_document(parse_handle(doc_input)).text
+    
+    def _load_document(self, handle: DocumentHandle) -> DocumentRecord:
+        """Resolve a handle to a registered document, parsing and normalizing it if needed."""
+        with tracer.span("load_document", kind=handle.kind) as span:
+            if handle.kind == DOC_ID:
+                record = self.document_registry.get(handle.value)
+                if record is None:
+                    raise DocumentNotFound(handle.value)
+                span.set(source=record.source, chars=len(record.text), registered=True)
+                return record
+            
+            if handle.kind == PATH:
+                upload_store.touch(handle.value)
+                record = self.register_parsed(handle.value, *self._parse_file_shared(handle.value))
+            else:
+                if self.normalize_documents:
+                    text, stats, offsets = normalize_pages_with_offsets(handle.value.split('\f'))
+                else:
+                    text, stats, offsets = handle.value, None, [0]
+                record = self.document_registry.register(text, "text", stats, offsets)
+            span.set(source=record.source, chars=len(record.text), doc_id=record.doc_id)
+            return record
+    
+    def register_parsed(self, file_path: str, text: str, stats: Optional[Dict],
+                        page_offsets: List[int]) -> DocumentRecord:
+        """Register a parsed file (e.g. parsed in another process) and index it for search."""
+        source = Path(file_path).name
+        record = self.document_registry.register(text, source, stats, page_offsets)
+        self.corpus_index.add_document(record.doc_id, text, source=source)
+        if upload_store.manages(file_path):
+            # Remembered so the upload's derived caches go when it is evicted
+            self.shared_cache.set("uploads", str(Path(file_path).resolve()), record.doc_id)
+        return record
+    
+    def forget_upload(self, file_path: str) -> None:
+        """Drop the caches derived from an evicted upload: parsed text, indexes, lineage and answers."""
+        path = str(Path(file_path).resolve())
+        self.shared_cache.delete("parsed", f"{path}:", prefix=True)
+        self.page_index.forget(file_path)
+        self.answer_cache.forget(self._page_answer_prefix(file_path), prefix=True)
+        doc_id = self.shared_cache.get("uploads", path)
+        if doc_id is None:
+            return
+        self.shared_cache.delete("uploads", path)
+        self.shared_cache.delete("sections", doc_id)
+        self.shared_cache.delete("summary_tree", doc_id)
+        self.shared_cache.delete("summary_tree_skipped", doc_id)
+        self.document_registry.forget(doc_id)
+        self.corpus_index.remove_document(doc_id)
+        self.dedup_index.remove(doc_id)
+        self.lineage_store.forget(doc_id)
+        self.answer_cache.forget(doc_id)
+    
+    def _parse_file_shared(self, file_path: str) -> Tuple[str, Optional[Dict], List[int]]:
+        """Parse a file once per host: results are shared by all workers."""
+        key = self._parsed_key(file_path)
+        cached = self.shared_cache.get("parsed", key)
+        if cached is not None:
+            with tracer.span("parse", backend=parser_registry.backend_for(file_path).name, cached=True,
+                             bytes=os.path.getsize(file_path)):
+                return cached["text"], cached["stats"], cached.get("page_offsets", [0])
+        
+        # Pages already read for earlier queries are not extracted again
+        pages = self.page_index.complete(file_path)
+        text, stats, offsets = DocumentParser.parse_document(file_path, self.normalize_documents, pages)
+        self.shared_cache.set("parsed", key, {"text": text, "stats": stats, "page_offsets": offsets})
+        return text, stats, offsets
+    
+    def _citation_index(self, record: DocumentRecord) -> CitationIndex:
+        """Citation index of a document, built once per record."""
+        return self.document_registry.derive(record, "citations",
+                                             lambda text: CitationIndex(text, record.page_offsets))
+    
+    async def _verify_citations(self, result: Dict, index: CitationIndex) -> Dict:
+        """Attach the verified and unverified quotes and figures of an answer."""
+        if not self.is_reusable(result):
+            return result
+        with tracer.span("verify_citations") as span:
+            citations = verify(result["output"], index, self.citation_threshold)
+            span.set(verified=len(citations["verified"]), unverified=len(citations["unverified"]))
+        return dict(result, citations=citations)
+    
+    def _parsed_key(self, file_path: str) -> str:
+        """Key of a file version's parsed text in the shared cache."""
+        stat = os.stat(file_path)
+        backend = parser_registry.backend_for(file_path).name
+        return f"{Path(file_path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{backend}:{self.normalize_documents}"
+    
+    async def _answer_from_pages(self, task: str, language: str, file_path: str, query: str) -> Optional[Dict]:
+        """
+        Answer qa or extract on a long PDF from the few pages the query needs.
+        
+        Used only until the file is parsed in full (after which the summary
+        tree and the whole text serve it). Returns None, and the caller parses
+        the whole file, when the PDF is short, its parser cannot read single
+        pages, no page matches the query or the pages do not hold the answer;
+        the pages read so far are reused by that parse.
+        """
+        if self.lazy_pdf_min_pages <= 0 or self.page_index.file_key(file_path) is None:
+            return None
+        if await self._run_blocking(self.shared_cache.contains, "parsed", self._parsed_key(file_path)):
+            return None
+        count = await self._run_blocking(self.page_index.page_count, file_path)
+        if count < self.lazy_pdf_min_pages:
+            return None
+        
+        upload_store.touch(file_path)
+        lang = self._generation_language(language)
+        answer_id = self._page_answer_id(file_path)
+        documents = [{"doc_id": None, "source": Path(file_path).name, "pages": count}]
+        cached = await self._cached_answer(task, None, query, lang, doc_id=answer_id)
+        if cached:
+            result = await self._render_language(cached, language)
+            result["documents"] = documents
+            return result
+        
+        with tracer.span("page_index.select", pages=count) as span:
+            indexes, scanned = await self._run_blocking(
+                self.page_index.select, file_path, query, self.lazy_pdf_pages, self.lazy_pdf_scan_pages
+            )
+            span.set(selected=len(indexes), scanned=scanned)
+        if not indexes:
+            return None
+        texts = await self._run_blocking(self.page_index.read, file_path, indexes)
+        pages_text, _, page_offsets = _join_pages([texts[i].strip() for i in indexes])
+        
+        instruction, closing = _ANSWER_PROMPTS[task]
+        context = "\n\n".join(f"[Page {i + 1} of {count}]\n{texts[i].strip()}" for i in indexes)
+        user_prompt = f"""
+{self._get_language_instruction(lang)}
+
+{instruction}
+{query}
+
+Pages of the document:
+{context}
+
+{closing}
+"""
+        
+        output = await self._complete(self.config['system_prompt'], user_prompt)
+        missing_info = self._check_missing_info(output)
+        if missing_info or not self.is_reusable({"output": output}):
+            return None
+        # Parse the whole file for follow-up requests while the LLM is idle
+        self.schedule_summary_tree({"path": file_path})
+        result = {
+            "output": output,
+            "missing_info": missing_info,
+            "pages": {"used": [i + 1 for i in indexes], "read": scanned, "total": count}
+        }
+        await self._remember_answer(task, None, query, lang, result, doc_id=answer_id)
+        if self.citation_check and self.is_reusable(result):
+            index = await self._run_blocking(CitationIndex, pages_text, page_offsets, [i + 1 for i in indexes])
+            result = await self._verify_citations(result, index)
+        result = await self._render_language(result, language)
+        result["documents"] = documents
+        return result
+    
+    def _page_answer_id(self, file_path: str) -> str:
+        """Answer cache id of a PDF version answered page by page; forget_upload drops it by its path part."""
+        version = text_fingerprint(self.page_index.file_key(file_path))[:16]
+        return f"{self._page_answer_prefix(file_path)}{version}"
+    
+    @staticmethod
+    def _page_answer_prefix(file_path: str) -> str:
+        return f"pages:{text_fingerprint(str(Path(file_path).resolve()))}:"
+    
+    def _split_sections_shared(self, text: str) -> List[str]:
+        """Section index of a document, kept on its registry record and computed once per host."""
+        record = self.document_registry.find(text)
+        if record is not None:
+            return self.document_registry.derive(record, "sections", self._split_sections_cached)
+        return self._split_sections_cached(text)
+    
+    def _split_sections_cached(self, text: str) -> List[str]:
+        key = text_fingerprint(text)
+        sections = self.shared_cache.get("sections", key)
+        if sections is None:
+            sections = split_sections(text)
+            self.shared_cache.set("sections", key, sections)
+        return sections
+    
+    @staticmethod
+    def _combine_normalization_stats(*stats: Optional[Dict]) -> Optional[Dict]:
+        """Sum normalization stats across the documents of a request."""
+        stats = [s for s in stats if s]
+        if not stats:
+            return None
+        return {key: sum(s[key] for s in stats) for key in stats[0]}
+    
+    async def _complete(self, system_prompt: str, user_prompt: str) -> str:
+        """Call the LLM without blocking the event loop, in the tenant's fair share."""
+        tenant, priority = current_tenant()
+        cost = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        with tracer.span("llm", model=self.model, tenant=tenant, priority=priority, prompt_tokens=cost) as span:
+            # Identical prompts are answered from the host-wide cache (live transport only,
+            # so recordings and replays always exercise the transport)
+            use_cache = self.llm_cache_ttl > 0 and self.transport.mode == "live"
+            if use_cache:
+                key = request_key(self.model, self.temperature, system_prompt, user_prompt)
+                cached = await self._run_blocking(self.shared_cache.get, "llm", key)
+                span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
+            
+            queued = time.perf_counter()
+            async with self.llm_scheduler.slot(tenant, priority, cost):
+                span.set(queue_ms=round((time.perf_counter() - queued) * 1000, 3))
+                with tracer.span("llm.request", model=self.model, transport=self.transport.mode):
+                    if _native_async.get():
+                        output = await self._call_llm_async(system_prompt, user_prompt)
+                    else:
+                        output = await self._run_blocking(self._call_llm, system_prompt, user_prompt)
+            span.set(output_chars=len(output), ok=self.is_reusable({"output": output}))
+            
+            if use_cache and self.is_reusable({"output": output}):
+                await self._run_blocking(self.shared_cache.set, "llm", key, output, self.llm_cache_ttl)
+            return output
     
-    def _get_document_text(self, doc_input: str) -> str:
-        """Get document text from file path or direct text."""
-        if Path(doc_input).exists():
-            return DocumentParser.parse_file(doc_input)
-        return doc_input
+    async def _call_llm_async(self, system_prompt: str, user_prompt: str) -> str:
+        """Call LLM with prompts using the async client."""
+        if self.transport.replaying:
+            return await self.transport.replay_async(self.model, self.temperature, system_prompt, user_prompt)
+        if not self.async_client:
+            return "LLM not configured. Please set OPENAI_API_KEY in .env file."
+        
+        try:
+            start = time.perf_counter()
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=self.temperature
+            )
+            output = response.choices[0].message.content
+        except Exception as e:
+            return f"Error calling LLM: {str(e)}"
+        
+        if self.transport.recording:
+            self.transport.record(self.model, self.temperature, system_prompt, user_prompt,
+                                  output, time.perf_counter() - start)
+        return output
     
     def _call_llm(self, system_prompt: str, user_prompt: str) -> str:
         """Call LLM with prompts."""
+        if self.transport.replaying:
+            return self.transport.replay(self.model, self.temperature, system_prompt, user_prompt)
         if not self.client:
             return "LLM not configured. Please set OPENAI_API_KEY in .env file."
         
         try:
+            start = time.perf_counter()
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=float(os.getenv("TEMPERATURE", "0.3"))
+                temperature=self.temperature
             )
-            return response.choices[0].message.content
+            output = response.choices[0].message.content
         except Exception as e:
             return f"Error calling LLM: {str(e)}"
+        
+        if self.transport.recording:
+            self.transport.record(self.model, self.temperature, system_prompt, user_prompt,
+                                  output, time.perf_counter() - start)
+        return output
     
     def _get_language_instruction(self, lang: str) -> str:
         """Get language-specific instruction."""
@@ -134,8 +839,54 @@ class DocumentIntelligenceAgent:
         }
         return lang_map.get(lang, "Respond in English.")
     
-    def _summarize(self, doc1: str, doc2: Optional[str], query: Optional[str], lang: str) -> Dict[str, str]:
+    def _generation_language(self, lang: str) -> str:
+        """Language the task itself is generated in (English when other languages are translated)."""
+        return "en" if self.language_rendering == "translate" else lang
+    
+    async def _render_language(self, result: Dict, lang: str) -> Dict:
+        """
+        Render an English task result in the requested language.
+        
+        Only the short output is translated, and identical translations are
+        answered from the LLM response cache, so switching between en, or and
+        bilingual reuses the English result instead of re-reading the document.
+        """
+        if self._generation_language(lang) == lang or not self.is_reusable(result):
+            return result
+        
+        english = result["output"]
+        with tracer.span("render_language", language=lang, chars=len(english)) as span:
+            odia = await self._complete(
+                "You translate summaries and answers about government documents from English into Odia (ଓଡ଼ିଆ).",
+                f"""
+Translate the text below into Odia (ଓଡ଼ିଆ).
+Keep the structure (headings, bullet points, numbering) and keep dates, amounts, reference numbers,
+names and citations such as [Source 2] exactly as written. Output only the translation.
+
+Text:
+{english}
+"""
+            )
+            span.set(ok=self.is_reusable({"output": odia}))
+        
+        rendered = dict(result)
+        if not self.is_reusable({"output": odia}):
+            rendered["language_note"] = f"Odia translation failed, showing the English result: {odia}"
+            return rendered
+        rendered["output"] = odia if lang == "or" else f"English:\n\n{english}\n\nଓଡ଼ିଆ:\n\n{odia}"
+        rendered["rendered_from"] = "en"
+        return rendered
+    
+    async def _summarize(self, doc1: str, doc2: Optional[str], query: Optional[str], lang: str) -> Dict[str, str]:
         """Generate document summary."""
+        if len(doc1) >= self.incremental_min_chars:
+            # A tree costs a call per section; it pays off only once there are versions to share it
+            tree, resummarized = await self._summary_tree(doc1, build=False)
+            if tree is None and await self._run_blocking(self._record_lineage, doc1):
+                tree, resummarized = await self._summary_tree(doc1, build=True)
+            if tree is not None:
+                return await self._summarize_from_tree(doc1, tree, resummarized, lang)
+        
         system_prompt = self.config['system_prompt']
         lang_instruction = self._get_language_instruction(lang)
         
@@ -155,13 +906,274 @@ Document:
 If any information is missing or unclear, note it in your response.
 """
         
-        output = self._call_llm(system_prompt, user_prompt)
+        output = await self._complete(system_prompt, user_prompt)
         return {
             "output": output,
             "missing_info": self._check_missing_info(output)
         }
     
-    def _extract(self, doc1: str, doc2: Optional[str], query: str, lang: str) -> Dict[str, str]:
+    async def _summarize_from_tree(self, doc1: str, tree: SummaryTree, resummarized: int, lang: str) -> Dict:
+        """
+        Summarize a long document from its summary tree.
+        
+        The English summary is the tree's root; other languages are written
+        from the tree's outline, never from the full text.
+        """
+        lineage_id = await self._run_blocking(self._resolve_lineage, tree.doc_id, doc1)
+        previous = self.lineage_store.previous_version(lineage_id, tree.doc_id)
+        self.lineage_store.record_version(lineage_id, tree.doc_id, [node["key"] for node in tree.levels[0]])
+        
+        if lang == "en":
+            output = tree.root
+        else:
+            user_prompt = f"""
+{self._get_language_instruction(lang)}
+
+Below are summaries of consecutive parts of a government document, in document order.
+Write the overall summary of the document. Focus on:
+- Main purpose and subject
+- Key decisions or directives
+- Important dates and deadlines
+- Stakeholders mentioned
+- Action items
+
+Part summaries:
+{tree.outline(SUMMARY_OUTLINE_CHARS)}
+
+If any information is missing or unclear, note it in your response.
+"""
+            output = await self._complete(self.config['system_prompt'], user_prompt)
+        
+        return {
+            "output": output,
+            "missing_info": self._check_missing_info(output),
+            "incremental": {
+                "lineage_id": lineage_id,
+                "previous_version": previous["doc_id"] if previous else None,
+                "sections": tree.sections,
+                "resummarized": resummarized
+            },
+            "summary_tree": {"levels": len(tree.levels)}
+        }
+    
+    def schedule_summary_tree(self, document: Union[str, Dict, DocumentHandle]) -> bool:
+        """Queue building a document's summary tree for when the LLM is idle (e.g. after upload)."""
+        if self.summary_tree_build != "idle":
+            return False
+        handle = parse_handle(document)
+        return self.tree_builder.schedule(handle.kind, handle.value)
+    
+    def _build_summary_tree_job(self, kind: str, value: str) -> None:
+        """Background build, at batch priority so requests always get the LLM first."""
+        with tenant_context(SUMMARY_TREE_TENANT, BATCH):
+            record = self._load_document(DocumentHandle(kind, value))
+            if len(record.text) >= self.incremental_min_chars:
+                # Built while the LLM is idle, so even a first version is worth a tree for qa/extract
+                self._record_lineage(record.text)
+                tree, _ = self._run_sync(self._summary_tree(record.text, build=True))
+                if tree is None:
+                    # A single section gets no tree; later qa/extract calls need not queue it
+                    self.shared_cache.set("summary_tree_skipped", record.doc_id, True)
+    
+    async def _summary_tree(self, text: str, build: bool) -> Tuple[Optional[SummaryTree], int]:
+        """
+        Summary tree of a long document, shared by all workers on the host.
+        
+        Returns (tree, number of sections summarized for it), or (None, 0) if
+        the document is too short to need one or it is not built and build is
+        False.
+        """
+        doc_id = text_fingerprint(text)
+        stored = await self._run_blocking(self.shared_cache.get, "summary_tree", doc_id)
+        if stored is not None:
+            return SummaryTree.from_dict(stored), 0
+        if not build or len(text) < self.incremental_min_chars:
+            return None, 0
+        
+        sections = await self._run_blocking(self._split_sections_shared, text)
+        if len(sections) < 2:
+            return None, 0
+        with tracer.span("summary_tree", sections=len(sections)) as span:
+            tree, resummarized = await self._build_summary_tree(doc_id, sections)
+            complete = all(self.is_reusable({"output": node["summary"]}) for level in tree.levels for node in level)
+            span.set(levels=len(tree.levels), resummarized=resummarized, ok=complete)
+        if complete:
+            await self._run_blocking(self.shared_cache.set, "summary_tree", doc_id, tree.to_dict())
+        return tree, resummarized
+    
+    async def _build_summary_tree(self, doc_id: str, sections: List[str]) -> Tuple[SummaryTree, int]:
+        """
+        Summarize each section, then roll the summaries up level by level.
+        
+        Section summaries are shared with earlier versions of the document
+        through the lineage store and interior nodes are cached by the hash of
+        their children, so a new version only re-summarizes the sections that
+        changed and the nodes above them.
+        """
+        system_prompt = self.config['system_prompt']
+        slots = asyncio.Semaphore(4)
+        
+        async def complete(user_prompt: str) -> str:
+            async with slots:
+                return await self._complete(system_prompt, user_prompt)
+        
+        async def summarize_section(section: str) -> str:
+            return await complete(f"""
+Respond in English only.
+
+Summarize this section of a government document in 2-5 concise bullet points.
+Keep all dates, deadlines, amounts, reference numbers and named stakeholders exactly as written.
+
+Section:
+{section}
+""")
+        
+        async def summarize_node(level: List[Dict], group: List[int], root: bool) -> Dict:
+            children = [level[i] for i in group]
+            node = {
+                "key": node_key((["root"] if root else []) + [child["key"] for child in children]),
+                "start": children[0]["start"],
+                "end": children[-1]["end"],
+                "children": group
+            }
+            if len(children) == 1:
+                node["summary"] = children[0]["summary"]
+                return node
+            
+            summary = await self._run_blocking(self.shared_cache.get, "summary_nodes", node["key"])
+            if summary is None:
+                parts = "\n\n".join(f"Part {i}:\n{child['summary']}" for i, child in enumerate(children, 1))
+                if root:
+                    summary = await complete(f"""
+Respond in English only.
+
+Below are summaries of consecutive parts of a government document, in document order.
+Write the overall summary of the document. Focus on:
+- Main purpose and subject
+- Key decisions or directives
+- Important dates and deadlines
+- Stakeholders mentioned
+- Action items
+
+Part summaries:
+{parts}
+
+If any information is missing or unclear, note it in your response.
+""")
+                else:
+                    summary = await complete(f"""
+Respond in English only.
+
+Combine these summaries of consecutive parts of a government document into one summary of 3-8 bullet points.
+Keep all dates, deadlines, amounts, reference numbers and named stakeholders exactly as written.
+
+{parts}
+""")
+                if self.is_reusable({"output": summary}):
+                    await self._run_blocking(self.shared_cache.set, "summary_nodes", node["key"], summary)
+            node["summary"] = summary
+            return node
+        
+        hashes = [section_hash(section) for section in sections]
+        summaries = {h: self.lineage_store.get_section_summary(h) for h in hashes}
+        pending = {h: section for h, section in zip(hashes, sections) if summaries[h] is None}
+        if pending:
+            outputs = await asyncio.gather(*(summarize_section(section) for section in pending.values()))
+            fresh = dict(zip(pending, outputs))
+            summaries.update(fresh)
+            self.lineage_store.put_section_summaries({
+                h: summary for h, summary in fresh.items() if self.is_reusable({"output": summary})
+            })
+        
+        level = [{"key": h, "summary": summaries[h], "start": i, "end": i, "children": []}
+                 for i, h in enumerate(hashes)]
+        levels = [level]
+        while len(level) > 1:
+            root = len(level) <= 2 * FANOUT
+            groups = [list(range(len(level)))] if root else group_children([node["key"] for node in level])
+            level = list(await asyncio.gather(*(summarize_node(level, group, root) for group in groups)))
+            levels.append(level)
+        return SummaryTree(doc_id, levels), len(pending)
+    
+    async def _answer_from_tree(self, doc: str, query: str, lang: str, instruction: str,
+                                closing: str, leaves: int) -> Optional[Dict]:
+        """
+        Answer from the sections a long document's summary tree routes the query to.
+        
+        Returns None, and the caller reads the whole document, when the tree
+        is not built yet (its build is queued), nothing matches the query, or
+        the routed sections do not hold the answer.
+        """
+        if len(doc) < self.incremental_min_chars:
+            return None
+        tree, _ = await self._summary_tree(doc, build=False)
+        if tree is None:
+            doc_id = text_fingerprint(doc)
+            # Documents found too short of sections for a tree are not queued again
+            if not await self._run_blocking(self.shared_cache.contains, "summary_tree_skipped", doc_id):
+                self.schedule_summary_tree({"doc_id": doc_id})
+            return None
+        
+        sections = await self._run_blocking(self._split_sections_shared, doc)
+        if len(sections) != tree.sections:
+            return None
+        with tracer.span("summary_tree.route", sections=len(sections)) as span:
+            indexes = await self._run_blocking(tree.route, query, sections, 2, leaves)
+            span.set(routed=len(indexes))
+        if not indexes:
+            return None
+        
+        context = "\n\n".join(f"[Section {i + 1} of {tree.sections}]\n{sections[i]}" for i in indexes)
+        user_prompt = f"""
+{self._get_language_instruction(lang)}
+
+{instruction}
+{query}
+
+Document overview:
+{tree.root}
+
+Relevant sections of the document:
+{context}
+
+{closing}
+"""
+        
+        output = await self._complete(self.config['system_prompt'], user_prompt)
+        missing_info = self._check_missing_info(output)
+        if missing_info or not self.is_reusable({"output": output}):
+            return None
+        return {
+            "output": output,
+            "missing_info": missing_info,
+            "summary_tree": {"sections_used": [i + 1 for i in indexes], "sections": tree.sections}
+        }
+    
+    def _record_lineage(self, text: str) -> bool:
+        """Record a long document as a version of its lineage; True if an earlier version exists."""
+        doc_id = text_fingerprint(text)
+        lineage_id = self._resolve_lineage(doc_id, text)
+        previous = self.lineage_store.previous_version(lineage_id, doc_id)
+        sections = self._split_sections_shared(text)
+        self.lineage_store.record_version(lineage_id, doc_id, [section_hash(section) for section in sections])
+        return previous is not None
+    
+    def _resolve_lineage(self, doc_id: str, text: str) -> str:
+        """Attach a document to the lineage of its closest earlier version."""
+        lineage_id = self.lineage_store.lineage_of(doc_id)
+        if lineage_id:
+            return lineage_id
+        
+        signature = self.dedup_index.get_signature(doc_id) or self.dedup_index.signature(text)
+        self.dedup_index.add(doc_id, signature)
+        for match_id, _ in self.dedup_index.find_similar(signature, exclude=doc_id,
+                                                        threshold=self.lineage_threshold):
+            lineage_id = self.lineage_store.lineage_of(match_id)
+            if lineage_id:
+                return lineage_id
+        return doc_id
+    
+    async def _extract(self, doc1: str, doc2: Optional[str], query: str, lang: str) -> Dict[str, str]:
         """Extract specific information based on query."""
         if not query:
             return {
@@ -169,6 +1181,22 @@ If any information is missing or unclear, note it in your response.
                 "missing_info": "Query required for extraction"
             }
         
+        cached = await self._cached_answer("extract", doc1, query, lang)
+        if cached:
+            return cached
+        
+        routed = await self._answer_from_tree(doc1, query, lang, *_ANSWER_PROMPTS["extract"], leaves=5)
+        if routed:
+            await self._remember_answer("extract", doc1, query, lang, routed)
+            return routed
+        
+        if len(doc1) >= self.extract_chunk_min_chars:
+            result = await self._extract_chunked(doc1, query, lang)
+            if result is not None:
+                if not result["chunked"]["failed"]:
+                    await self._remember_answer("extract", doc1, query, lang, result)
+                return result
+        
         system_prompt = self.config['system_prompt']
         lang_instruction = self._get_language_instruction(lang)
         
@@ -184,13 +1212,81 @@ Document:
 Provide structured, precise extraction. If information is not available, state: "Not available in provided document".
 """
         
-        output = self._call_llm(system_prompt, user_prompt)
-        return {
+        output = await self._complete(system_prompt, user_prompt)
+        result = {
             "output": output,
             "missing_info": self._check_missing_info(output)
         }
+        await self._remember_answer("extract", doc1, query, lang, result)
+        return result
+    
+    async def _extract_chunked(self, doc1: str, query: str, lang: str) -> Optional[Dict]:
+        """
+        Map-and-merge extraction for large documents.
+        
+        The query runs on every chunk concurrently, so wall-clock time follows
+        the largest chunk rather than the whole document. Values are merged
+        across chunks with their page and offset. Returns None (the caller
+        reads the whole document) if no chunk answered in the expected format.
+        """
+        ranges = chunk_ranges(doc1, self.extract_chunk_chars)
+        record = self.document_registry.find(doc1)
+        page_offsets = record.page_offsets if record is not None else [0]
+        system_prompt = self.config['system_prompt']
+        
+        async def extract_chunk(part: int, start: int, end: int) -> str:
+            return await self._complete(system_prompt, f"""
+Respond in English only.
+
+Extract the following information from part {part} of {len(ranges)} of a government document:
+{query}
+
+Return only a JSON object with one entry per requested item, named as in the request:
+{{"fields": [{{"field": "<requested item>", "value": "<value exactly as written, or null if not in this part>", "quote": "<shortest verbatim passage containing the value>"}}]}}
+
+Part {part}:
+{doc1[start:end]}
+""")
+        
+        with tracer.span("extract_chunked", chunks=len(ranges)) as span:
+            outputs = await asyncio.gather(*(extract_chunk(part, start, end)
+                                             for part, (start, end) in enumerate(ranges, 1)))
+            parsed = [parse_fields(output) for output in outputs]
+            failed = sum(1 for fields in parsed if fields is None)
+            span.set(failed=failed)
+        
+        if failed == len(ranges):
+            if not self.is_reusable({"output": outputs[0]}):
+                return {"output": outputs[0], "missing_info": "", "chunked": {"chunks": len(ranges), "failed": failed}}
+            return None
+        
+        fields = merge_fields(
+            [(chunk, entries) for chunk, entries in enumerate(parsed) if entries is not None],
+            doc1, ranges, page_offsets
+        )
+        output = format_fields(fields) if fields else NOT_AVAILABLE
+        if lang != "en" and fields:
+            output = await self._complete(system_prompt, f"""
+{self._get_language_instruction(lang)}
+
+Present these values extracted from a government document as a structured list.
+Keep every value, date, amount, reference number and page number exactly as written.
+Write "{NOT_AVAILABLE}" where a value is missing.
+
+{output}
+""")
+        
+        missing_info = self._check_missing_info(output)
+        if failed and not missing_info:
+            missing_info = f"{failed} of {len(ranges)} parts of the document could not be read; some values may be missing"
+        return {
+            "output": output,
+            "missing_info": missing_info,
+            "fields": fields,
+            "chunked": {"chunks": len(ranges), "failed": failed}
+        }
     
-    def _compare(self, doc1: str, doc2: str, query: Optional[str], lang: str) -> Dict[str, str]:
+    async def _compare(self, doc1: str, doc2: str, query: Optional[str], lang: str) -> Dict[str, str]:
         """Compare two documents."""
         if not doc2:
             return {
@@ -201,6 +1297,29 @@ Provide structured, precise extraction. If information is not available, state:
         system_prompt = self.config['system_prompt']
         lang_instruction = self._get_language_instruction(lang)
         
+        with tracer.span("near_duplicate_check") as span:
+            changes = await self._run_blocking(self._near_duplicate_changes, doc1, doc2)
+            span.set(near_duplicate=changes is not None)
+        if changes is not None:
+            # Near-identical versions: send only the changed lines
+            diff_text = "\n".join(changes)
+            user_prompt = f"""
+{lang_instruction}
+
+Document 1 and Document 2 are near-identical versions of the same government document.
+Only the following lines differ ("-" lines are from Document 1, "+" lines are from Document 2):
+
+{diff_text}
+
+Explain each difference and its practical impact (dates, reference numbers, amounts, directives).
+Provide a structured comparison.
+"""
+            output = await self._complete(system_prompt, user_prompt)
+            return {
+                "output": output,
+                "missing_info": self._check_missing_info(output)
+            }
+        
         user_prompt = f"""
 {lang_instruction}
 
@@ -220,13 +1339,106 @@ Document 2:
 Provide a structured comparison.
 """
         
-        output = self._call_llm(system_prompt, user_prompt)
+        output = await self._complete(system_prompt, user_prompt)
         return {
             "output": output,
             "missing_info": self._check_missing_info(output)
         }
     
-    def _qa(self, doc1: str, doc2: Optional[str], query: str, lang: str) -> Dict[str, str]:
+    async def _compare_many(self, records: List[DocumentRecord], query: Optional[str], lang: str) -> Dict:
+        """
+        N-way compare of several versions of a document against the first one.
+        
+        Documents are aligned section by section locally; every pair's
+        alignment is cached, so a set that grows by one document only aligns
+        the new pairs. The LLM reads one delta matrix instead of every text.
+        """
+        with tracer.span("compare_many", documents=len(records)) as span:
+            sections = await asyncio.gather(*(self._run_blocking(self._split_sections_shared, r.text)
+                                              for r in records))
+            hashes = [[section_hash(s) for s in doc_sections] for doc_sections in sections]
+            pairs, computed = await self._run_blocking(self._section_pairs, records, sections, hashes)
+            rows = delta_rows(sections, hashes, [pairs[(0, k)] for k in range(1, len(records))])
+            span.set(pairs=len(pairs), computed=computed, rows=len(rows))
+        
+        similarity = [[1.0 if i == k else pairs[(min(i, k), max(i, k))]["similarity"] for k in range(len(records))]
+                      for i in range(len(records))]
+        comparison = {
+            "baseline": records[0].doc_id,
+            "sections": len(sections[0]),
+            "changed_sections": len(rows),
+            "similarity": similarity,
+            "pairs_computed": computed,
+            "pairs_reused": len(pairs) - computed
+        }
+        if not rows:
+            return {
+                "output": f"All {len(records)} documents are identical, section by section.",
+                "missing_info": "",
+                "comparison": comparison
+            }
+        
+        focus = f"\nFocus on: {query}\n" if query else ""
+        user_prompt = f"""
+{self._get_language_instruction(lang)}
+
+These {len(records)} documents are versions of the same government document; Document 1 is the baseline.
+Sections that are identical in every document are left out. For each section that differs, the lines
+below show how the listed documents differ from the baseline ("-" lines are from Document 1, "+" lines
+from the listed documents); documents not listed match the baseline in that section.
+
+Share of identical sections between the documents:
+{render_similarity(similarity)}
+
+Differences from Document 1:
+{render_rows(rows, sections[0])}
+{focus}
+Explain how each document differs from the baseline and from the others, and the practical impact
+(dates, reference numbers, amounts, directives). Point out changes shared by several documents.
+Provide a structured comparison.
+"""
+        
+        output = await self._complete(self.config['system_prompt'], user_prompt)
+        return {
+            "output": output,
+            "missing_info": self._check_missing_info(output),
+            "comparison": comparison
+        }
+    
+    def _section_pairs(self, records: List[DocumentRecord], sections: List[List[str]],
+                       hashes: List[List[str]]) -> Tuple[Dict[Tuple[int, int], Dict], int]:
+        """Alignment of every pair (i, k), i < k, of the documents, from the shared cache where possible."""
+        pairs = {}
+        computed = 0
+        for i in range(len(records)):
+            for k in range(i + 1, len(records)):
+                key = f"{records[i].doc_id}>{records[k].doc_id}"
+                pair = self.shared_cache.get("section_pairs", key)
+                if pair is None:
+                    pair = compare_pair(sections[i], hashes[i], sections[k], hashes[k])
+                    self.shared_cache.set("section_pairs", key, pair)
+                    computed += 1
+                pairs[(i, k)] = pair
+        return pairs, computed
+    
+    def _near_duplicate_changes(self, doc1: str, doc2: str) -> Optional[list]:
+        """Return the line diff if the two documents are near-duplicates."""
+        if not self.dedup_enabled:
+            return None
+        
+        signatures = []
+        for doc in (doc1, doc2):
+            doc_id = text_fingerprint(doc)
+            signature = self.dedup_index.get_signature(doc_id) or self.dedup_index.signature(doc)
+            self.dedup_index.add(doc_id, signature)
+            signatures.append(signature)
+        
+        if MinHashIndex.similarity(*signatures) < self.dedup_index.threshold:
+            return None
+        changes = document_diff(doc1, doc2, self.dedup_max_diff_lines)
+        return changes or None
+    
+    async def _qa(self, doc1: str, doc2: Optional[str], query: str, lang: str) -> Dict[str, str]:
         """Answer questions about document."""
         if not query:
             return {
@@ -234,6 +1446,15 @@ Provide a structured comparison.
                 "missing_info": "Query required for Q&A"
             }
         
+        cached = await self._cached_answer("qa", doc1, query, lang)
+        if cached:
+            return cached
+        
+        routed = await self._answer_from_tree(doc1, query, lang, *_ANSWER_PROMPTS["qa"], leaves=3)
+        if routed:
+            await self._remember_answer("qa", doc1, query, lang, routed)
+            return routed
+        
         system_prompt = self.config['system_prompt']
         lang_instruction = self._get_language_instruction(lang)
         
@@ -250,24 +1471,50 @@ If the answer is not available in the document, respond: "Not available in provi
 Be precise and cite relevant parts of the document.
 """
         
-        output = self._call_llm(system_prompt, user_prompt)
-        return {
+        output = await self._complete(system_prompt, user_prompt)
+        result = {
             "output": output,
             "missing_info": self._check_missing_info(output)
         }
+        await self._remember_answer("qa", doc1, query, lang, result)
+        return result
+    
+    async def _cached_answer(self, task: str, doc: Optional[str], query: str, lang: str,
+                             doc_id: Optional[str] = None) -> Optional[Dict]:
+        """Return an earlier answer to a similar question about the same document (or doc_id)."""
+        if not self.semantic_cache_enabled:
+            return None
+        
+        match = await self._run_blocking(self._lookup_answer, task, doc, query, lang, doc_id)
+        if not match:
+            return None
+        
+        # The earlier question may be another user's, so it is not shown
+        entry, similarity = match
+        return {
+            "output": entry["output"],
+            "missing_info": entry["missing_info"],
+            "cache_note": f"Answered from cache: a similar question was asked earlier (similarity {similarity:.2f})."
+        }
+    
+    def _lookup_answer(self, task: str, doc: Optional[str], query: str, lang: str,
+                       doc_id: Optional[str] = None) -> Optional[Tuple[Dict, float]]:
+        return self.answer_cache.lookup(doc_id or text_fingerprint(doc), task, lang, query)
+    
+    async def _remember_answer(self, task: str, doc: Optional[str], query: str, lang: str, result: Dict,
+                               doc_id: Optional[str] = None) -> None:
+        """Store a successful answer for paraphrased follow-up questions."""
+        if self.semantic_cache_enabled and self.is_reusable(result):
+            await self._run_blocking(self._store_answer, task, doc, query, lang, result, doc_id)
+    
+    def _store_answer(self, task: str, doc: Optional[str], query: str, lang: str, result: Dict,
+                      doc_id: Optional[str] = None) -> None:
+        self.answer_cache.store(doc_id or text_fingerprint(doc), task, lang, query, result)
     
     def _check_missing_info(self, output: str) -> str:
         """Check if output indicates missing information."""
-        missing_indicators = [
-            "not available in provided document",
-            "information is missing",
-            "not mentioned in the document",
-            "unclear from the document"
-        ]
-        
-        for indicator in missing_indicators:
-            if indicator.lower() in output.lower():
-                return "Some information was not available in the provided document(s)"
+        if _MISSING_INFO.search(output):
+            return "Some information was not available in the provided document(s)"
         return ""
 
 
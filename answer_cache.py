@@ -0,0 +1,243 @@
+"""
+Semantic answer cache for DIA.
+Matches new questions about a document against earlier ones using hashed
+n-gram vectors, so paraphrases ("last date?", "what is the deadline?")
+reuse the earlier answer instead of calling the LLM again. Answers live in
+the shared cache, so every worker reuses the others'.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from shared_cache import SharedCache
+
+_WORD = re.compile(r'[\w\u0b01-\u0b03\u0b3c\u0b3e-\u0b57\u0b62\u0b63\u200c\u200d]+')
+
+_NUMBER = re.compile(r'[0-9\u0b66-\u0b6f]+')
+
+# Common paraphrases in government documents, mapped to one canonical term. Terms
+# that ask for different facts (phone vs email, budget vs price) stay apart.
+_SYNONYMS = [
+    (re.compile(r'\b(?:last|final|closing|due|end|cut[- ]?off) date\b|\bdead[- ]?line\b|ଶେଷ ତାରିଖ'), 'deadline'),
+    (re.compile(r'\b(?:start|opening|commencement|effective) date\b|\bwith effect from\b'), 'startdate'),
+    (re.compile(r'\b(?:budget|outlay)\b'), 'budget'),
+    (re.compile(r'\b(?:cost|price)\b|ମୂଲ୍ୟ'), 'price'),
+    (re.compile(r'\b(?:fee|fees|charges?)\b'), 'fee'),
+    (re.compile(r'\bwho can apply\b'), 'who eligibility'),
+    (re.compile(r'\b(?:eligib\w*|qualif\w*)\b|ଯୋଗ୍ୟତା'), 'eligibility'),
+    (re.compile(r'\b(?:phone|telephone|mobile|helpline)(?: number| no\.?)?\b'), 'phone'),
+    (re.compile(r'\b(?:email|e-mail)(?: address| id)?\b'), 'email'),
+    (re.compile(r'\b(?:penalt\w*|fine|fines|punishment)\b|ଜରିମାନା'), 'penalty'),
+    (re.compile(r'\b(?:documents? required|required documents?|attachments?)\b'), 'requireddocs'),
+    (re.compile(r"n't\b"), ' not'),
+    (re.compile(r"କ['’]ଣ"), 'କଣ'),
+]
+
+# Function words only. Deliberately narrower than stopwords.STOPWORDS (used for
+# search): negations, interrogatives and words like "page" or "notice" all change
+# what a question asks for, so they stay part of its identity.
+_STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'do', 'does', 'did', 'can', 'could',
+    'will', 'would', 'shall', 'should', 'may', 'of', 'in', 'on', 'at', 'to', 'for', 'from', 'by', 'with',
+    'as', 'and', 'or', 'this', 'that', 'these', 'those', 'it', 'its', 'there', 'their', 'i', 'we', 'me',
+    'us', 'you', 's', 'please', 'tell', 'give', 'ଏହି', 'ଓ', 'ଏବଂ', 'ର', 'ରେ', 'କି'
+})
+
+# Interrogatives, mapped to the kind of answer they ask for. "Who signed the
+# order?" and "When was the order signed?" share every content word but not
+# their kind. A question without one ("deadline?") asks "what".
+_INTERROGATIVES = {
+    'what': 'what', 'which': 'what', 'who': 'who', 'whom': 'who', 'whose': 'who', 'when': 'when',
+    'where': 'where', 'why': 'why', 'how': 'how',
+    'କଣ': 'what', 'କେଉଁ': 'what', 'କିଏ': 'who', 'କାହାର': 'who', 'କେବେ': 'when',
+    'କେଉଁଠି': 'where', 'କାହିଁକି': 'why', 'କିପରି': 'how', 'କେମିତି': 'how'
+}
+
+
+def _canonical_words(question: str) -> List[str]:
+    text = unicodedata.normalize('NFC', question).lower()
+    for pattern, replacement in _SYNONYMS:
+        text = pattern.sub(f' {replacement} ', text)
+    return [w for w in _WORD.findall(text) if w not in _STOPWORDS]
+
+
+def question_kinds(words: List[str]) -> frozenset:
+    """What a question asks for ("who", "when", ...), from its interrogatives."""
+    return frozenset(_INTERROGATIVES[w] for w in words if w in _INTERROGATIVES) or frozenset({'what'})
+
+
+def question_terms(question: str) -> frozenset:
+    """
+    Identity of a question: its content words after synonym folding, plus the
+    kind of answer it asks for. Paraphrases must share all of them.
+    """
+    words = _canonical_words(question)
+    return frozenset(w for w in words if w not in _INTERROGATIVES) | {'?' + kind for kind in question_kinds(words)}
+
+
+def question_vector(question: str, dims: int = 4096) -> Dict[int, float]:
+    """Hashed word and character-trigram vector, L2-normalized."""
+    features: Dict[int, float] = {}
+
+    def add(feature: str, weight: float):
+        index = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=4).digest(), 'big') % dims
+        features[index] = features.get(index, 0.0) + weight
+
+    for word in _canonical_words(question):
+        if word in _INTERROGATIVES:
+            continue
+        add('w:' + word, 1.0)
+        padded = f'#{word}#'
+        for i in range(len(padded) - 2):
+            add('c:' + padded[i:i + 3], 0.3)
+
+    norm = math.sqrt(sum(v * v for v in features.values()))
+    return {k: v / norm for k, v in features.items()} if norm else {}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Cosine similarity of two normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class SemanticAnswerCache:
+    """
+    Per-document answer cache keyed by question similarity.
+
+    Each scope (document, task, language) keeps its most recently used
+    answers in one shared cache entry; whole scopes go with the cache's LRU
+    eviction, or with forget() when their document's upload is removed.
+    """
+
+    def __init__(self, cache: SharedCache, log_dir: str, threshold: float = 0.8,
+                 max_entries_per_doc: int = 50, max_vectors: int = 10000,
+                 hit_log_max_bytes: int = 10 * 1024 * 1024):
+        self.cache = cache
+        self.hit_log_path = os.path.join(log_dir, 'answer_cache_hits.jsonl')
+        self.hit_log_max_bytes = hit_log_max_bytes
+        self.threshold = threshold
+        self.max_entries_per_doc = max_entries_per_doc
+        self.max_vectors = max_vectors
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+        # Question -> (vector, content words), computed once per process
+        self._vectors: "OrderedDict[str, Tuple[Dict[int, float], frozenset]]" = OrderedDict()
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _scope(doc_id: str, task: str, language: str) -> str:
+        return f"{doc_id}|{task}|{language}"
+
+    def _features(self, question: str) -> Tuple[Dict[int, float], frozenset]:
+        with self._lock:
+            features = self._vectors.get(question)
+            if features is not None:
+                self._vectors.move_to_end(question)
+                return features
+        features = (question_vector(question), question_terms(question))
+        with self._lock:
+            self._vectors[question] = features
+            while len(self._vectors) > self.max_vectors:
+                self._vectors.popitem(last=False)
+        return features
+
+    def lookup(self, doc_id: str, task: str, language: str, question: str) -> Optional[Tuple[Dict, float]]:
+        """
+        Find the most similar earlier question above the threshold.
+
+        Only questions with the same content words (after synonym folding) are
+        compared, so "BPL families" never matches "APL families", a negated
+        question never matches its positive form and "who signed" never
+        matches "when was it signed".
+        """
+        start = time.perf_counter()
+        query_vector = question_vector(question)
+        query_terms = question_terms(question)
+        scope = self._scope(doc_id, task, language)
+
+        # Questions that differ only in a number ("phase 3" vs "phase 4") are different questions
+        numbers = sorted(_NUMBER.findall(question))
+
+        best, best_score = None, 0.0
+        for entry in self.cache.get("answers", scope) or []:
+            if sorted(_NUMBER.findall(entry['question'])) != numbers:
+                continue
+            vector, terms = self._features(entry['question'])
+            if terms != query_terms:
+                continue
+            score = cosine(query_vector, vector)
+            if score > best_score:
+                best, best_score = entry, score
+
+        hit = best is not None and best_score >= self.threshold
+        if hit:
+            self.cache.update("answers", scope, lambda entries: self._touch(entries, best['question']))
+
+        self._log({
+            'time': time.time(),
+            'doc_id': doc_id,
+            'task': task,
+            'language': language,
+            'question': question,
+            'matched_question': best['question'] if best else None,
+            'similarity': round(best_score, 4),
+            'hit': hit,
+            'lookup_ms': round((time.perf_counter() - start) * 1000, 3)
+        })
+        return (best, best_score) if hit else None
+
+    @staticmethod
+    def _touch(entries: Optional[List[Dict]], question: str) -> Optional[List[Dict]]:
+        """Move a hit to the most recently used end and count it."""
+        for i, entry in enumerate(entries or []):
+            if entry['question'] == question:
+                entry['hits'] = entry.get('hits', 0) + 1
+                entries.append(entries.pop(i))
+                break
+        return entries
+
+    def store(self, doc_id: str, task: str, language: str, question: str, result: Dict) -> None:
+        """Remember an answer for later paraphrased questions."""
+        entry = {
+            'question': question,
+            'output': result.get('output', ''),
+            'missing_info': result.get('missing_info', ''),
+            'created': time.time(),
+            'hits': 0
+        }
+
+        def add(entries: Optional[List[Dict]]) -> List[Dict]:
+            entries = [e for e in entries or [] if e['question'] != question] + [entry]
+            return entries[-self.max_entries_per_doc:]
+
+        self.cache.update("answers", self._scope(doc_id, task, language), add)
+
+    def forget(self, doc_id: str, prefix: bool = False) -> None:
+        """Drop every cached answer about a document (or every document whose id starts with doc_id)."""
+        self.cache.delete("answers", doc_id if prefix else f"{doc_id}|", prefix=True)
+
+    def _log(self, record: Dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._log_lock:
+            try:
+                if os.path.exists(self.hit_log_path) and os.path.getsize(self.hit_log_path) > self.hit_log_max_bytes:
+                    # Keep one rotated file so the log stays bounded
+                    os.replace(self.hit_log_path, f"{self.hit_log_path}.1")
+                with open(self.hit_log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
@@ -4,10 +4,19 @@ Handles file uploads and document processing API.
 """
 
 import os
-from flask import Flask, request, jsonify, send_from_directory
+import time
+import errno
+from flask import Flask, g, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from agent import DocumentIntelligenceAgent
+from agent import CACHE_FOLDER, DocumentIntelligenceAgent
+from admission import AdmissionController, Overloaded
+from assets import static_assets
+from documents import DocumentNotFound, documents_error, handle_error
+from results import CONFLICT, NEW, PENDING, ResultStore
+from scheduler import tenant_context, tenant_from_headers
+from storage import upload_store
+from tracing import trace_id_from_headers, tracer
 from pathlib import Path
 import json
 
@@ -33,16 +42,199 @@ except (OSError, PermissionError):
 # Initialize DIA
 agent = DocumentIntelligenceAgent()
 
+# Fingerprinted, precompressed static assets (rebuilt here if stale and writable)
+static_assets.load()
+
+# Byte quota for uploads: LRU/TTL eviction (with derived caches) by a background sweep
+upload_store.configure(
+    UPLOAD_FOLDER,
+    max_bytes=int(os.getenv('UPLOAD_QUOTA_MB', 256 if os.environ.get('VERCEL') else 1024)) * 1024 * 1024,
+    ttl=float(os.getenv('UPLOAD_TTL_HOURS', 0)) * 3600,
+    interval=float(os.getenv('UPLOAD_SWEEP_INTERVAL', 30)),
+    on_evict=agent.forget_upload
+)
+upload_store.start()
+# Returned with HTTP 507 when the quota is held by uploads still in use
+STORAGE_FULL = {'error': 'Upload storage is full, please retry later', 'retry_after': 60}
+
+# Load shedding for /api/process (LLM-bound requests)
+admission = AdmissionController(
+    max_in_flight=int(os.getenv('MAX_IN_FLIGHT', 32)),
+    max_queue=int(os.getenv('MAX_QUEUE', 64)),
+    target_ms=float(os.getenv('QUEUE_TARGET_MS', 500)),
+    interval_ms=float(os.getenv('QUEUE_INTERVAL_MS', 10000))
+)
+
+# Completed /api/process responses, by result ID and Idempotency-Key
+result_store = ResultStore(
+    os.path.join(CACHE_FOLDER, 'results.db'),
+    ttl=float(os.getenv('RESULT_TTL_HOURS', 24)) * 3600
+)
+# How long a duplicate waits for the in-flight original before getting a 409 (ASGI server only:
+# waiting there holds no thread; the Flask server answers 409 at once)
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 60))
+IDEMPOTENCY_POLL = 0.25
+
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def validate_process_request(data):
+    """Validate a /api/process payload. Returns an error message or None."""
+    if not isinstance(data, dict):
+        return 'Request body must be a JSON object'
+    corpus_scope = data.get('scope') == 'corpus'
+    
+    # Validate required fields
+    required_fields = ['task', 'language'] if corpus_scope else ['task', 'language', 'document_1']
+    for field in required_fields:
+        if field not in data:
+            return f'Missing required field: {field}'
+    
+    # Validate task type
+    valid_tasks = ['summarize', 'extract', 'compare', 'qa']
+    if data['task'] not in valid_tasks:
+        return f'Invalid task. Must be one of: {", ".join(valid_tasks)}'
+    
+    # Validate language
+    valid_languages = ['en', 'or', 'bilingual']
+    if data['language'] not in valid_languages:
+        return f'Invalid language. Must be one of: {", ".join(valid_languages)}'
+    
+    # Validate task-specific requirements
+    if data['task'] in ['extract', 'qa'] and not data.get('query'):
+        return f'Query required for {data["task"]} task'
+    
+    if data['task'] == 'compare' and not data.get('document_2'):
+        return 'Second document required for comparison'
+    
+    for field in ('document_1', 'document_2'):
+        if data.get(field):
+            error = handle_error(data[field])
+            if error:
+                return f'{field}: {error}'
+    
+    if data.get('documents') is not None:
+        error = documents_error(data['documents'], data['task'])
+        if error:
+            return error
+    
+    if corpus_scope and data['task'] != 'qa':
+        return 'Corpus scope is only supported for the qa task'
+    return None
+
+
+def idempotency_key(headers):
+    """Tenant-scoped Idempotency-Key, as (key or None, error message or None)."""
+    key = (headers.get('Idempotency-Key') or '').strip()
+    if not key:
+        return None, None
+    if len(key) > 255:
+        return None, 'Idempotency-Key must be at most 255 characters'
+    return f"{tenant_from_headers(headers)[0]}:{key}", None
+
+
+def result_headers(result_id, etag):
+    """Headers of a stored result: its ETag and where to fetch it again."""
+    return {'ETag': etag, 'Location': f'/api/results/{result_id}', 'Cache-Control': 'private, no-cache'}
+
+
+def stored_response(state, claim):
+    """(body, status, headers) for a request answered by the result store instead of processing."""
+    if state == CONFLICT:
+        return {'success': False, 'error': 'Idempotency-Key was already used for a different request'}, 422, {}
+    if state == PENDING:
+        return {
+            'success': False,
+            'error': 'A request with this Idempotency-Key is still being processed',
+            'result_id': claim['result_id']
+        }, 409, {'Retry-After': '1'}
+    headers = result_headers(claim['result_id'], claim['etag'])
+    headers['Idempotent-Replayed'] = 'true'
+    return claim['body'], 200, headers
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches the ETag (weak comparison)."""
+    tags = [tag.strip() for tag in (if_none_match or '').split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def fetch_result(result_id, if_none_match):
+    """(body, status, headers) for GET /api/results/<id>, honouring If-None-Match."""
+    record = result_store.get(result_id)
+    if record is None:
+        if result_store.status(result_id) == PENDING:
+            return {'success': False, 'status': 'pending', 'result_id': result_id}, 202, {'Retry-After': '1'}
+        return {'success': False, 'error': 'Result not found or expired'}, 404, {}
+    headers = result_headers(result_id, record['etag'])
+    if etag_matches(if_none_match, record['etag']):
+        return None, 304, headers
+    return record['body'], 200, headers
+
+
+def profile_requested(headers):
+    """True if the client asked to profile this request, else None (sample rate decides)."""
+    if os.getenv('PROFILE_ALLOW_HEADER', 'true').lower() != 'true':
+        return None
+    return True if headers.get('X-Profile', '').lower() in ('1', 'true', 'yes') else None
+
+
+def overloaded_body(error):
+    """JSON body for a shed request."""
+    return {
+        'success': False,
+        'error': 'Server is busy, please retry shortly',
+        'reason': error.reason,
+        'retry_after': error.retry_after
+    }
+
+
+@app.before_request
+def join_trace():
+    """Join the caller's trace (X-Trace-Id) for the duration of the request."""
+    g.trace_id = trace_id_from_headers(request.headers)
+    g.trace_token = tracer.begin(g.trace_id)
+
+
+@app.after_request
+def add_trace_header(response):
+    """Echo the trace ID so clients can correlate their calls."""
+    if 'trace_id' in g:
+        response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+
+@app.teardown_request
+def leave_trace(error=None):
+    """Leave the trace joined in join_trace()."""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        tracer.end(token)
+
+
 @app.route('/')
 def index():
-    """Serve the main page."""
-    return send_from_directory('static', 'index.html')
+    """Serve the main page (rewritten to the fingerprinted assets when built)."""
+    return send_asset(*static_assets.index(request.headers.get('Accept-Encoding', '')))
+
+
+@app.route('/static/dist/<path:filename>')
+def fingerprinted_asset(filename):
+    """Serve a fingerprinted asset, precompressed, with immutable caching."""
+    asset = static_assets.resolve(filename, request.headers.get('Accept-Encoding', ''))
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return send_asset(*asset)
+
+
+def send_asset(path, headers):
+    """Send a static file with its cache and encoding headers."""
+    response = send_file(path, mimetype=static_assets.mimetype(path), conditional=True)
+    response.headers.update(headers)
+    return response
 
 
 @app.route('/api/health', methods=['GET'])
@@ -69,16 +261,30 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
     
+    if not upload_store.ensure_room(request.content_length or MAX_FILE_SIZE):
+        return jsonify(STORAGE_FULL), 507, {'Retry-After': str(STORAGE_FULL['retry_after'])}
+    
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with tracer.span('upload_file', filename=filename) as span:
+            file.save(filepath)
+            span.set(bytes=os.path.getsize(filepath))
+        upload_store.add(filepath)
+        # Long documents get a summary tree while the LLM is idle
+        agent.schedule_summary_tree({'path': filepath})
         
         return jsonify({
             'success': True,
             'filename': filename,
             'filepath': filepath
         })
+    except OSError as e:
+        if e.errno != errno.ENOSPC:
+            return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+        # Disk full despite the quota: drop the partial file and let the client retry
+        Path(filepath).unlink(missing_ok=True)
+        return jsonify(STORAGE_FULL), 507, {'Retry-After': str(STORAGE_FULL['retry_after'])}
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
@@ -87,44 +293,61 @@ def upload_file():
 def process_document():
     """Process documents based on task type."""
     try:
-        data = request.get_json()
+        # Not cached on the request: the raw body is freed once parsed
+        data = request.get_json(cache=False)
         
-        # Validate required fields
-        required_fields = ['task', 'language', 'document_1']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        error = validate_process_request(data)
+        key, key_error = idempotency_key(request.headers)
+        if error or key_error:
+            return jsonify({'error': error or key_error}), 400
         
-        # Validate task type
-        valid_tasks = ['summarize', 'extract', 'compare', 'qa']
-        if data['task'] not in valid_tasks:
-            return jsonify({'error': f'Invalid task. Must be one of: {", ".join(valid_tasks)}'}), 400
+        # Duplicates (retries, double clicks) are answered from the result store; one
+        # whose original is still running gets 409 at once rather than holding a worker thread
+        state, claim = result_store.begin(key, data)
+        if state != NEW:
+            body, status, headers = stored_response(state, claim)
+            return jsonify(body), status, headers
         
-        # Validate language
-        valid_languages = ['en', 'or', 'bilingual']
-        if data['language'] not in valid_languages:
-            return jsonify({'error': f'Invalid language. Must be one of: {", ".join(valid_languages)}'}), 400
+        result_id = claim['result_id']
+        try:
+            with admission.slot(), tenant_context(*tenant_from_headers(request.headers)), \
+                    tracer.span('process_document', task=data['task'], scope=data.get('scope', 'document')):
+                if data.get('scope') == 'corpus':
+                    result = agent.corpus_qa(query=data['query'], language=data['language'])
+                else:
+                    result = agent.process(
+                        task=data['task'],
+                        language=data['language'],
+                        document_1=data['document_1'],
+                        document_2=data.get('document_2'),
+                        query=data.get('query'),
+                        profile=profile_requested(request.headers),
+                        documents=data.get('documents')
+                    )
+        except BaseException:
+            result_store.abandon(result_id)
+            raise
         
-        # Validate task-specific requirements
-        if data['task'] in ['extract', 'qa'] and not data.get('query'):
-            return jsonify({'error': f'Query required for {data["task"]} task'}), 400
+        if not agent.is_reusable(result):
+            # LLM failures are not stored, so a retry with the same key runs again
+            result_store.abandon(result_id)
+            return jsonify({'success': True, 'result': result}), 200
         
-        if data['task'] == 'compare' and not data.get('document_2'):
-            return jsonify({'error': 'Second document required for comparison'}), 400
+        body = {
+            'success': True,
+            'result': result,
+            'result_id': result_id
+        }
+        etag = result_store.complete(result_id, body)
+        return jsonify(body), 200, result_headers(result_id, etag)
         
-        # Process document
-        result = agent.process(
-            task=data['task'],
-            language=data['language'],
-            document_1=data['document_1'],
-            document_2=data.get('document_2'),
-            query=data.get('query')
-        )
+    except Overloaded as e:
+        response = jsonify(overloaded_body(e))
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
         
-        return jsonify({
-            'success': True,
-            'result': result
-        })
+    except DocumentNotFound as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
         
     except Exception as e:
         return jsonify({
@@ -133,6 +356,64 @@ def process_document():
         }), 500
 
 
+@app.route('/api/results/<result_id>', methods=['GET'])
+def get_result(result_id):
+    """Fetch a stored /api/process result; supports If-None-Match."""
+    body, status, headers = fetch_result(result_id, request.headers.get('If-None-Match'))
+    if status == 304:
+        return '', 304, headers
+    return jsonify(body), status, headers
+
+
+@app.route('/api/search', methods=['GET'])
+def search_corpus():
+    """Search across all parsed documents."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    start = time.perf_counter()
+    results = agent.search_corpus(query, limit=limit)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': [{k: v for k, v in r.items() if k != 'text'} for r in results],
+        'took_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Admission counters, per-tenant LLM usage, transport, shared cache, upload storage and summary tree stats."""
+    return jsonify({'admission': admission.metrics(), 'llm': agent.llm_scheduler.metrics(),
+                    'transport': agent.transport.stats(),
+                    'shared_cache': agent.shared_cache.stats(),
+                    'uploads': upload_store.stats(),
+                    'summary_trees': agent.tree_builder.stats(),
+                    'page_index': agent.page_index.stats()})
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """List saved request profiles, newest first."""
+    return jsonify({'success': True, 'profiles': agent.profile_store.list()})
+
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a profile as speedscope JSON (default) or collapsed stacks."""
+    fmt = request.args.get('format', 'speedscope')
+    path = agent.profile_store.path(profile_id, fmt)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
+
+
 @app.errorhandler(413)
 def request_entity_too_large(error):
     """Handle file too large error."""
@@ -151,6 +432,6 @@ if __name__ == '__main__':
     
     print(f"🚀 Document Intelligence Agent starting on http://localhost:{port}")
     print(f"📁 Upload folder: {UPLOAD_FOLDER}")
-    print(f"🤖 LLM configured: {agent.client is not None}")
+    print(f"🤖 LLM configured: {agent.client is not None} (transport: {agent.transport.mode})")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,334 @@
+"""
+ASGI Backend for Document Intelligence Agent
+Async serving mode exposing the same /api/* routes as app.py. LLM calls are
+awaited on AsyncOpenAI, so one process can hold hundreds of in-flight
+requests without a thread per request.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+import json
+import time
+import errno
+import shutil
+import asyncio
+from pathlib import Path
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.utils import secure_filename
+
+# Shares the agent, upload folder and validation rules with the Flask app
+from admission import Overloaded
+from assets import static_assets
+from documents import DocumentNotFound
+from scheduler import tenant_context, tenant_from_headers
+from storage import upload_store
+from tracing import trace_id_from_headers, tracer
+from results import NEW, PENDING
+from app import (
+    admission, agent, allowed_file, fetch_result, idempotency_key, overloaded_body, profile_requested,
+    result_headers, result_store, stored_response, validate_process_request,
+    ALLOWED_EXTENSIONS, IDEMPOTENCY_POLL, IDEMPOTENCY_WAIT, MAX_FILE_SIZE, STORAGE_FULL, UPLOAD_FOLDER
+)
+
+
+async def join_trace(request, call_next):
+    """Join the caller's trace (X-Trace-Id) and echo the trace ID back."""
+    trace_id = trace_id_from_headers(request.headers)
+    with tracer.trace(trace_id):
+        response = await call_next(request)
+    response.headers['X-Trace-Id'] = trace_id
+    return response
+
+
+async def index(request):
+    """Serve the main page (rewritten to the fingerprinted assets when built)."""
+    path, headers = static_assets.index(request.headers.get('Accept-Encoding', ''))
+    return FileResponse(path, media_type=static_assets.mimetype(path), headers=headers)
+
+
+async def fingerprinted_asset(request):
+    """Serve a fingerprinted asset, precompressed, with immutable caching."""
+    asset = static_assets.resolve(request.path_params['filename'], request.headers.get('Accept-Encoding', ''))
+    if asset is None:
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    path, headers = asset
+    return FileResponse(path, media_type=static_assets.mimetype(path), headers=headers)
+
+
+async def health(request):
+    """Health check endpoint."""
+    return JSONResponse({
+        'status': 'healthy',
+        'service': 'Document Intelligence Agent',
+        'version': '1.0.0'
+    })
+
+
+TOO_LARGE = {'error': 'File too large. Maximum size is 16MB'}
+
+# Bytes copied from the spooled upload to the upload folder at a time
+_COPY_CHUNK = 1024 * 1024
+
+
+class BodyTooLarge(Exception):
+    """Raised while reading a request body once it exceeds its size limit."""
+
+
+def limit_body(request: Request, limit: int) -> Request:
+    """
+    The same request with a body that stops being read past limit bytes,
+    like Flask's MAX_CONTENT_LENGTH, for clients that send no (or a false)
+    Content-Length.
+    """
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > limit:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+def _declared_length(request: Request) -> int:
+    try:
+        return int(request.headers.get('Content-Length', 0))
+    except ValueError:
+        return 0
+
+
+def _save_upload(filepath: str, source) -> None:
+    source.seek(0)
+    with open(filepath, 'wb') as f:
+        shutil.copyfileobj(source, f, _COPY_CHUNK)
+
+
+async def upload_file(request):
+    """Handle file upload."""
+    # Reject before reading the body, as Flask does with MAX_CONTENT_LENGTH
+    if _declared_length(request) > MAX_FILE_SIZE:
+        return JSONResponse(TOO_LARGE, status_code=413)
+    try:
+        form = await limit_body(request, MAX_FILE_SIZE).form()
+    except BodyTooLarge:
+        return JSONResponse(TOO_LARGE, status_code=413)
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        return JSONResponse({'error': 'No file provided'}, status_code=400)
+
+    if file.filename == '':
+        return JSONResponse({'error': 'No file selected'}, status_code=400)
+
+    if not allowed_file(file.filename):
+        return JSONResponse({'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}, status_code=400)
+
+    # The multipart parser spooled the file (to disk past 1 MB); it is copied, never read whole
+    if not await run_in_threadpool(upload_store.ensure_room, file.size):
+        return JSONResponse(STORAGE_FULL, status_code=507, headers={'Retry-After': str(STORAGE_FULL['retry_after'])})
+
+    try:
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        with tracer.span('upload_file', filename=filename, bytes=file.size):
+            await run_in_threadpool(_save_upload, filepath, file.file)
+        upload_store.add(filepath)
+        # Long documents get a summary tree while the LLM is idle
+        agent.schedule_summary_tree({'path': filepath})
+
+        return JSONResponse({
+            'success': True,
+            'filename': filename,
+            'filepath': filepath
+        })
+    except OSError as e:
+        if e.errno != errno.ENOSPC:
+            return JSONResponse({'error': f'Upload failed: {str(e)}'}, status_code=500)
+        # Disk full despite the quota: drop the partial file and let the client retry
+        Path(filepath).unlink(missing_ok=True)
+        return JSONResponse(STORAGE_FULL, status_code=507, headers={'Retry-After': str(STORAGE_FULL['retry_after'])})
+    except Exception as e:
+        return JSONResponse({'error': f'Upload failed: {str(e)}'}, status_code=500)
+
+
+async def read_json(request):
+    """Parse a JSON body without caching the raw bytes on the request (freed once parsed)."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+    return json.loads(body)
+
+
+async def process_document(request):
+    """Process documents based on task type."""
+    try:
+        data = await read_json(request)
+
+        error = validate_process_request(data)
+        key, key_error = idempotency_key(request.headers)
+        if error or key_error:
+            return JSONResponse({'error': error or key_error}, status_code=400)
+
+        # Duplicates (retries, double clicks) are answered from the result store
+        state, claim = await run_in_threadpool(result_store.begin, key, data)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while state == PENDING and time.monotonic() < deadline:
+            await asyncio.sleep(IDEMPOTENCY_POLL)
+            state, claim = await run_in_threadpool(result_store.begin, key, data)
+        if state != NEW:
+            body, status, headers = stored_response(state, claim)
+            return JSONResponse(body, status_code=status, headers=headers)
+
+        result_id = claim['result_id']
+        try:
+            async with admission.slot_async():
+                with tenant_context(*tenant_from_headers(request.headers)), \
+                        tracer.span('process_document', task=data['task'], scope=data.get('scope', 'document')):
+                    if data.get('scope') == 'corpus':
+                        result = await agent.corpus_qa_async(query=data['query'], language=data['language'])
+                    else:
+                        result = await agent.process_async(
+                            task=data['task'],
+                            language=data['language'],
+                            document_1=data['document_1'],
+                            document_2=data.get('document_2'),
+                            query=data.get('query'),
+                            profile=profile_requested(request.headers),
+                            documents=data.get('documents')
+                        )
+        except BaseException:
+            await run_in_threadpool(result_store.abandon, result_id)
+            raise
+
+        if not agent.is_reusable(result):
+            # LLM failures are not stored, so a retry with the same key runs again
+            await run_in_threadpool(result_store.abandon, result_id)
+            return JSONResponse({'success': True, 'result': result})
+
+        body = {
+            'success': True,
+            'result': result,
+            'result_id': result_id
+        }
+        etag = await run_in_threadpool(result_store.complete, result_id, body)
+        return JSONResponse(body, headers=result_headers(result_id, etag))
+
+    except Overloaded as e:
+        return JSONResponse(overloaded_body(e), status_code=429,
+                            headers={'Retry-After': str(e.retry_after)})
+
+    except DocumentNotFound as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=404)
+
+    except Exception as e:
+        return JSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+
+async def get_result(request):
+    """Fetch a stored /api/process result; supports If-None-Match."""
+    body, status, headers = await run_in_threadpool(
+        fetch_result, request.path_params['result_id'], request.headers.get('If-None-Match')
+    )
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def search_corpus(request):
+    """Search across all parsed documents."""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return JSONResponse({'error': 'Query parameter q is required'}, status_code=400)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        return JSONResponse({'error': 'limit must be an integer'}, status_code=400)
+
+    start = time.perf_counter()
+    results = await run_in_threadpool(agent.search_corpus, query, limit)
+    return JSONResponse({
+        'success': True,
+        'query': query,
+        'results': [{k: v for k, v in r.items() if k != 'text'} for r in results],
+        'took_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
+async def metrics(request):
+    """Admission counters, per-tenant LLM usage, transport, shared cache, upload storage and summary tree stats."""
+    return JSONResponse({'admission': admission.metrics(), 'llm': agent.llm_scheduler.metrics(),
+                         'transport': agent.transport.stats(),
+                         'shared_cache': agent.shared_cache.stats(),
+                         'uploads': upload_store.stats(),
+                         'summary_trees': agent.tree_builder.stats(),
+                         'page_index': agent.page_index.stats()})
+
+
+async def list_profiles(request):
+    """List saved request profiles, newest first."""
+    return JSONResponse({'success': True, 'profiles': agent.profile_store.list()})
+
+
+async def download_profile(request):
+    """Download a profile as speedscope JSON (default) or collapsed stacks."""
+    fmt = request.query_params.get('format', 'speedscope')
+    path = agent.profile_store.path(request.path_params['profile_id'], fmt)
+    if path is None:
+        return JSONResponse({'error': 'Profile not found'}, status_code=404)
+    return FileResponse(path, filename=os.path.basename(path))
+
+
+async def not_found(request, exc):
+    """Handle 404 errors."""
+    return JSONResponse({'error': 'Endpoint not found'}, status_code=404)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/health', health, methods=['GET']),
+        Route('/api/upload', upload_file, methods=['POST']),
+        Route('/api/process', process_document, methods=['POST']),
+        Route('/api/results/{result_id}', get_result, methods=['GET']),
+        Route('/api/search', search_corpus, methods=['GET']),
+        Route('/api/metrics', metrics, methods=['GET']),
+        Route('/api/profiles', list_profiles, methods=['GET']),
+        Route('/api/profiles/{profile_id}', download_profile, methods=['GET']),
+        Route('/static/dist/{filename:path}', fingerprinted_asset),
+        Mount('/static', StaticFiles(directory='static'), name='static'),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['X-Trace-Id', 'ETag', 'Location', 'Idempotent-Replayed']),
+        Middleware(BaseHTTPMiddleware, dispatch=join_trace)
+    ],
+    exception_handlers={404: not_found}
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('FLASK_PORT', 5000))
+    print(f"🚀 Document Intelligence Agent (async) starting on http://localhost:{port}")
+    print(f"📁 Upload folder: {UPLOAD_FOLDER}")
+    print(f"🤖 LLM configured: {agent.async_client is not None} (transport: {agent.transport.mode})")
+
+    uvicorn.run(app, host='0.0.0.0', port=port)
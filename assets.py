@@ -0,0 +1,165 @@
+"""
+Static asset build and serving for DIA.
+Content-hashes the stylesheet and script into static/dist/, precompresses them
+(gzip, and brotli when installed) and rewrites index.html to reference the
+hashed names. Hashed files are served with immutable cache headers and the
+best encoding the client accepts; index.html is always revalidated.
+
+Build ahead of deployment (the servers also rebuild at startup when the
+sources changed and the folder is writable):
+    python assets.py
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from persistence import load_json, save_json, write_atomic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files referenced from index.html as /static/<path>
+ASSETS = ('css/style.css', 'js/app.js')
+
+IMMUTABLE = 'public, max-age=31536000, s-maxage=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Preferred first
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _accepted(accept_encoding: str) -> set:
+    """Encodings allowed by an Accept-Encoding header (q=0 excludes)."""
+    accepted = set()
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    if '*' in accepted:
+        accepted.update(name for name, _ in _ENCODINGS)
+    return accepted
+
+
+class StaticAssets:
+    """Fingerprinted, precompressed copies of the static assets."""
+
+    def __init__(self, static_dir: str = 'static'):
+        self.static_dir = Path(static_dir)
+        self.dist_dir = self.static_dir / 'dist'
+        self.manifest: Dict = {}
+
+    def _sources_digest(self) -> str:
+        digest = hashlib.sha256()
+        for name in ('index.html',) + ASSETS:
+            digest.update(name.encode('utf-8'))
+            digest.update((self.static_dir / name).read_bytes())
+        return digest.hexdigest()
+
+    def _write(self, relative: str, data: bytes) -> None:
+        """Write a file and its compressed variants under dist/."""
+        path = self.dist_dir / relative
+        write_atomic(str(path), data)
+        write_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write_atomic(f"{path}.br", brotli.compress(data, quality=11))
+        else:
+            # A .br left by an earlier build with brotli would be stale
+            Path(f"{path}.br").unlink(missing_ok=True)
+
+    def build(self) -> Dict:
+        """Write hashed, precompressed assets and the rewritten index.html. Returns the manifest."""
+        hashed = {}
+        for name in ASSETS:
+            data = (self.static_dir / name).read_bytes()
+            source = Path(name)
+            target = str(source.with_name(f"{source.stem}.{hashlib.sha256(data).hexdigest()[:12]}{source.suffix}"))
+            self._write(target, data)
+            hashed[name] = target
+
+        index = (self.static_dir / 'index.html').read_text(encoding='utf-8')
+        for name, target in hashed.items():
+            index = index.replace(f'"/static/{name}"', f'"/static/dist/{target}"')
+        self._write('index.html', index.encode('utf-8'))
+
+        # Drop files of earlier builds
+        keep = {'manifest.json', 'index.html'} | set(hashed.values())
+        for path in self.dist_dir.rglob('*'):
+            relative = str(path.relative_to(self.dist_dir))
+            for suffix in ('.gz', '.br'):
+                relative = relative[:-len(suffix)] if relative.endswith(suffix) else relative
+            if path.is_file() and relative not in keep:
+                path.unlink()
+
+        manifest = {
+            'sources': self._sources_digest(),
+            'assets': hashed,
+            'encodings': [name for name, _ in _ENCODINGS if name != 'br' or brotli is not None]
+        }
+        save_json(str(self.dist_dir / 'manifest.json'), manifest)
+        return manifest
+
+    def load(self) -> bool:
+        """Use the built assets if they match the sources, rebuilding them if possible."""
+        digest = None
+        try:
+            digest = self._sources_digest()
+            manifest = load_json(str(self.dist_dir / 'manifest.json'), {})
+            if manifest.get('sources') != digest:
+                self.build()
+                manifest = load_json(str(self.dist_dir / 'manifest.json'), {})
+        except OSError:
+            manifest = {}
+        # Read-only deployments without a prebuilt dist/ serve the plain files
+        self.manifest = manifest if digest and manifest.get('sources') == digest else {}
+        return bool(self.manifest)
+
+    def index(self, accept_encoding: str = '') -> Tuple[str, Dict[str, str]]:
+        """(file, headers) for the main page."""
+        if not self.manifest:
+            return str(self.static_dir / 'index.html'), {'Cache-Control': REVALIDATE}
+        return self._negotiate(self.dist_dir / 'index.html', accept_encoding, REVALIDATE)
+
+    def resolve(self, relative: str, accept_encoding: str = '') -> Optional[Tuple[str, Dict[str, str]]]:
+        """(file, headers) for a hashed asset under dist/, or None."""
+        if relative not in self.manifest.get('assets', {}).values():
+            return None
+        return self._negotiate(self.dist_dir / relative, accept_encoding, IMMUTABLE)
+
+    @staticmethod
+    def _negotiate(path: Path, accept_encoding: str, cache_control: str) -> Tuple[str, Dict[str, str]]:
+        headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        accepted = _accepted(accept_encoding)
+        for encoding, suffix in _ENCODINGS:
+            variant = Path(f"{path}{suffix}")
+            if encoding in accepted and variant.is_file():
+                headers['Content-Encoding'] = encoding
+                return str(variant), headers
+        return str(path), headers
+
+    @staticmethod
+    def mimetype(path: str) -> str:
+        """Content type of the uncompressed file."""
+        for suffix in ('.br', '.gz'):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+        return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+static_assets = StaticAssets()
+
+
+if __name__ == '__main__':
+    built = static_assets.build()
+    for source, target in built['assets'].items():
+        print(f"{source} -> dist/{target}")
+    print(f"Encodings: {', '.join(built['encodings'])}"
+          + ('' if brotli is not None else ' (install brotli for .br files)'))
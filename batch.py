@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Batch processor for DIA.
+Runs a task over a directory of documents or a JSONL manifest without going
+through HTTP. Files are parsed across a process pool, LLM calls run with
+bounded async concurrency, and results are appended to a JSONL file as they
+finish. The output doubles as the checkpoint: re-running the same command
+skips jobs that already succeeded.
+
+Usage:
+    python batch.py archive/ --task summarize --language en --output summaries.jsonl
+    python batch.py jobs.jsonl --output results.jsonl --workers 8 --concurrency 32
+
+Manifest lines are JSON objects with the /api/process fields, plus an
+optional "id" (defaults to the line number):
+    {"id": "circ-101", "task": "qa", "document_1": "archive/101.pdf", "query": "What is the deadline?"}
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from agent import DocumentIntelligenceAgent, DocumentParser
+from documents import PATH, documents_error, handle_error, looks_like_path, parse_handle
+from parsers import FORMATS
+from scheduler import BATCH, tenant_context
+
+TASKS = ('summarize', 'extract', 'compare', 'qa')
+LANGUAGES = ('en', 'or', 'bilingual')
+
+
+def load_jobs(source: str, defaults: Dict) -> List[Dict]:
+    """Jobs from a directory (one per supported file) or a JSONL manifest."""
+    path = Path(source)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob('*') if p.is_file() and p.suffix.lower() in FORMATS)
+        return [dict(defaults, id=str(p.relative_to(path)), document_1={'path': str(p)}) for p in files]
+
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = dict(defaults, **json.loads(line))
+            job['id'] = str(job.get('id', number))
+            # Relative paths in a manifest are relative to the manifest
+            for field in ('document_1', 'document_2'):
+                job[field] = _relative_to(path.parent, job.get(field))
+            if isinstance(job.get('documents'), list):
+                job['documents'] = [_relative_to(path.parent, value) for value in job['documents']]
+            jobs.append(job)
+    return jobs
+
+
+def _relative_to(folder: Path, value):
+    """
+    A path handle resolved against the manifest's folder; other values unchanged.
+    Plain strings shaped like a path ("archive/101.pdf") are path handles, so a
+    missing file fails its job instead of being processed as inline text.
+    """
+    if isinstance(value, str) and looks_like_path(value):
+        value = {'path': value}
+    if isinstance(value, dict) and isinstance(value.get('path'), str) and not os.path.isabs(value['path']):
+        return {'path': str(folder / value['path'])}
+    return value
+
+
+def _missing_file(value) -> Optional[str]:
+    """Error message for a path handle naming a file that does not exist, or None."""
+    if isinstance(value, dict) and isinstance(value.get('path'), str) and not os.path.isfile(value['path']):
+        return f"File not found: {value['path']}"
+    return None
+
+
+def validate_job(job: Dict) -> Optional[str]:
+    """Error message for a malformed job, or None."""
+    if job.get('task') not in TASKS:
+        return f"Invalid task: {job.get('task')}"
+    if job.get('language') not in LANGUAGES:
+        return f"Invalid language: {job.get('language')}"
+    if not job.get('document_1'):
+        return 'Missing document_1'
+    if job['task'] == 'compare' and not job.get('document_2'):
+        return 'Second document required for comparison'
+    if job['task'] in ('extract', 'qa') and not job.get('query'):
+        return f"Query required for {job['task']} task"
+    for field in ('document_1', 'document_2'):
+        if job.get(field):
+            error = handle_error(job[field]) or _missing_file(job[field])
+            if error:
+                return f'{field}: {error}'
+    if job.get('documents') is not None:
+        error = documents_error(job['documents'], job['task'])
+        if error:
+            return error
+        for i, value in enumerate(job['documents']):
+            error = _missing_file(value)
+            if error:
+                return f'documents[{i}]: {error}'
+    return None
+
+
+def completed_ids(output: str) -> Set[str]:
+    """Jobs already written with status ok (a torn last line from a crash is ignored)."""
+    done = set()
+    try:
+        with open(output, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'ok':
+                    done.add(record['id'])
+    except OSError:
+        pass
+    return done
+
+
+def parse_in_worker(file_path: str, normalize: bool):
+    """Process-pool entry point: parse and normalize one file."""
+    return DocumentParser.parse_document(file_path, normalize)
+
+
+class ResultWriter:
+    """Appends one JSON line per finished job, flushed and synced so a crash loses nothing."""
+
+    def __init__(self, output: str):
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(output, 'a+', encoding='utf-8')
+        # Terminate a line torn by a crash before appending
+        if self.file.tell() > 0:
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != '\n':
+                self.file.write('\n')
+
+    def write(self, record: Dict) -> None:
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class Progress:
+    """Live throughput and ETA on stderr."""
+
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.ok = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.tty = sys.stderr.isatty()
+
+    @property
+    def done(self) -> int:
+        return self.ok + self.failed
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done
+        eta = remaining / rate if rate else float('inf')
+        eta_text = time.strftime('%H:%M:%S', time.gmtime(eta)) if eta != float('inf') else '--:--:--'
+        return (f"{self.done}/{self.total} done ({self.ok} ok, {self.failed} failed, {self.skipped} skipped) "
+                f"| {rate * 60:.1f} docs/min | elapsed {time.strftime('%H:%M:%S', time.gmtime(elapsed))} "
+                f"| ETA {eta_text}")
+
+    async def report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval if self.tty else interval * 10)
+            self.print()
+
+    def print(self, final: bool = False) -> None:
+        if self.tty:
+            print(f"\r{self.line()}", end='\n' if final else '', file=sys.stderr, flush=True)
+        else:
+            print(self.line(), file=sys.stderr, flush=True)
+
+
+async def run_batch(agent: DocumentIntelligenceAgent, jobs: List[Dict], writer: ResultWriter,
+                    progress: Progress, pool: ProcessPoolExecutor, concurrency: int, tenant: str) -> None:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def resolve(value) -> Dict:
+        """Parse file handles in the pool; text and doc_id handles go to the agent as-is."""
+        handle = parse_handle(value)
+        if handle.kind != PATH:
+            return {handle.kind: handle.value}
+        parsed = await loop.run_in_executor(pool, parse_in_worker, handle.value, agent.normalize_documents)
+        return {'doc_id': agent.register_parsed(handle.value, *parsed).doc_id}
+
+    async def run_job(job: Dict) -> Dict:
+        start = time.perf_counter()
+        record = {'id': job['id'], 'task': job['task'], 'language': job['language']}
+        error = validate_job(job)
+        if error:
+            return dict(record, status='error', error=error)
+        try:
+            documents = [await resolve(job[f]) for f in ('document_1', 'document_2') if job.get(f)]
+            more = [await resolve(value) for value in job.get('documents') or []]
+            result = await agent.process_async(
+                task=job['task'],
+                language=job['language'],
+                document_1=documents[0],
+                document_2=documents[1] if len(documents) > 1 else None,
+                query=job.get('query'),
+                profile=False,
+                documents=more or None
+            )
+        except Exception as e:
+            return dict(record, status='error', error=str(e), elapsed_ms=round((time.perf_counter() - start) * 1000))
+        ok = agent.is_reusable(result)
+        return dict(record, status='ok' if ok else 'error', result=result,
+                    elapsed_ms=round((time.perf_counter() - start) * 1000))
+
+    async def worker() -> None:
+        with tenant_context(tenant, BATCH):
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await run_job(job)
+                writer.write(record)
+                if record['status'] == 'ok':
+                    progress.ok += 1
+                else:
+                    progress.failed += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a directory or JSONL manifest of documents offline")
+    parser.add_argument("source", help="Directory of documents or JSONL manifest")
+    parser.add_argument("--output", required=True, help="JSONL results file (also the resume checkpoint)")
+    parser.add_argument("--task", default="summarize", choices=TASKS, help="Default task")
+    parser.add_argument("--language", default="en", choices=LANGUAGES, help="Default language")
+    parser.add_argument("--query", help="Default query (extract/qa)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Parser processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Jobs in flight (bounds LLM calls)")
+    parser.add_argument("--tenant", default="batch", help="Tenant for config.json quotas")
+    parser.add_argument("--no-resume", action="store_true", help="Re-run jobs already in the output")
+    parser.add_argument("--config", default="config.json", help="Agent configuration")
+    args = parser.parse_args()
+
+    defaults = {'task': args.task, 'language': args.language}
+    if args.query:
+        defaults['query'] = args.query
+    jobs = load_jobs(args.source, defaults)
+    done = set() if args.no_resume else completed_ids(args.output)
+    pending = [job for job in jobs if job['id'] not in done]
+
+    agent = DocumentIntelligenceAgent(args.config)
+    # Batch calls may use the whole LLM budget unless config.json sets a quota for the tenant
+    agent.llm_scheduler.max_concurrency = max(agent.llm_scheduler.max_concurrency, args.concurrency)
+    agent.llm_scheduler.policies = dict(agent.llm_scheduler.policies)
+    policy = dict(agent.llm_scheduler.policies.get(args.tenant, {}))
+    policy.setdefault('max_concurrency', args.concurrency)
+    agent.llm_scheduler.policies[args.tenant] = policy
+
+    progress = Progress(len(pending), len(jobs) - len(pending))
+    print(f"{len(jobs)} jobs, {len(done & {job['id'] for job in jobs})} already done, {len(pending)} to run",
+          file=sys.stderr)
+    writer = ResultWriter(args.output)
+
+    async def run():
+        reporter = asyncio.create_task(progress.report(1.0))
+        try:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                await run_batch(agent, pending, writer, progress, pool, args.concurrency, args.tenant)
+        finally:
+            reporter.cancel()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run the same command to resume.", file=sys.stderr)
+    finally:
+        writer.close()
+        progress.print(final=True)
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
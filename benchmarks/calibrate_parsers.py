@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Parser calibration for DIA.
+Times every installed parser backend on a document corpus and records, per
+format, the fastest one whose output matches the default backend closely
+enough. The agent picks up the result on its next start unless config.json
+pins a backend.
+
+Usage:
+    python benchmarks/calibrate_parsers.py --docs test_documents --rounds 5
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parsers import parser_registry  # noqa: E402
+
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "/tmp/dia_cache" if os.environ.get("VERCEL") else ".dia_cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select the fastest parser backend per format")
+    parser.add_argument("--docs", default="test_documents", help="Directory of sample documents")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed passes per backend (best is kept)")
+    parser.add_argument("--min-quality", type=float, default=0.95,
+                        help="Minimum word recall against the default backend")
+    parser.add_argument("--output", default=os.path.join(CACHE_FOLDER, "parser_calibration.json"),
+                        help="Where to save the calibration")
+    args = parser.parse_args()
+
+    parser_registry.configure(calibration_path=args.output)
+    report = parser_registry.calibrate(args.docs, rounds=args.rounds, min_quality=args.min_quality)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Load test for the DIA /api/process endpoint.
+Fires concurrent requests at a running server and reports throughput and
+latency percentiles, to compare the Flask (app.py) and ASGI (asgi.py) paths.
+
+Each request numbers its query (or, without a query, its document), so the
+result, semantic answer and LLM response caches all miss and every request
+waits on the LLM. --same-payload sends the payload unchanged to measure the
+cached path instead.
+
+Usage:
+    python benchmarks/loadtest.py --url http://localhost:5000 --concurrency 200 --requests 1000
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+DEFAULT_PAYLOAD = {
+    "task": "qa",
+    "language": "en",
+    "document_1": "Tender No: PWD/RB/2024/TN-45678. Submission Deadline: January 15, 2025, 3:00 PM IST. "
+                  "Earnest Money Deposit: Rs 35 crores.",
+    "query": "What is the submission deadline?"
+}
+
+
+def vary(payload, index):
+    """A copy of the payload no earlier request has sent, so no cache can answer it."""
+    varied = dict(payload)
+    if varied.get("query"):
+        varied["query"] = f"{varied['query']} (request {index})"
+    else:
+        varied["document_1"] = f"{varied.get('document_1', '')}\nRequest reference: {index}"
+    return varied
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+async def run(url, payload, total, concurrency, timeout, same_payload=False):
+    latencies = []
+    statuses = Counter()
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            body = payload if same_payload else vary(payload, index)
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/api/process", json=body)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "same_payload": same_payload,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0
+        },
+        "statuses": {str(k): v for k, v in statuses.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the DIA /api/process endpoint")
+    parser.add_argument("--url", default="http://localhost:5000", help="Server base URL")
+    parser.add_argument("--requests", type=int, default=500, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight at once")
+    parser.add_argument("--payload", help="JSON file with the /api/process request body")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--same-payload", action="store_true",
+                        help="Send the payload unchanged, so requests after the first are served from caches")
+    args = parser.parse_args()
+
+    payload = DEFAULT_PAYLOAD
+    if args.payload:
+        with open(args.payload) as f:
+            payload = json.load(f)
+
+    report = asyncio.run(run(args.url.rstrip("/"), payload, args.requests, args.concurrency, args.timeout,
+                             args.same_payload))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for DIA.
+Runs each task on synthetic documents of several sizes, each case in a fresh
+process with an empty cache, and reports the tracemalloc peak (also as
+"copies" of the input document) and the peak RSS growth. No LLM is called:
+the agent runs without an API key, so the whole pipeline up to the request
+is measured.
+
+Documents are loaded concurrently, so allocations overlap differently from
+run to run; each case is run --runs times and its highest peak is reported.
+With --check, exits 1 if any case's peak exceeds the saved baseline by more
+than --tolerance; --update saves the current results as the baseline. Only
+the tracemalloc peak is checked: RSS growth depends on the allocator and on
+what the interpreter had already mapped, so it is shown for information.
+
+Usage:
+    python benchmarks/memory.py
+    python benchmarks/memory.py --sizes 1,4,16 --check
+    python benchmarks/memory.py --runs 5 --update
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "memory_baseline.json"
+TASKS = ("summarize", "extract", "qa", "compare")
+
+_ENGLISH = ("tender notice department works contract bid deadline submission amount eligibility "
+            "district officer road bridge rupees crore annexure clause schedule payment").split()
+_ODIA = "ଜିଲ୍ଲା ଅଧିକାରୀ ବିଜ୍ଞପ୍ତି ଶେଷ ତାରିଖ ଟେଣ୍ଡର ଦରଖାସ୍ତ ଯୋଗ୍ୟତା ଅର୍ଥରାଶି ସଡ଼କ".split()
+
+
+def synthetic_document(megabytes: float, seed: int) -> str:
+    """Pages of numbered clauses (mostly English, some Odia) with running headers and page numbers."""
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    pages, size, number = [], 0, 0
+    while size < target:
+        number += 1
+        lines = ["GOVERNMENT OF ODISHA - WORKS DEPARTMENT", f"Tender No. WD/{seed}/2024", ""]
+        for clause in range(8):
+            words = [rng.choice(_ODIA if rng.random() < 0.2 else _ENGLISH) for _ in range(rng.randint(40, 90))]
+            lines.append(f"{number}.{clause + 1} " + " ".join(words) + f" by {rng.randint(1, 28)} March 2025.")
+            lines.append("")
+        lines.append(f"Page {number}")
+        page = "\n".join(lines)
+        pages.append(page)
+        size += len(page)
+    return "\f".join(pages)
+
+
+def _rss_bytes() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return usage if platform.system() == "Darwin" else usage * 1024
+
+
+def run_case(task: str, megabytes: float) -> dict:
+    """Measure one task on one document size (call in a fresh process)."""
+    sys.path.insert(0, str(ROOT))
+    from agent import DocumentIntelligenceAgent
+
+    agent = DocumentIntelligenceAgent(str(ROOT / "config.json"))
+    doc_1 = synthetic_document(megabytes, seed=1)
+    doc_2 = synthetic_document(megabytes, seed=2) if task == "compare" else None
+    query = {"extract": "Tender number, deadline and amount", "qa": "What is the submission deadline?"}.get(task)
+    input_bytes = sys.getsizeof(doc_1) + (sys.getsizeof(doc_2) if doc_2 else 0)
+
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    result = agent.process(task=task, language="en", document_1={"text": doc_1},
+                           document_2={"text": doc_2} if doc_2 else None, query=query, profile=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "task": task,
+        "size_mb": megabytes,
+        "input_mb": round(input_bytes / 2 ** 20, 2),
+        "peak_mb": round(peak / 2 ** 20, 2),
+        "copies": round(peak / input_bytes, 2),
+        "rss_growth_mb": round((_rss_bytes() - rss_before) / 2 ** 20, 2),
+        "ok": "output" in result
+    }
+
+
+def measure(task: str, megabytes: float, runs: int = 1) -> dict:
+    """The run with the highest tracemalloc peak out of runs fresh processes."""
+    return max((_measure_once(task, megabytes) for _ in range(runs)), key=lambda r: r["peak_mb"])
+
+
+def _measure_once(task: str, megabytes: float) -> dict:
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, CACHE_FOLDER=cache, OPENAI_API_KEY="", LLM_TRANSPORT="live",
+                   TRACE_EXPORT="off", PROFILE_SAMPLE_RATE="0", SUMMARY_TREE_BUILD="off")
+        completed = subprocess.run(
+            [sys.executable, __file__, "--case", task, str(megabytes)],
+            cwd=str(ROOT), env=env, capture_output=True, text=True, check=True
+        )
+    # The agent may print warnings first; the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory per task and document size")
+    parser.add_argument("--tasks", default=",".join(TASKS), help="Comma-separated tasks")
+    parser.add_argument("--sizes", default="0.25,1,4", help="Comma-separated document sizes in MB")
+    parser.add_argument("--check", action="store_true", help="Fail if a peak regresses past the baseline")
+    parser.add_argument("--update", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed growth over the baseline peak")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per case; the highest peak is kept")
+    parser.add_argument("--case", nargs=2, metavar=("TASK", "MB"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], float(args.case[1]))))
+        return
+
+    results = []
+    print(f"{'task':<10} {'doc MB':>7} {'input MB':>9} {'peak MB':>8} {'copies':>7} {'RSS +MB*':>8}")
+    for task in args.tasks.split(","):
+        for size in args.sizes.split(","):
+            result = measure(task, float(size), args.runs)
+            results.append(result)
+            print(f"{result['task']:<10} {result['size_mb']:>7} {result['input_mb']:>9} {result['peak_mb']:>8} "
+                  f"{result['copies']:>7} {result['rss_growth_mb']:>8}", flush=True)
+
+    print("* RSS growth is informational; --check compares the tracemalloc peak only")
+
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    if args.update:
+        baseline.update({f"{r['task']}:{r['size_mb']}": r["peak_mb"] for r in results})
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {BASELINE}")
+
+    if args.check:
+        regressions = []
+        for r in results:
+            allowed = baseline.get(f"{r['task']}:{r['size_mb']}")
+            if allowed is not None and r["peak_mb"] > allowed * (1 + args.tolerance):
+                regressions.append(f"{r['task']} at {r['size_mb']} MB: peak {r['peak_mb']} MB, baseline {allowed} MB")
+        if regressions:
+            print("Memory regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+        print("No memory regressions.")
+
+
+if __name__ == "__main__":
+    main()
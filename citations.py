@@ -0,0 +1,300 @@
+"""
+Citation verification for DIA.
+Every quoted passage and figure in an answer is checked against the document
+it is about. A document is indexed once: its words are folded (case, Odia
+digits, joiners and common spelling variants) and every run of three words is
+kept in a sorted array of hashes with its position, a compact stand-in for a
+suffix array. A quote is then located by looking up its own word triples and
+voting on where they start, in time proportional to the quote, so checking an
+answer costs far less than the LLM call that produced it.
+"""
+
+import re
+import bisect
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from extraction import NOT_AVAILABLE, locate, page_of
+
+_TOKEN = re.compile(r'[\w\u0b01-\u0b03\u0b3c\u0b3e-\u0b57\u0b62\u0b63\u200c\u200d]+')
+# Times ("3:00") are one number, so their parts are not checked as figures on their own
+_NUMBER = re.compile(
+    r'[0-9\u0b66-\u0b6f]{1,2}:[0-9\u0b66-\u0b6f]{2}(?![0-9\u0b66-\u0b6f])|'
+    r'[0-9\u0b66-\u0b6f][0-9\u0b66-\u0b6f,]*(?:\.[0-9\u0b66-\u0b6f]+)*'
+)
+# Quoted spans: straight or curly double quotes, curly single quotes, guillemets
+_QUOTE = re.compile(
+    r'"([^"\n]{3,500})"|\u201c([^\u201d\n]{3,500})\u201d|'
+    r'\u2018([^\u2019\n]{3,500})\u2019|\u00ab([^\u00bb\n]{3,500})\u00bb'
+)
+# Numbers that refer to the answer's own structure rather than the document's content
+_REFERENCE = re.compile(
+    r'(?:\b(?:page|pages|p\.|pp\.|section|sections|part|source|document|chunk)\s*|^\s*|\[)$',
+    re.IGNORECASE
+)
+_LIST_MARKER = re.compile(r'[.)]\s')
+# End of a sentence in an answer: a figure and a quote on either side are about different things
+_SENTENCE_END = re.compile(r'\n|[.!?]["\u201d\u2019\u00bb]?(?:\s|$)')
+
+# Odia digits read as ASCII; joiners dropped; letters often typed either way folded together
+_FOLD = str.maketrans({
+    **{chr(0x0b66 + i): str(i) for i in range(10)},
+    '\u200c': None, '\u200d': None,
+    '\u0b5f': '\u0b2f',  # YYA -> YA
+    '\u0b71': '\u0b35',  # WA -> VA
+})
+
+# Packed trigram entries: 40 hash bits above 24 position bits
+_POSITION_BITS = 24
+_POSITION_MASK = (1 << _POSITION_BITS) - 1
+_HASH_MASK = (1 << 40) - 1
+# Characters tokenized at a time while indexing
+_SLICE_CHARS = 1 << 14
+# Entries per sorted run (a run is searched by bisection)
+_RUN_SIZE = 1 << 17
+# Positions looked up per trigram, so boilerplate repeated on every page stays cheap
+_MAX_HITS = 8
+# How far from a quoted passage a figure stated with it may be
+_NEAR_CHARS = 300
+
+
+def fold(token: str) -> str:
+    """Comparison form of a word."""
+    if not unicodedata.is_normalized('NFC', token):
+        token = unicodedata.normalize('NFC', token)
+    return token.translate(_FOLD).casefold()
+
+
+def _number_key(number: str) -> str:
+    """Comparison form of a number: ASCII digits, no thousands separators or leading zeros."""
+    number = number.translate(_FOLD).replace(',', '')
+    whole, _, fraction = number.partition('.')
+    whole = whole.lstrip('0') or '0'
+    return f"{whole}.{fraction}" if fraction else whole
+
+
+def _add_number(numbers: Dict[str, int], match: re.Match) -> None:
+    """Index a number found in a document, with the parts of dotted numbers (dates) on their own."""
+    number = match.group().rstrip(',')
+    for key in [_number_key(number)] + [_number_key(part) for part in number.split('.') if part]:
+        numbers.setdefault(key, match.start())
+
+
+def _find(numbers: Dict[str, int], number: str) -> Optional[int]:
+    key = _number_key(number)
+    if key in numbers:
+        return numbers[key]
+    # A decimal such as 05.03 may be part of a date written with other separators
+    parts = [_number_key(part) for part in number.split('.') if part]
+    if len(parts) > 1 and all(part in numbers for part in parts):
+        return numbers[parts[0]]
+    return None
+
+
+def trivial(number: str) -> bool:
+    """Numbers found in almost any document (one or two digits, times), which prove nothing on their own."""
+    return ':' in number or len(_number_key(number)) <= 2
+
+
+def _gram(a: str, b: str, c: str) -> int:
+    """Hash of a word triple; Python string hashes differ between processes, so indexes are never shared."""
+    return hash((a, b, c)) & _HASH_MASK
+
+
+class CitationIndex:
+    """Word-triple and number index of one document, built in the process that uses it."""
+
+    def __init__(self, text: str, page_offsets: Optional[List[int]] = None,
+                 page_numbers: Optional[List[int]] = None):
+        self.text = text
+        self.page_offsets = page_offsets or [0]
+        # Real page numbers when the text holds only some pages of a document
+        self.page_numbers = page_numbers
+
+        # A slice at a time, so only one slice's word strings are alive; a
+        # document has few distinct words, so each is folded once and shared.
+        # Word offsets are not stored: each slice's start and first word are,
+        # and an offset is found by re-reading at most one slice.
+        self.slice_starts = array('I')
+        self.slice_words = array('I')
+        folded: Dict[str, str] = {}
+        tokens: List[str] = []
+        start = 0
+        while start < len(text):
+            end = text.find(' ', start + _SLICE_CHARS)
+            end = len(text) if end == -1 else end
+            words = _TOKEN.findall(text, start, end)
+            folded.update((word, fold(word)) for word in set(words).difference(folded))
+            self.slice_starts.append(start)
+            self.slice_words.append(len(tokens))
+            tokens.extend(map(folded.__getitem__, words))
+            start = end
+        self.words = len(tokens)
+        del folded
+
+        # Sorted runs of packed (hash, position) entries; sorting a run at a
+        # time keeps only one run's Python ints alive
+        self.runs: List[array] = []
+        grams = zip(tokens, islice(tokens, 1, None), islice(tokens, 2, None))
+        position = 0
+        while position <= _POSITION_MASK:
+            run = [((hash(gram) & _HASH_MASK) << _POSITION_BITS) | (position + i)
+                   for i, gram in enumerate(islice(grams, min(_RUN_SIZE, _POSITION_MASK + 1 - position)))]
+            if not run:
+                break
+            position += len(run)
+            run.sort()
+            self.runs.append(array('Q', run))
+        del tokens, run
+
+        self.numbers: Dict[str, int] = {}
+        for match in _NUMBER.finditer(text):
+            _add_number(self.numbers, match)
+
+    def page(self, offset: int) -> int:
+        """Page number of a character offset."""
+        index = page_of(self.page_offsets, offset)
+        return self.page_numbers[index - 1] if self.page_numbers else index
+
+    def offset(self, position: int) -> int:
+        """Character offset of the word at a position."""
+        k = bisect.bisect_right(self.slice_words, position) - 1
+        words = _TOKEN.finditer(self.text, self.slice_starts[k])
+        match = next(islice(words, position - self.slice_words[k], None), None)
+        return match.start() if match else len(self.text)
+
+    def _hits(self, gram: int) -> List[int]:
+        hits = []
+        for run in self.runs:
+            first = bisect.bisect_left(run, gram << _POSITION_BITS)
+            for i in range(first, min(first + _MAX_HITS, len(run))):
+                if run[i] >> _POSITION_BITS != gram:
+                    break
+                hits.append(run[i] & _POSITION_MASK)
+        return hits[:_MAX_HITS]
+
+    def find_quote(self, quote: str) -> Tuple[float, Optional[int]]:
+        """
+        (score, offset) of the best match of a quote: score is the share of
+        the quote's word triples found at consistent positions.
+        """
+        tokens = [token for token in map(fold, _TOKEN.findall(quote)) if token]
+        if len(tokens) < 3:
+            # Too short for triples: look for the words themselves
+            offset = locate(self.text, 0, len(self.text), quote)
+            return (1.0, offset) if offset is not None else (0.0, None)
+
+        votes: Counter = Counter()
+        total = len(tokens) - 2
+        for q in range(total):
+            for position in self._hits(_gram(tokens[q], tokens[q + 1], tokens[q + 2])):
+                if position >= q:
+                    votes[position - q] += 1
+        if not votes:
+            return 0.0, None
+        start, count = votes.most_common(1)[0]
+        return count / total, self.offset(start)
+
+    def find_number(self, number: str, near: Optional[Tuple[int, int]] = None) -> Optional[int]:
+        """
+        Offset of a number in the document (thousands separators and leading
+        zeros ignored); with near=(start, end), only within _NEAR_CHARS of that
+        passage.
+        """
+        if near is None:
+            return _find(self.numbers, number)
+        numbers: Dict[str, int] = {}
+        start, end = max(0, near[0] - _NEAR_CHARS), min(len(self.text), near[1] + _NEAR_CHARS)
+        for match in _NUMBER.finditer(self.text, start, end):
+            _add_number(numbers, match)
+        return _find(numbers, number)
+
+
+def _quote_matches(answer: str) -> List[Tuple[str, int, int]]:
+    """(span, start, end) of every quoted span of an answer, without the "not available" phrase."""
+    found = []
+    for match in _QUOTE.finditer(answer):
+        span = next(group for group in match.groups() if group is not None).strip()
+        if span and span.casefold().rstrip('.') != NOT_AVAILABLE.casefold():
+            found.append((span, match.start(), match.end()))
+    return found
+
+
+def _figure_matches(answer: str) -> List[Tuple[str, int]]:
+    """(number, position) of every figure of an answer, skipping page/section references and list markers."""
+    found = []
+    for match in _NUMBER.finditer(answer):
+        number = match.group().rstrip(',').rstrip('.')
+        line_start = answer.rfind('\n', 0, match.start()) + 1
+        before = answer[max(line_start, match.start() - 12):match.start()]
+        if _REFERENCE.search(before):
+            if before.strip() or _LIST_MARKER.match(answer, match.end()):
+                continue
+        found.append((number, match.start()))
+    return found
+
+
+def quotes(answer: str) -> List[str]:
+    """Quoted spans of an answer, without the model's own "not available" phrase."""
+    return list(dict.fromkeys(span for span, _, _ in _quote_matches(answer)))
+
+
+def figures(answer: str) -> List[str]:
+    """Numbers stated in an answer, skipping page/section references and list markers."""
+    return list(dict.fromkeys(number for number, _ in _figure_matches(answer)))
+
+
+def _same_sentence(answer: str, a: int, b: int) -> bool:
+    """Whether nothing between two positions of an answer ends a sentence (quoted text aside)."""
+    return not _SENTENCE_END.search(answer, min(a, b), max(a, b))
+
+
+def verify(answer: str, index: CitationIndex, threshold: float = 0.8) -> Dict[str, List[Dict]]:
+    """
+    Verified and unverified quotes and figures of an answer.
+
+    A figure in the same sentence as a verified quote must appear next to
+    that passage in the document. Other figures may appear anywhere, except
+    trivial ones ("3", "3:00"), which are found in almost any document and
+    so are left unchecked.
+    """
+    result: Dict[str, List[Dict]] = {'verified': [], 'unverified': []}
+    # (start, end) in the answer and (start, end) in the document of each verified quote
+    anchors: List[Tuple[int, int, int, int]] = []
+    checked = set()
+    for span, start, end in _quote_matches(answer):
+        score, offset = index.find_quote(span)
+        if score >= threshold and offset is not None:
+            anchors.append((start, end, offset, offset + len(span)))
+        if span in checked:
+            continue
+        checked.add(span)
+        citation = {'type': 'quote', 'text': span, 'score': round(score, 3)}
+        if score >= threshold and offset is not None:
+            result['verified'].append(dict(citation, page=index.page(offset), offset=offset))
+        else:
+            result['unverified'].append(citation)
+
+    figures_found: Dict[str, Dict] = {}
+    for number, position in _figure_matches(answer):
+        anchor = next((a for a in anchors if a[0] <= position < a[1] or
+                       # After a quote, from its last quoted character: "... 5 May." ends a sentence
+                       _same_sentence(answer, position, a[0] if position < a[0] else a[1] - 2)), None)
+        if anchor is not None:
+            offset = index.find_number(number, near=anchor[2:])
+        elif trivial(number):
+            continue
+        else:
+            offset = index.find_number(number)
+        citation = {'type': 'figure', 'text': number}
+        if offset is not None:
+            citation.update(page=index.page(offset), offset=offset)
+        # A figure stated twice is unverified if either statement is
+        if number not in figures_found or offset is None:
+            figures_found[number] = citation
+    for citation in figures_found.values():
+        result['verified' if 'offset' in citation else 'unverified'].append(citation)
+    return result
@@ -0,0 +1,129 @@
+"""
+N-way comparison for DIA.
+Several versions of one document (e.g. a notification as issued by five
+districts) are aligned section by section, locally and without the LLM. The
+alignment and section diffs of every pair are cached by the two documents'
+ids, so adding a document to a set only aligns the new pairs. The LLM gets one
+delta matrix against the first document: per section, how each document
+differs from it, with identical changes grouped so every variant is sent once.
+"""
+
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+from dedup import document_diff
+
+# Changed lines shown per section variant before the whole section is sent instead
+SECTION_DIFF_LINES = 40
+
+
+def align(base: List[str], other: List[str]) -> List[List[Optional[int]]]:
+    """
+    [base index, other index] pairs of two section hash lists, in order.
+
+    Unchanged runs are matched by hash; within a changed run sections are
+    paired by position, and the surplus on either side is paired with None
+    (removed or added sections).
+    """
+    pairs: List[List[Optional[int]]] = []
+    matcher = difflib.SequenceMatcher(None, base, other, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        common = min(i2 - i1, j2 - j1)
+        pairs.extend([i1 + k, j1 + k] for k in range(common))
+        pairs.extend([i, None] for i in range(i1 + common, i2))
+        pairs.extend([None, j] for j in range(j1 + common, j2))
+    return pairs
+
+
+def compare_pair(base_sections: List[str], base_hashes: List[str],
+                 other_sections: List[str], other_hashes: List[str]) -> Dict:
+    """
+    Alignment of one document against another, with the line diff of every changed section.
+
+    diffs maps the base section index to its '-'/'+' lines, or None when the
+    section changed too much for a diff to be shorter than the section.
+    """
+    pairs = align(base_hashes, other_hashes)
+    diffs = {}
+    for i, j in pairs:
+        if i is not None and j is not None and base_hashes[i] != other_hashes[j]:
+            diffs[str(i)] = document_diff(base_sections[i], other_sections[j], SECTION_DIFF_LINES)
+    same = sum(1 for i, j in pairs if i is not None and j is not None and base_hashes[i] == other_hashes[j])
+    total = len(base_hashes) + len(other_hashes)
+    return {'pairs': pairs, 'diffs': diffs, 'similarity': round(2 * same / total, 3) if total else 1.0}
+
+
+def delta_rows(sections: List[List[str]], hashes: List[List[str]], to_base: List[Dict]) -> List[Dict]:
+    """
+    Sections in which any document differs from the baseline (document 0), in baseline order.
+
+    to_base[k] is compare_pair(baseline, document k) for k >= 1. Each row is
+    {'section', 'after', 'variants'}: section is the baseline index (None for
+    sections added after baseline section `after`), and variants lists
+    {'documents', 'kind', 'lines'} with the documents sharing each variant.
+    """
+    changed: Dict[int, Dict[Tuple, Dict]] = {}
+    added: Dict[Tuple[int, str], Dict] = {}
+    for k in range(1, len(sections)):
+        previous = -1
+        seen = set()
+        for i, j in to_base[k - 1]['pairs']:
+            if i is not None:
+                previous = i
+                seen.add(i)
+            if j is None:
+                variant = ('removed', None)
+                lines = None
+            elif i is None:
+                # Documents adding the same text after the same section share one row
+                entry = added.setdefault((previous, hashes[k][j]), {
+                    'section': None, 'after': previous,
+                    'variants': [{'documents': [], 'kind': 'added', 'lines': sections[k][j].splitlines()}]
+                })
+                entry['variants'][0]['documents'].append(k)
+                continue
+            elif hashes[k][j] == hashes[0][i]:
+                continue
+            else:
+                lines = to_base[k - 1]['diffs'].get(str(i))
+                variant = ('changed', hashes[k][j]) if lines is not None else ('rewritten', hashes[k][j])
+                if lines is None:
+                    lines = sections[k][j].splitlines()
+            slot = changed.setdefault(i, {}).setdefault(variant, {'documents': [], 'kind': variant[0], 'lines': lines})
+            slot['documents'].append(k)
+
+    rows = [{'section': i, 'after': i - 1, 'variants': list(variants.values())} for i, variants in changed.items()]
+    rows.extend(added.values())
+    # Baseline order; added sections come right after the section they follow
+    rows.sort(key=lambda row: (row['section'] if row['section'] is not None else row['after'] + 0.5))
+    return rows
+
+
+def render_rows(rows: List[Dict], base_sections: List[str]) -> str:
+    """Prompt text of the delta matrix (document numbers are 1-based, document 1 is the baseline)."""
+    blocks = []
+    for row in rows:
+        if row['section'] is None:
+            where = (f"Added after section {row['after'] + 1}" if row['after'] >= 0 else "Added at the start")
+        else:
+            heading = base_sections[row['section']].split('\n', 1)[0][:80]
+            where = f"Section {row['section'] + 1} (\"{heading}\")"
+        lines = [f"{where}:"]
+        for variant in row['variants']:
+            documents = ', '.join(str(k + 1) for k in variant['documents'])
+            label = f"Document{'s' if len(variant['documents']) > 1 else ''} {documents}"
+            if variant['kind'] == 'removed':
+                lines.append(f"  {label}: section removed")
+                continue
+            description = {'changed': 'changed lines', 'rewritten': 'rewritten as', 'added': 'added'}[variant['kind']]
+            lines.append(f"  {label}, {description}:")
+            lines.extend(f"    {line}" for line in variant['lines'])
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
+
+
+def render_similarity(similarity: List[List[float]]) -> str:
+    """Share of identical sections between every two documents, as a table."""
+    header = '     ' + ''.join(f'{f"D{k + 1}":>6}' for k in range(len(similarity)))
+    rows = [f'{f"D{i + 1}":<5}' + ''.join(f'{value:>6.0%}' for value in row) for i, row in enumerate(similarity)]
+    return '\n'.join([header] + rows)
@@ -0,0 +1,143 @@
+"""
+Cross-document corpus index for DIA.
+Persistent SQLite FTS5 full-text index over every parsed document, with
+tokenization that keeps Odia vowel signs and viramas inside words.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+
+from sections import split_sections
+from stopwords import STOPWORDS
+
+# Odia combining marks (signs, nukta, matras, virama, length marks) plus ZWNJ/ZWJ.
+# unicode61 treats combining marks as separators unless declared as token characters.
+_ODIA_TOKENCHARS = ''.join(
+    chr(c) for c in [*range(0x0B01, 0x0B04), 0x0B3C, *range(0x0B3E, 0x0B58), 0x0B62, 0x0B63, 0x200C, 0x200D]
+)
+_TOKENIZER = f"unicode61 remove_diacritics 0 tokenchars '{_ODIA_TOKENCHARS}'"
+_QUERY_TERM = re.compile(r'[\w' + _ODIA_TOKENCHARS + r']+')
+
+
+class CorpusIndex:
+    """Persistent full-text index of parsed documents, searchable by passage."""
+
+    def __init__(self, db_path: str, passage_chars: int = 1500):
+        self.db_path = db_path
+        self.passage_chars = passage_chars
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    source TEXT,
+                    chars INTEGER,
+                    added REAL
+                )
+            """)
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+                    doc_id UNINDEXED, section UNINDEXED, body, tokenize = "{_TOKENIZER}"
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process; WAL lets readers run during writes."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Never reuse a connection inherited across fork() (preloaded apps)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add_document(self, doc_id: str, text: str, source: str = "") -> bool:
+        """Index a document by passage. Returns False if it was already indexed."""
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone():
+            return False
+
+        passages = split_sections(unicodedata.normalize('NFC', text), max_chars=self.passage_chars)
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO documents (doc_id, source, chars, added) VALUES (?, ?, ?, ?)",
+                (doc_id, source, len(text), time.time())
+            ).rowcount
+            if not inserted:
+                # Another worker indexed it meanwhile
+                return False
+            conn.executemany(
+                "INSERT INTO passages (doc_id, section, body) VALUES (?, ?, ?)",
+                [(doc_id, i, passage) for i, passage in enumerate(passages)]
+            )
+        return True
+
+    def remove_document(self, doc_id: str) -> None:
+        """Drop a document from the index."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+    def search(self, query: str, limit: int = 10, snippet_tokens: int = 24) -> List[Dict]:
+        """
+        Ranked passage search (BM25) with highlighted snippets.
+
+        Query terms are matched as words, so free-text questions work without
+        FTS5 query syntax. Stopwords and one- or two-letter Latin words are dropped;
+        passages must hold every remaining term, or any of them when no
+        passage holds all.
+        """
+        terms = []
+        for term in _QUERY_TERM.findall(unicodedata.normalize('NFC', query)):
+            key = term.casefold()
+            if key not in STOPWORDS and (len(term) >= 3 or not term.isascii() or term.isdigit()) and key not in terms:
+                terms.append(key)
+        if not terms:
+            return []
+        quoted = ['"' + term.replace('"', '') + '"' for term in terms]
+
+        rows = self._match(' AND '.join(quoted), limit, snippet_tokens)
+        if not rows and len(quoted) > 1:
+            rows = self._match(' OR '.join(quoted), limit, snippet_tokens)
+
+        return [
+            {
+                'doc_id': doc_id,
+                'source': source,
+                'section': section,
+                'text': body,
+                'snippet': snippet,
+                'score': round(-score, 4)
+            }
+            for doc_id, source, section, body, snippet, score in rows
+        ]
+
+    def _match(self, match: str, limit: int, snippet_tokens: int) -> List[tuple]:
+        return self._connect().execute(f"""
+            SELECT p.doc_id, d.source, p.section, p.body,
+                   snippet(passages, 2, '[', ']', '…', {int(snippet_tokens)}) AS snippet,
+                   bm25(passages) AS score
+            FROM passages p JOIN documents d ON d.doc_id = p.doc_id
+            WHERE passages MATCH ?
+            ORDER BY score
+            LIMIT ?
+        """, (match, int(limit))).fetchall()
+
+    def stats(self) -> Dict:
+        """Document and passage counts."""
+        conn = self._connect()
+        return {
+            'documents': conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            'passages': conn.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+        }
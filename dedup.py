@@ -0,0 +1,186 @@
+"""
+Near-duplicate detection for DIA.
+MinHash signatures with LSH banding, kept in the shared cache so re-issued
+circulars (new reference number, new date) can reuse earlier results in
+every worker.
+"""
+
+import re
+import time
+import difflib
+import hashlib
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from shared_cache import SharedCache
+
+_SHINGLE_SIZE = 3
+_WORD = re.compile(r'\S+')
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class MinHashIndex:
+    """
+    MinHash/LSH index of processed documents and their results.
+
+    Entries and LSH buckets live in the host's shared cache, so every worker
+    sees the others' documents and old entries go with its LRU eviction. The
+    texts themselves are the document registry's, not copied here.
+    """
+
+    def __init__(self, cache: SharedCache, num_perm: int = 64, bands: int = 16, threshold: float = 0.9):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.cache = cache
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+    # ------------------------------------------------------------------
+    # Signatures
+    # ------------------------------------------------------------------
+
+    def signature(self, text: str) -> List[int]:
+        """
+        Compute the MinHash signature of a document.
+
+        One-permutation hashing: the low bits of each shingle hash pick a
+        bin and the bin keeps its smallest hash, so a shingle costs one hash
+        rather than one per permutation. Empty bins (short documents) borrow
+        the next filled bin's value. Words are streamed, so memory stays
+        flat however long the document is.
+        """
+        bins: List[Optional[int]] = [None] * self.num_perm
+        window: Deque[str] = deque(maxlen=_SHINGLE_SIZE)
+
+        def add(shingle: str):
+            hashed = _shingle_hash(shingle)
+            bin_index, value = hashed % self.num_perm, hashed // self.num_perm
+            current = bins[bin_index]
+            if current is None or value < current:
+                bins[bin_index] = value
+
+        for match in _WORD.finditer(text):
+            window.append(match.group().lower())
+            if len(window) == _SHINGLE_SIZE:
+                add(' '.join(window))
+        if len(window) < _SHINGLE_SIZE:
+            # Short documents are a single shingle
+            add(' '.join(window))
+
+        signature = []
+        for k in range(self.num_perm):
+            # Distance to the next filled bin, so borrowed values differ from the originals
+            distance = next(d for d in range(self.num_perm) if bins[(k + d) % self.num_perm] is not None)
+            signature.append((distance << 64) | bins[(k + distance) % self.num_perm])
+        return signature
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimate Jaccard similarity from two signatures."""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def _band_keys(self, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            keys.append(f"{band}:{hash(tuple(chunk))}")
+        return keys
+
+    def _add_to_buckets(self, doc_id: str, signature: List[int]) -> None:
+        def add(ids: Optional[List[str]]) -> List[str]:
+            ids = ids or []
+            return ids if doc_id in ids else ids + [doc_id]
+
+        for key in self._band_keys(signature):
+            self.cache.update("minhash_band", key, add)
+
+    def _remove_from_buckets(self, doc_id: str, signature: List[int]) -> None:
+        def remove(ids: Optional[List[str]]) -> Optional[List[str]]:
+            # An emptied bucket is deleted
+            return [d for d in ids or [] if d != doc_id] or None
+
+        for key in self._band_keys(signature):
+            self.cache.update("minhash_band", key, remove)
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+
+    def add(self, doc_id: str, signature: List[int]) -> None:
+        """Register a parsed document (no-op if already indexed)."""
+        if self.cache.contains("minhash", doc_id):
+            return
+        self.cache.set("minhash", doc_id, {'signature': signature, 'results': {}, 'updated': time.time()})
+        self._add_to_buckets(doc_id, signature)
+
+    def get_signature(self, doc_id: str) -> Optional[List[int]]:
+        """Get the stored signature of an indexed document."""
+        entry = self.cache.get("minhash", doc_id)
+        return entry['signature'] if entry else None
+
+    def find_similar(self, signature: List[int], exclude: Optional[str] = None,
+                     threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Return indexed documents similar to signature, best match first."""
+        threshold = self.threshold if threshold is None else threshold
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.cache.get("minhash_band", key) or ())
+        candidates.discard(exclude)
+
+        matches = []
+        for doc_id in candidates:
+            # Buckets may still name a document the cache has evicted
+            other = self.get_signature(doc_id)
+            score = self.similarity(signature, other) if other else 0.0
+            if score >= threshold:
+                matches.append((doc_id, score))
+        return sorted(matches, key=lambda m: m[1], reverse=True)
+
+    def get_result(self, doc_id: str, key: str) -> Optional[Dict]:
+        """Get a stored result for a document and task key."""
+        entry = self.cache.get("minhash", doc_id)
+        return dict(entry['results'][key]) if entry and key in entry['results'] else None
+
+    def store_result(self, doc_id: str, key: str, result: Dict) -> None:
+        """Store a task result for later reuse."""
+        def change(entry: Optional[Dict]) -> Optional[Dict]:
+            if entry is not None:
+                entry['results'][key] = result
+                entry['updated'] = time.time()
+            return entry
+
+        self.cache.update("minhash", doc_id, change)
+
+    def remove(self, doc_id: str) -> None:
+        """Drop a document and its results."""
+        signature = self.get_signature(doc_id)
+        self.cache.delete("minhash", doc_id)
+        if signature:
+            self._remove_from_buckets(doc_id, signature)
+
+
+def document_diff(old_text: str, new_text: str, max_lines: int = 40) -> Optional[List[str]]:
+    """
+    Line diff between two document versions.
+
+    Returns the changed lines prefixed with '-' or '+', or None if the
+    diff is larger than max_lines (i.e. not a near-duplicate edit).
+    """
+    changes = []
+    for line in difflib.unified_diff(old_text.splitlines(), new_text.splitlines(), lineterm='', n=0):
+        if line.startswith(('---', '+++', '@@')):
+            continue
+        if not line[1:].strip():
+            continue
+        changes.append(line)
+        if len(changes) > max_lines:
+            return None
+    return changes
@@ -0,0 +1,206 @@
+"""
+Document handles and registry for DIA.
+A request names each document explicitly by doc_id, server path, or inline
+text, instead of the agent guessing whether a string is a path. Resolved
+documents are kept in a registry (parsed text, page offsets, token counts and
+derived indexes) so repeat requests by doc_id skip parsing entirely.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from normalize import estimate_tokens
+from parsers import FORMATS
+from persistence import text_fingerprint
+
+DOC_ID = 'doc_id'
+PATH = 'path'
+TEXT = 'text'
+
+# Longest string still considered as a file path by the legacy string form
+_MAX_PATH_CHARS = 4096
+
+# Most documents in one N-way compare (document_1, document_2 and the documents list)
+MAX_COMPARE_DOCUMENTS = 12
+
+
+class DocumentNotFound(KeyError):
+    """Raised when a doc_id handle names a document the registry does not hold."""
+
+    def __str__(self):
+        return f"Unknown document: {self.args[0]}"
+
+
+class DocumentHandle:
+    """Reference to a document: a registered doc_id, a server file path, or inline text."""
+
+    __slots__ = ('kind', 'value')
+
+    def __init__(self, kind: str, value: str):
+        self.kind = kind
+        self.value = value
+
+    def describe(self) -> str:
+        """Short label for logs and profiles."""
+        if self.kind == TEXT:
+            return f"text ({len(self.value)} chars)"
+        if self.kind == PATH:
+            return Path(self.value).name
+        return f"doc {self.value[:12]}"
+
+
+def handle_error(value: Any) -> Optional[str]:
+    """Validate a handle from a request body. Returns an error message or None."""
+    if isinstance(value, str):
+        return None if value else 'Document must not be empty'
+    if isinstance(value, dict):
+        keys = [k for k in (DOC_ID, PATH, TEXT) if k in value]
+        if len(keys) != 1:
+            return 'Document handle must have exactly one of: doc_id, path, text'
+        if not isinstance(value[keys[0]], str) or not value[keys[0]]:
+            return f'Document {keys[0]} must be a non-empty string'
+        return None
+    return 'Document must be a string or an object with doc_id, path or text'
+
+
+def documents_error(value: Any, task: str) -> Optional[str]:
+    """Validate the extra documents of an N-way compare. Returns an error message or None."""
+    if task != 'compare':
+        return 'documents is only supported for the compare task'
+    if not isinstance(value, list) or not value:
+        return 'documents must be a non-empty list of document handles'
+    if len(value) + 2 > MAX_COMPARE_DOCUMENTS:
+        return f'At most {MAX_COMPARE_DOCUMENTS} documents can be compared at once'
+    for i, handle in enumerate(value):
+        error = handle_error(handle)
+        if error:
+            return f'documents[{i}]: {error}'
+    return None
+
+
+def looks_like_path(value: str) -> bool:
+    """Whether a plain string has the shape of a file path: one short line ending in a supported extension."""
+    return len(value) <= _MAX_PATH_CHARS and '\n' not in value and Path(value).suffix.lower() in FORMATS
+
+
+def parse_handle(value: Union[str, Dict, DocumentHandle]) -> DocumentHandle:
+    """
+    Build a handle from a request value.
+
+    Objects name the kind explicitly. Plain strings keep the old behaviour:
+    a short single-line string with a supported extension that names an
+    existing file is a path, anything else is text (never stat'ed).
+    """
+    if isinstance(value, DocumentHandle):
+        return value
+    error = handle_error(value)
+    if error:
+        raise ValueError(error)
+    if isinstance(value, dict):
+        kind = next(k for k in (DOC_ID, PATH, TEXT) if k in value)
+        return DocumentHandle(kind, value[kind])
+
+    if looks_like_path(value) and Path(value).is_file():
+        return DocumentHandle(PATH, value)
+    return DocumentHandle(TEXT, value)
+
+
+class DocumentRecord:
+    """A resolved document with its parse results and derived indexes."""
+
+    def __init__(self, doc_id: str, text: str, source: str, stats: Optional[Dict],
+                 page_offsets: List[int], tokens: int):
+        self.doc_id = doc_id
+        self.text = text
+        self.source = source
+        self.stats = stats
+        self.page_offsets = page_offsets
+        self.tokens = tokens
+        self.derived: Dict[str, Any] = {}
+
+    def summary(self) -> Dict:
+        """What a client needs to refer to this document again."""
+        return {
+            'doc_id': self.doc_id,
+            'source': self.source,
+            'pages': len(self.page_offsets),
+            'chars': len(self.text),
+            'tokens': self.tokens
+        }
+
+
+class DocumentRegistry:
+    """
+    Resolved documents by doc_id: an in-process LRU in front of the
+    host-wide shared cache, so any worker can resolve a doc_id.
+    """
+
+    def __init__(self, shared_cache, max_docs: int = 256):
+        self.shared_cache = shared_cache
+        self.max_docs = max_docs
+        self._lock = threading.Lock()
+        self._records: 'OrderedDict[str, DocumentRecord]' = OrderedDict()
+
+    def _remember(self, record: DocumentRecord) -> DocumentRecord:
+        with self._lock:
+            existing = self._records.get(record.doc_id)
+            if existing is not None:
+                self._records.move_to_end(record.doc_id)
+                return existing
+            self._records[record.doc_id] = record
+            while len(self._records) > self.max_docs:
+                self._records.popitem(last=False)
+        return record
+
+    def register(self, text: str, source: str, stats: Optional[Dict],
+                 page_offsets: Optional[List[int]] = None) -> DocumentRecord:
+        """Add a parsed document; its doc_id is the hash of its text."""
+        doc_id = text_fingerprint(text)
+        with self._lock:
+            if doc_id in self._records:
+                self._records.move_to_end(doc_id)
+                return self._records[doc_id]
+
+        record = DocumentRecord(doc_id, text, source, stats, page_offsets or [0], estimate_tokens(text))
+        self.shared_cache.set('documents', doc_id, {
+            'text': text,
+            'source': source,
+            'stats': stats,
+            'page_offsets': record.page_offsets,
+            'tokens': record.tokens
+        })
+        return self._remember(record)
+
+    def get(self, doc_id: str) -> Optional[DocumentRecord]:
+        """Registered document, from this process or any other worker."""
+        with self._lock:
+            record = self._records.get(doc_id)
+            if record is not None:
+                self._records.move_to_end(doc_id)
+                return record
+
+        stored = self.shared_cache.get('documents', doc_id)
+        if stored is None:
+            return None
+        return self._remember(DocumentRecord(
+            doc_id, stored['text'], stored['source'], stored['stats'], stored['page_offsets'], stored['tokens']
+        ))
+
+    def forget(self, doc_id: str) -> None:
+        """Drop a document from this process and the shared cache."""
+        with self._lock:
+            self._records.pop(doc_id, None)
+        self.shared_cache.delete('documents', doc_id)
+
+    def find(self, text: str) -> Optional[DocumentRecord]:
+        """Registered record for this exact text, if it is held in this process."""
+        with self._lock:
+            return self._records.get(text_fingerprint(text))
+
+    def derive(self, record: DocumentRecord, name: str, build: Callable[[str], Any]) -> Any:
+        """Derived index of a document (e.g. sections), built once per record."""
+        if name not in record.derived:
+            record.derived[name] = build(record.text)
+        return record.derived[name]
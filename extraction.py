@@ -0,0 +1,152 @@
+"""
+Chunked extraction for DIA.
+Large documents are cut into chunks at paragraph boundaries. The extraction
+query runs on every chunk concurrently (map), and the per-chunk field values
+are merged into one answer (reduce): equal values are de-duplicated, and
+conflicting ones are resolved by support. Each value keeps the page and
+character offset where it was found.
+"""
+
+import re
+import json
+import bisect
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+NOT_AVAILABLE = "Not available in provided document"
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+_NON_WORD = re.compile(r'[^\w\u0b01-\u0b03\u0b3c\u0b3e-\u0b57\u0b62\u0b63]+')
+
+
+def chunk_ranges(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """(start, end) offsets of chunks of at most max_chars, cut at paragraph, line or word breaks."""
+    ranges = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            floor = start + max_chars // 2
+            for separator in ('\n\n', '\n', ' '):
+                cut = text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = cut
+                    break
+        ranges.append((start, end))
+        start = end
+        while start < len(text) and text[start].isspace():
+            start += 1
+    return ranges
+
+
+def parse_fields(output: str) -> Optional[List[Dict]]:
+    """Field entries of one chunk's JSON answer, or None if it is not valid JSON."""
+    match = _JSON_OBJECT.search(output)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group())
+    except ValueError:
+        return None
+    fields = data.get('fields') if isinstance(data, dict) else None
+    if not isinstance(fields, list):
+        return None
+    return [f for f in fields if isinstance(f, dict) and isinstance(f.get('field'), str)]
+
+
+def _normalize(value: str) -> str:
+    """Comparison key: case, spacing and punctuation differences do not make values distinct."""
+    return _NON_WORD.sub(' ', unicodedata.normalize('NFC', value).casefold()).strip()
+
+
+def locate(text: str, start: int, end: int, *candidates: Optional[str]) -> Optional[int]:
+    """Offset of the first candidate found verbatim (modulo whitespace) in text[start:end]."""
+    for candidate in candidates:
+        if not candidate or not candidate.strip():
+            continue
+        candidate = unicodedata.normalize('NFC', candidate.strip())
+        position = text.find(candidate, start, end)
+        if position != -1:
+            return position
+        words = candidate.split()
+        pattern = re.compile(r'\s+'.join(re.escape(w) for w in words), re.IGNORECASE)
+        match = pattern.search(text, start, end)
+        if match:
+            return match.start()
+    return None
+
+
+def page_of(page_offsets: List[int], offset: int) -> int:
+    """1-based page containing a character offset."""
+    return max(1, bisect.bisect_right(page_offsets, offset))
+
+
+def merge_fields(chunk_fields: List[Tuple[int, List[Dict]]], text: str, ranges: List[Tuple[int, int]],
+                 page_offsets: List[int]) -> List[Dict]:
+    """
+    Merge per-chunk fields into one entry per requested field, in request order.
+
+    Equal values (ignoring case, spacing and punctuation) are merged with all
+    their sources. When chunks disagree, the value stated in the most chunks
+    wins, then one found verbatim in the text, then the earliest; the others
+    are kept as conflicts.
+    """
+    fields: Dict[str, Dict] = {}
+    for chunk, entries in chunk_fields:
+        start, end = ranges[chunk]
+        for entry in entries:
+            name = entry['field'].strip()
+            key = _normalize(name)
+            if not key:
+                continue
+            field = fields.setdefault(key, {'field': name, 'values': {}})
+            value = entry.get('value')
+            if not isinstance(value, str) or not _normalize(value) or _normalize(value) == _normalize(NOT_AVAILABLE):
+                continue
+            offset = locate(text, start, end, entry.get('quote'), value)
+            source = {
+                'chunk': chunk + 1,
+                'page': page_of(page_offsets, offset if offset is not None else start),
+                'offset': offset,
+                'verified': offset is not None
+            }
+            candidate = field['values'].setdefault(_normalize(value), {'value': value.strip(), 'sources': []})
+            candidate['sources'].append(source)
+
+    merged = []
+    for field in fields.values():
+        candidates = sorted(
+            field['values'].values(),
+            key=lambda c: (
+                -len({s['chunk'] for s in c['sources']}),
+                not any(s['verified'] for s in c['sources']),
+                min(s['offset'] if s['offset'] is not None else float('inf') for s in c['sources'])
+            )
+        )
+        if not candidates:
+            merged.append({'field': field['field'], 'value': None, 'sources': [], 'conflicts': []})
+            continue
+        best = candidates[0]
+        merged.append({
+            'field': field['field'],
+            'value': best['value'],
+            'sources': best['sources'],
+            'conflicts': candidates[1:]
+        })
+    return merged
+
+
+def format_fields(fields: List[Dict]) -> str:
+    """Readable answer with the page of each value and any conflicting values."""
+    lines = []
+    for field in fields:
+        if field['value'] is None:
+            lines.append(f"- {field['field']}: {NOT_AVAILABLE}")
+            continue
+        pages = sorted({s['page'] for s in field['sources']})
+        line = f"- {field['field']}: {field['value']} (page {', '.join(map(str, pages))})"
+        for conflict in field['conflicts']:
+            other_pages = sorted({s['page'] for s in conflict['sources']})
+            line += f"\n  Also stated as: {conflict['value']} (page {', '.join(map(str, other_pages))})"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,62 @@
+"""
+Document lineage store for DIA.
+Tracks successive versions of the same document and keeps per-section
+summaries so a new version only re-summarizes the sections that changed.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from shared_cache import SharedCache
+
+
+class LineageStore:
+    """
+    Document versions and per-section summaries, kept in the shared cache.
+
+    Every worker records versions into the same lineages; entries go with the
+    cache's LRU eviction, or with forget() when an upload is removed.
+    """
+
+    def __init__(self, cache: SharedCache):
+        self.cache = cache
+
+    def lineage_of(self, doc_id: str) -> Optional[str]:
+        """Get the lineage a document version belongs to."""
+        return self.cache.get("doc_lineage", doc_id)
+
+    def previous_version(self, lineage_id: str, doc_id: str) -> Optional[Dict]:
+        """Get the most recent recorded version other than doc_id."""
+        for version in reversed(self.cache.get("lineage", lineage_id) or []):
+            if version['doc_id'] != doc_id:
+                return version
+        return None
+
+    def record_version(self, lineage_id: str, doc_id: str, section_hashes: List[str]) -> None:
+        """Record a document version and its section layout."""
+        def add(versions: Optional[List[Dict]]) -> List[Dict]:
+            versions = versions or []
+            if not any(v['doc_id'] == doc_id for v in versions):
+                versions.append({'doc_id': doc_id, 'sections': section_hashes, 'created': time.time()})
+            return versions
+
+        self.cache.update("lineage", lineage_id, add)
+        self.cache.set("doc_lineage", doc_id, lineage_id)
+
+    def forget(self, doc_id: str) -> None:
+        """Drop a document version from its lineage (the lineage too, once empty)."""
+        lineage_id = self.lineage_of(doc_id)
+        if lineage_id is None:
+            return
+        self.cache.delete("doc_lineage", doc_id)
+        self.cache.update("lineage", lineage_id,
+                          lambda versions: [v for v in versions or [] if v['doc_id'] != doc_id] or None)
+
+    def get_section_summary(self, section_id: str) -> Optional[str]:
+        """Get a cached section summary."""
+        return self.cache.get("section_summary", section_id)
+
+    def put_section_summaries(self, summaries: Dict[str, str]) -> None:
+        """Cache new section summaries (shared by every version containing the section)."""
+        for section_id, summary in summaries.items():
+            self.cache.set("section_summary", section_id, summary)
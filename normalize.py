@@ -0,0 +1,158 @@
+"""
+Text normalization for DIA.
+Strips page furniture (running headers/footers, page numbers, letterheads,
+repeated signature blocks, decorative rules) from parsed documents before
+they are sent to the LLM, without touching Odia conjuncts.
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Lines inspected at the top and bottom of each page for running headers/footers
+_EDGE_LINES = 4
+# Page numbers only ever sit on the outermost lines of a page
+_PAGE_NUMBER_LINES = 2
+
+_ODIA_RUN = re.compile(r'[\u0b00-\u0b7f]+')
+_DIGITS = re.compile(r'[0-9\u0b66-\u0b6f]+')
+_HSPACE_RUN = re.compile(r'[ \t\u00a0\u2000-\u200a\u202f\u3000]{2,}')
+_HSPACE = re.compile(r'[\t\u00a0\u2000-\u200a\u202f\u3000]')
+# Control and invisible format characters, except ZWNJ/ZWJ which shape Odia conjuncts
+_CONTROL = re.compile(r'[\x00-\x08\x0b-\x1f\x7f\u200b\u2060\ufeff]')
+_PAGE_NUMBER = re.compile(
+    r'^[\s\-\u2013\u2014\[(]*(?:page|pg\.?|p\.|\u0b2a\u0b43\u0b37\u0b4d\u0b20\u0b3e|\u0b2a\u0b43\.)?\s*[0-9\u0b66-\u0b6f]+'
+    r'(?:\s*(?:of|/|\u0b30)\s*[0-9\u0b66-\u0b6f]+)?[\s\-\u2013\u2014\])]*$',
+    re.IGNORECASE
+)
+# Rules and frames drawn with punctuation or box-drawing characters
+_RULE = re.compile(r'^[\s=\-_*~.#\u2022\u00b7\u2500-\u257f]{4,}$')
+_FRAME_EDGES = re.compile(r'^[|\u2502\u2503\u2551]\s*|\s*[|\u2502\u2503\u2551]$')
+
+
+def _odia_chars(text: str) -> int:
+    """Number of Odia characters, counted by runs (no per-character objects)."""
+    return sum(match.end() - match.start() for match in _ODIA_RUN.finditer(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate: Odia script tokenizes far more densely than English."""
+    odia_chars = _odia_chars(text)
+    return odia_chars // 2 + (len(text) - odia_chars) // 4
+
+
+def _clean_line(line: str) -> str:
+    line = _CONTROL.sub('', line)
+    line = _FRAME_EDGES.sub('', line.strip())
+    line = _HSPACE_RUN.sub('  ', line)
+    return _HSPACE.sub(' ', line).strip()
+
+
+def _line_key(line: str) -> str:
+    """Key used to match running headers whose page numbers or dates differ."""
+    return _DIGITS.sub('#', line.lower())
+
+
+def _edge_indexes(lines: List[str], count: int = _EDGE_LINES) -> set:
+    content = [i for i, line in enumerate(lines) if line]
+    return set(content[:count] + content[-count:])
+
+
+def _edge_keys(raw_lines: List[str], count: int = _EDGE_LINES) -> set:
+    """Keys of the outermost non-empty lines of a page, cleaning only those lines."""
+    keys = set()
+    for indexes in (range(len(raw_lines)), range(len(raw_lines) - 1, -1, -1)):
+        found = 0
+        for i in indexes:
+            if found == count:
+                break
+            line = _clean_line(raw_lines[i])
+            if line:
+                keys.add(_line_key(line))
+                found += 1
+    return keys
+
+
+def normalize_pages(pages: List[str], repeat_ratio: float = 0.5) -> Tuple[str, Dict]:
+    """
+    Normalize parsed pages into prompt-ready text.
+
+    Lines that repeat at the top or bottom of at least repeat_ratio of the
+    pages (minimum 3 pages) are kept once, on their first occurrence.
+    Page numbers are only removed at the outermost lines so table cells survive.
+
+    Returns:
+        (text, stats) where stats reports the token savings.
+    """
+    text, stats, _ = normalize_pages_with_offsets(pages, repeat_ratio)
+    return text, stats
+
+
+def normalize_pages_with_offsets(pages: List[str], repeat_ratio: float = 0.5) -> Tuple[str, Dict, List[int]]:
+    """normalize_pages(), also returning where each input page starts in the text."""
+    # Pages are cleaned one at a time, so only one page's lines are alive at once;
+    # the first pass cleans just the edge lines to find running headers and footers
+    repeated = set()
+    if len(pages) >= 3:
+        counts = Counter()
+        for page in pages:
+            counts.update(_edge_keys(unicodedata.normalize('NFC', page).splitlines()))
+        min_pages = max(3, int(len(pages) * repeat_ratio + 0.5))
+        repeated = {key for key, count in counts.items() if count >= min_pages}
+
+    removed = 0
+    seen_repeated = set()
+    output_pages = []
+    offsets = []
+    position = 0
+    for page in pages:
+        lines = [_clean_line(line) for line in unicodedata.normalize('NFC', page).splitlines()]
+        edges = _edge_indexes(lines)
+        outer = _edge_indexes(lines, _PAGE_NUMBER_LINES)
+        kept: List[str] = []
+        for i, line in enumerate(lines):
+            if not line:
+                # Keep paragraph breaks, but never more than one blank line
+                if kept and kept[-1]:
+                    kept.append('')
+                continue
+            if _RULE.match(line):
+                removed += 1
+                continue
+            if i in outer and _PAGE_NUMBER.match(line):
+                removed += 1
+                continue
+            if i in edges:
+                key = _line_key(line)
+                if key in repeated:
+                    if key in seen_repeated:
+                        removed += 1
+                        continue
+                    seen_repeated.add(key)
+            kept.append(line)
+        page_text = '\n'.join(kept).strip()
+        if page_text:
+            if output_pages:
+                position += 2  # '\n\n' page separator
+            offsets.append(position)
+            output_pages.append(page_text)
+            position += len(page_text)
+        else:
+            offsets.append(position)
+
+    text = '\n\n'.join(output_pages)
+    del output_pages
+    # Same as estimate_tokens('\n'.join(pages)), without joining the raw pages
+    raw_chars = sum(len(page) for page in pages) + max(0, len(pages) - 1)
+    raw_odia = sum(_odia_chars(page) for page in pages)
+    tokens_before = raw_odia // 2 + (raw_chars - raw_odia) // 4
+    tokens_after = estimate_tokens(text)
+    return text, {
+        'pages': len(pages),
+        'lines_removed': removed,
+        'repeated_lines': len(repeated),
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'tokens_saved': max(0, tokens_before - tokens_after)
+    }, offsets
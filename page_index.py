@@ -0,0 +1,208 @@
+"""
+Page index for DIA.
+Large PDFs are read a page at a time instead of all at once. For every file
+the index keeps the page count, the text of each page read so far and a small
+keyword signature per page (a Bloom filter of its words), all in the shared
+cache, so every worker on the host reuses them. A question is answered from the
+pages it names ("page 212") and the pages whose signatures hold its keywords,
+and the first answer on a long PDF does not wait for the whole file.
+"""
+
+import re
+import math
+import base64
+import hashlib
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from parsers import parser_registry
+from stopwords import STOPWORDS
+
+# Bloom filters are sized to each page's vocabulary: 10 bits and 7 hashes per
+# distinct word give about 0.8% false positives (about 1.9 KB for a dense page
+# of 1500 words)
+SIGNATURE_BITS_PER_WORD = 10
+_MIN_SIGNATURE_BITS = 512
+_HASHES = 7
+
+_TERM = re.compile(r'[\w\u0b01-\u0b03\u0b3c\u0b3e-\u0b57\u0b62\u0b63\u200c\u200d]+')
+# "page 212", "pages 10-12", "p. 5", "pp. 3 to 4", "ପୃଷ୍ଠା ୨୧୨" (\d also matches Odia digits)
+_PAGE_REF = re.compile(
+    r'(?:\bpages?|\bpp?\.|\bpg\.?|ପୃଷ୍ଠା)\s*(?:no\.?\s*)?(\d{1,5})(?:\s*(?:-|–|to)\s*(\d{1,5}))?',
+    re.IGNORECASE
+)
+
+
+def terms(text: str) -> Set[str]:
+    """Distinct case-folded words of a text."""
+    return set(_TERM.findall(unicodedata.normalize('NFC', text).casefold()))
+
+
+def query_terms(query: str) -> Set[str]:
+    """Words of a query worth looking for in a page."""
+    return {t for t in terms(query) if t not in STOPWORDS and (len(t) >= 3 or t.isdigit())}
+
+
+def _hashes(term: str) -> List[int]:
+    digest = hashlib.blake2b(term.encode('utf-8'), digest_size=4 * _HASHES).digest()
+    return [int.from_bytes(digest[4 * i:4 * i + 4], 'big') for i in range(_HASHES)]
+
+
+def signature(words: Set[str]) -> str:
+    """Bloom filter of a page's words, base64-encoded for the cache."""
+    size = max(_MIN_SIGNATURE_BITS, -(-len(words) * SIGNATURE_BITS_PER_WORD // 64) * 64)
+    bits = bytearray(size // 8)
+    for word in words:
+        for h in _hashes(word):
+            position = h % size
+            bits[position >> 3] |= 1 << (position & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def _contains(bits: bytes, hashes: List[int]) -> bool:
+    size = len(bits) * 8
+    return all(bits[(h % size) >> 3] & (1 << ((h % size) & 7)) for h in hashes)
+
+
+def page_references(query: str, page_count: int) -> List[int]:
+    """0-based indexes of the pages a query names, within the document."""
+    indexes = set()
+    for match in _PAGE_REF.finditer(query):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if last < first or last - first > 20:
+            last = first
+        indexes.update(i - 1 for i in range(first, last + 1) if 1 <= i <= page_count)
+    return sorted(indexes)
+
+
+class PageIndex:
+    """Page count, per-page text and keyword signatures of files read page by page."""
+
+    def __init__(self, cache, batch_pages: int = 16):
+        self.cache = cache
+        self.batch_pages = batch_pages
+        self.pages_read = 0
+        self.selections = 0
+
+    @staticmethod
+    def file_key(file_path: str) -> Optional[str]:
+        """Cache key of a file version, or None if its parser cannot read single pages."""
+        try:
+            backend = parser_registry.backend_for(file_path)
+        except ValueError:
+            return None
+        if 'random_access' not in backend.capabilities:
+            return None
+        stat = Path(file_path).stat()
+        return f"{Path(file_path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{backend.name}"
+
+    def _entry(self, key: str, file_path: str) -> Dict:
+        entry = self.cache.get("page_index", key)
+        if entry is None:
+            entry = {'pages': parser_registry.page_count(file_path), 'signatures': {}}
+            self.cache.set("page_index", key, entry)
+        return entry
+
+    def page_count(self, file_path: str) -> Optional[int]:
+        """Number of pages (counted once per file version), or None without random access."""
+        key = self.file_key(file_path)
+        return self._entry(key, file_path)['pages'] if key else None
+
+    def read(self, file_path: str, indexes: List[int]) -> Dict[int, str]:
+        """Text of the given pages, extracting (and signing) only those not read before."""
+        key = self.file_key(file_path)
+        texts: Dict[int, str] = {}
+        missing = []
+        for i in indexes:
+            text = self.cache.get("page_text", f"{key}:{i}")
+            if text is None:
+                missing.append(i)
+            else:
+                texts[i] = text
+        if missing:
+            pages = parser_registry.read_pages(file_path, missing)
+            # Read-modify-write: a signature lost to a concurrent worker is simply recomputed later
+            entry = self._entry(key, file_path)
+            for i, text in zip(missing, pages):
+                self.cache.set("page_text", f"{key}:{i}", text)
+                entry['signatures'][str(i)] = signature(terms(text))
+                texts[i] = text
+            self.cache.set("page_index", key, entry)
+            self.pages_read += len(missing)
+        return texts
+
+    def select(self, file_path: str, query: str, limit: int, scan_pages: int) -> Tuple[List[int], int]:
+        """
+        Pages to answer a query from, and how many pages had to be read to find them.
+
+        Named pages are always included, and nothing more is read to find
+        others. Other pages are ranked by the rarity-weighted share of the
+        query's words their signature holds. Unsigned pages are read in
+        batches, in order, until some page holds every query word or
+        scan_pages pages were read; the first page (title,
+        reference numbers) is added when anything matched. Returns no pages
+        when nothing matched, so the caller reads the whole document.
+        """
+        key = self.file_key(file_path)
+        entry = self._entry(key, file_path)
+        count = entry['pages']
+        named = page_references(query, count)
+        wanted = query_terms(query)
+        hashes = {t: _hashes(t) for t in wanted}
+        scanned = 0
+        if named:
+            self.read(file_path, named)
+            scanned += len(named)
+
+        while True:
+            entry = self._entry(key, file_path)
+            signed = {int(i): base64.b64decode(s) for i, s in entry['signatures'].items()}
+            found = {page: {t for t in wanted if _contains(bits, hashes[t])} for page, bits in signed.items()}
+            complete = wanted and any(len(words) == len(wanted) for words in found.values())
+            unsigned = [i for i in range(count) if i not in signed]
+            if named or complete or not unsigned or not wanted or scanned >= scan_pages:
+                break
+            batch = unsigned[:min(self.batch_pages, scan_pages - scanned)]
+            self.read(file_path, batch)
+            scanned += len(batch)
+
+        # Words on fewer pages count for more (smoothed inverse document frequency)
+        weight = {t: math.log((len(found) + 1) / (sum(t in words for words in found.values()) + 0.5))
+                  for t in wanted}
+        scores = {page: sum(weight[t] for t in words) for page, words in found.items()}
+        matched = sorted((p for p, s in scores.items() if s > 0 and p not in named),
+                         key=lambda p: (-scores[p], p))[:max(0, limit - len(named))]
+        self.selections += 1
+        if not named and not matched:
+            return [], scanned
+        return sorted(set(named) | set(matched) | {0}), scanned
+
+    def complete(self, file_path: str) -> Optional[List[str]]:
+        """
+        Every page of a file, reusing the pages already read and extracting
+        the rest in one pass. None when no page was read yet (a plain full
+        parse is as fast). The per-page texts are dropped afterwards: the
+        parsed document takes over.
+        """
+        key = self.file_key(file_path)
+        entry = self.cache.get("page_index", key) if key else None
+        if not entry or not entry['signatures']:
+            return None
+        texts = {i: self.cache.get("page_text", f"{key}:{i}") for i in range(entry['pages'])}
+        missing = [i for i, text in texts.items() if text is None]
+        if missing:
+            texts.update(zip(missing, parser_registry.read_pages(file_path, missing)))
+            self.pages_read += len(missing)
+        self.cache.delete("page_text", f"{key}:", prefix=True)
+        return [texts[i] for i in range(entry['pages'])]
+
+    def forget(self, file_path: str) -> None:
+        """Drop every cached version of a file."""
+        prefix = f"{Path(file_path).resolve()}:"
+        self.cache.delete("page_index", prefix, prefix=True)
+        self.cache.delete("page_text", prefix, prefix=True)
+
+    def stats(self) -> Dict:
+        return {'pages_read': self.pages_read, 'selections': self.selections}
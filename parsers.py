@@ -0,0 +1,308 @@
+"""
+Parser backends for DIA.
+A registry of text-extraction engines per file format (PyPDF2, pypdf,
+pdfminer.six, PyMuPDF for PDF; python-docx or raw OOXML for DOCX). Engines are
+used only when their library is installed; PDF engines can also count pages and
+read single pages without extracting the whole file. A calibration run over a document
+corpus picks the fastest engine whose output matches the reference engine
+closely enough, and config.json can pin an engine per format.
+"""
+
+import re
+import time
+import zipfile
+import importlib.util
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from xml.etree import ElementTree
+
+from persistence import load_json, save_json
+
+_WORD = re.compile(r'\w+')
+_W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+FORMATS = {'.pdf': 'pdf', '.docx': 'docx', '.txt': 'txt'}
+
+
+class ParserBackend:
+    """One text-extraction engine for one file format."""
+
+    def __init__(self, name: str, fmt: str, parse: Callable[[str], List[str]],
+                 module: Optional[str] = None, capabilities: Iterable[str] = (),
+                 count: Optional[Callable[[str], int]] = None,
+                 read: Optional[Callable[[str, List[int]], List[str]]] = None):
+        self.name = name
+        self.format = fmt
+        self.parse = parse
+        self.module = module
+        self.capabilities = frozenset(capabilities) | ({'random_access'} if count and read else set())
+        # Page count and text of selected pages (0-based), for engines with random access
+        self.count = count
+        self.read = read
+
+    def available(self) -> bool:
+        """Whether the backing library is installed."""
+        return self.module is None or importlib.util.find_spec(self.module) is not None
+
+
+# ----------------------------------------------------------------------
+# Engines: each returns the document text as a list of pages
+# ----------------------------------------------------------------------
+
+def _pypdf2_pages(file_path: str) -> List[str]:
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        return [page.extract_text() or "" for page in PyPDF2.PdfReader(file).pages]
+
+
+def _pypdf_pages(file_path: str) -> List[str]:
+    import pypdf
+    with open(file_path, 'rb') as file:
+        return [page.extract_text() or "" for page in pypdf.PdfReader(file).pages]
+
+
+def _pypdf2_count(file_path: str) -> int:
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _pypdf2_read(file_path: str, indexes: List[int]) -> List[str]:
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        return [pages[i].extract_text() or "" for i in indexes]
+
+
+def _pypdf_count(file_path: str) -> int:
+    import pypdf
+    with open(file_path, 'rb') as file:
+        return len(pypdf.PdfReader(file).pages)
+
+
+def _pypdf_read(file_path: str, indexes: List[int]) -> List[str]:
+    import pypdf
+    with open(file_path, 'rb') as file:
+        pages = pypdf.PdfReader(file).pages
+        return [pages[i].extract_text() or "" for i in indexes]
+
+
+def _pdfminer_pages(file_path: str) -> List[str]:
+    from pdfminer.high_level import extract_text
+    pages = extract_text(file_path).split('\f')
+    # pdfminer terminates every page with a form feed
+    return pages[:-1] if len(pages) > 1 and not pages[-1].strip() else pages
+
+
+def _pymupdf_pages(file_path: str) -> List[str]:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def _pdfminer_count(file_path: str) -> int:
+    from pdfminer.pdfpage import PDFPage
+    with open(file_path, 'rb') as file:
+        return sum(1 for _ in PDFPage.get_pages(file))
+
+
+def _pdfminer_read(file_path: str, indexes: List[int]) -> List[str]:
+    from pdfminer.high_level import extract_text
+    # One pass over the wanted pages; pdfminer returns them in document order
+    wanted = sorted(set(indexes))
+    pages = dict(zip(wanted, extract_text(file_path, page_numbers=wanted).split('\f')))
+    return [pages.get(i, "") for i in indexes]
+
+
+def _pymupdf_count(file_path: str) -> int:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def _pymupdf_read(file_path: str, indexes: List[int]) -> List[str]:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text() for i in indexes]
+
+
+def _python_docx_pages(file_path: str) -> List[str]:
+    from docx import Document
+    doc = Document(file_path)
+    return ["\n".join(paragraph.text for paragraph in doc.paragraphs).strip()]
+
+
+def _docx_xml_pages(file_path: str) -> List[str]:
+    with zipfile.ZipFile(file_path) as archive:
+        body = ElementTree.fromstring(archive.read('word/document.xml')).find(f'{_W_NS}body')
+
+    paragraphs = []
+    for paragraph in body.findall(f'{_W_NS}p'):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f'{_W_NS}t':
+                parts.append(node.text or '')
+            elif node.tag == f'{_W_NS}tab':
+                parts.append('\t')
+            elif node.tag in (f'{_W_NS}br', f'{_W_NS}cr'):
+                parts.append('\n')
+        paragraphs.append(''.join(parts))
+    return ["\n".join(paragraphs).strip()]
+
+
+def _text_pages(file_path: str) -> List[str]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        # Form feeds mark page breaks in text exports
+        return f.read().split('\f')
+
+
+def word_recall(reference: str, candidate: str) -> float:
+    """Share of the reference's words (with multiplicity) present in candidate."""
+    expected = Counter(_WORD.findall(reference.lower()))
+    if not expected:
+        return 1.0
+    found = Counter(_WORD.findall(candidate.lower()))
+    return sum((expected & found).values()) / sum(expected.values())
+
+
+class ParserRegistry:
+    """Parser backends per format, with config overrides and calibrated choices."""
+
+    def __init__(self):
+        self._backends: Dict[str, List[ParserBackend]] = {}
+        self._overrides: Dict[str, str] = {}
+        self._calibrated: Dict[str, str] = {}
+        self.calibration_path: Optional[str] = None
+
+    def register(self, backend: ParserBackend) -> None:
+        """Add a backend; earlier registrations are preferred by default."""
+        self._backends.setdefault(backend.format, []).append(backend)
+
+    def configure(self, overrides: Optional[Dict[str, str]] = None, calibration_path: Optional[str] = None) -> None:
+        """Apply per-format overrides from config and load a saved calibration."""
+        self._overrides = {fmt: name for fmt, name in (overrides or {}).items() if name and name != 'auto'}
+        self.calibration_path = calibration_path
+        if calibration_path:
+            calibration = load_json(calibration_path, {})
+            self._calibrated = {fmt: info['selected'] for fmt, info in calibration.get('formats', {}).items()
+                                if info.get('selected')}
+
+    def backends(self, fmt: str, require: Iterable[str] = ()) -> List[ParserBackend]:
+        """Installed backends for a format that have the required capabilities."""
+        required = set(require)
+        return [b for b in self._backends.get(fmt, []) if b.available() and required <= b.capabilities]
+
+    def select(self, fmt: str, require: Iterable[str] = ()) -> ParserBackend:
+        """Backend to use: config override, then calibration, then the default."""
+        candidates = self.backends(fmt, require)
+        if not candidates:
+            raise ValueError(f"No parser backend installed for format: {fmt}")
+        by_name = {b.name: b for b in candidates}
+        for choice in (self._overrides.get(fmt), self._calibrated.get(fmt)):
+            if choice in by_name:
+                return by_name[choice]
+        return candidates[0]
+
+    def backend_for(self, file_path: str, require: Iterable[str] = ()) -> ParserBackend:
+        """Backend that will parse this file."""
+        ext = Path(file_path).suffix.lower()
+        fmt = FORMATS.get(ext)
+        if fmt is None:
+            raise ValueError(f"Unsupported file format: {ext}")
+        return self.select(fmt, require)
+
+    def parse_pages(self, file_path: str, require: Iterable[str] = ()) -> List[str]:
+        """Parse a file into pages with the selected backend for its format."""
+        backend = self.backend_for(file_path, require)
+        try:
+            return backend.parse(file_path)
+        except Exception as e:
+            raise Exception(f"Error parsing {backend.format.upper()}: {str(e)}")
+
+    def page_count(self, file_path: str) -> Optional[int]:
+        """Number of pages, or None if the selected backend cannot read pages one at a time."""
+        backend = self.backend_for(file_path)
+        if 'random_access' not in backend.capabilities:
+            return None
+        try:
+            return backend.count(file_path)
+        except Exception as e:
+            raise Exception(f"Error parsing {backend.format.upper()}: {str(e)}")
+
+    def read_pages(self, file_path: str, indexes: List[int]) -> List[str]:
+        """Text of the given pages (0-based) with the selected backend, which must support random access."""
+        backend = self.backend_for(file_path, ('random_access',))
+        try:
+            return backend.read(file_path, indexes)
+        except Exception as e:
+            raise Exception(f"Error parsing {backend.format.upper()}: {str(e)}")
+
+    def calibrate(self, docs_dir: str, rounds: int = 3, min_quality: float = 0.95) -> Dict:
+        """
+        Time every installed backend on a corpus and select the fastest per format
+        whose word recall against the default backend is at least min_quality.
+        """
+        files: Dict[str, List[Path]] = {}
+        for path in sorted(Path(docs_dir).iterdir()):
+            fmt = FORMATS.get(path.suffix.lower())
+            if fmt and path.is_file():
+                files.setdefault(fmt, []).append(path)
+
+        report = {'created': time.time(), 'docs_dir': str(docs_dir), 'min_quality': min_quality, 'formats': {}}
+        for fmt, paths in files.items():
+            candidates = self.backends(fmt)
+            if not candidates:
+                continue
+            reference = candidates[0]
+            size = sum(p.stat().st_size for p in paths)
+            expected = {p: "\n".join(reference.parse(str(p))) for p in paths}
+
+            results = {}
+            for backend in candidates:
+                try:
+                    best = float('inf')
+                    for _ in range(rounds):
+                        start = time.perf_counter()
+                        texts = {p: "\n".join(backend.parse(str(p))) for p in paths}
+                        best = min(best, time.perf_counter() - start)
+                except Exception as e:
+                    results[backend.name] = {'error': str(e)}
+                    continue
+                quality = sum(word_recall(expected[p], texts[p]) for p in paths) / len(paths)
+                results[backend.name] = {
+                    'seconds': round(best, 6),
+                    'mb_per_s': round(size / 1e6 / best, 2) if best else None,
+                    'quality': round(quality, 4),
+                    'capabilities': sorted(backend.capabilities)
+                }
+
+            qualified = [name for name, r in results.items() if 'error' not in r and r['quality'] >= min_quality]
+            selected = min(qualified, key=lambda name: results[name]['seconds']) if qualified else reference.name
+            report['formats'][fmt] = {
+                'files': len(paths),
+                'bytes': size,
+                'reference': reference.name,
+                'selected': selected,
+                'backends': results
+            }
+
+        self._calibrated = {fmt: info['selected'] for fmt, info in report['formats'].items()}
+        if self.calibration_path:
+            save_json(self.calibration_path, report)
+        return report
+
+
+parser_registry = ParserRegistry()
+# PyPDF2 and python-docx stay the defaults (and calibration references)
+parser_registry.register(ParserBackend('pypdf2', 'pdf', _pypdf2_pages, 'PyPDF2', ('pages',),
+                                       _pypdf2_count, _pypdf2_read))
+parser_registry.register(ParserBackend('pypdf', 'pdf', _pypdf_pages, 'pypdf', ('pages',),
+                                       _pypdf_count, _pypdf_read))
+parser_registry.register(ParserBackend('pdfminer', 'pdf', _pdfminer_pages, 'pdfminer', ('pages', 'layout'),
+                                       _pdfminer_count, _pdfminer_read))
+parser_registry.register(ParserBackend('pymupdf', 'pdf', _pymupdf_pages, 'fitz', ('pages', 'layout'),
+                                       _pymupdf_count, _pymupdf_read))
+parser_registry.register(ParserBackend('python-docx', 'docx', _python_docx_pages, 'docx'))
+parser_registry.register(ParserBackend('docx-xml', 'docx', _docx_xml_pages))
+parser_registry.register(ParserBackend('text', 'txt', _text_pages, capabilities=('pages',)))
@@ -0,0 +1,144 @@
+"""
+Persistence helpers for DIA local indexes and caches.
+Small JSON files written atomically so a crash never leaves a torn index.
+"""
+
+import os
+import json
+import atexit
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+
+# Long strings are hashed in slices of this many characters, so hashing a
+# document never holds a full UTF-8 (or JSON-escaped) copy of it
+_HASH_CHUNK = 1 << 16
+
+
+def _update_text(digest, text: str) -> None:
+    for start in range(0, len(text), _HASH_CHUNK):
+        digest.update(text[start:start + _HASH_CHUNK].encode('utf-8'))
+
+
+def text_fingerprint(text: str) -> str:
+    """Stable content hash used as a document identifier."""
+    digest = hashlib.sha256()
+    _update_text(digest, text)
+    return digest.hexdigest()
+
+
+def _update_json(digest, value: Any, sort_keys: bool) -> None:
+    if isinstance(value, str):
+        # JSON escaping is per character, so escaping slices gives the same bytes
+        digest.update(b'"')
+        for start in range(0, len(value), _HASH_CHUNK):
+            digest.update(json.dumps(value[start:start + _HASH_CHUNK], ensure_ascii=False)[1:-1].encode('utf-8'))
+        digest.update(b'"')
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        items = sorted(value.items()) if sort_keys else value.items()
+        for i, (key, item) in enumerate(items):
+            if i:
+                digest.update(b', ')
+            _update_json(digest, key if isinstance(key, str) else json.dumps(key), sort_keys)
+            digest.update(b': ')
+            _update_json(digest, item, sort_keys)
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for i, item in enumerate(value):
+            if i:
+                digest.update(b', ')
+            _update_json(digest, item, sort_keys)
+        digest.update(b']')
+    else:
+        digest.update(json.dumps(value).encode('utf-8'))
+
+
+def json_fingerprint(value: Any, sort_keys: bool = False) -> str:
+    """sha256 of json.dumps(value, ensure_ascii=False, sort_keys=...), computed without building the JSON."""
+    digest = hashlib.sha256()
+    _update_json(digest, value, sort_keys)
+    return digest.hexdigest()
+
+
+def load_json(path: str, default: Any) -> Any:
+    """Load JSON from path, returning default if missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path: str, data: Any) -> None:
+    """Write JSON atomically (temp file + rename)."""
+    write_atomic(path, json.dumps(data, ensure_ascii=False))
+
+
+def write_atomic(path: str, content: Union[str, bytes]) -> None:
+    """Write text or bytes atomically (temp file + rename)."""
+    directory = Path(path).parent
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(directory), suffix='.tmp')
+    except (OSError, PermissionError):
+        # Read-only filesystems (e.g. serverless) just lose persistence
+        return
+
+    try:
+        if isinstance(content, bytes):
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class DebouncedWriter:
+    """
+    Coalesces frequent saves of one JSON file into at most one write per interval.
+
+    The snapshot callable is invoked at write time and must return the JSON
+    text, taking whatever lock protects the underlying data.
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], str], interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        atexit.register(self.flush)
+
+    def schedule(self) -> None:
+        """Mark data as changed; it is written within interval seconds."""
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+        with self._write_lock:
+            write_atomic(self.path, self._snapshot())
@@ -0,0 +1,226 @@
+"""
+Per-request sampling profiler for DIA.
+Periodically samples the stacks of the threads working on one request (the
+request thread plus executor threads running its parsing and LLM calls) and
+saves the result as collapsed stacks (flamegraph.pl / speedscope import) and
+speedscope JSON in a size-bounded directory.
+"""
+
+import re
+import sys
+import asyncio
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from persistence import write_atomic
+
+# Profiler of the request being served, if it is being profiled
+_active_profiler = contextvars.ContextVar('dia_profiler', default=None)
+
+_PROFILE_ID = re.compile(r'^[0-9TZ]+-[0-9a-f]{8}$')
+
+
+def call_in_profile(func, *args):
+    """Run func, sampling this thread too if the current request is being profiled."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return func(*args)
+    with profiler.thread():
+        return func(*args)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})".replace(';', ',')
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads attached to one request.
+
+    With shared_loop (the ASGI path), the event loop thread also runs other
+    requests, so its samples are kept only while this request's task (or, on
+    Python 3.12+, a task it spawned) is the one running.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128, shared_loop: bool = False):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.shared_loop = shared_loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop_thread: Optional[int] = None
+        self.samples: Counter = Counter()
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    @contextmanager
+    def thread(self):
+        """Sample the calling thread for the duration of the block."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    @contextmanager
+    def activate(self):
+        """Profile the calling thread and everything it hands to call_in_profile()."""
+        token = _active_profiler.set(self)
+        if self.shared_loop:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+            self._loop_thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name='dia-profiler', daemon=True)
+        self._sampler.start()
+        try:
+            with self.thread():
+                yield self
+        finally:
+            self._stop.set()
+            self._sampler.join()
+            self.elapsed = time.perf_counter() - self.started
+            _active_profiler.reset(token)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                idents = list(self._threads)
+            frames = sys._current_frames()
+            for ident in idents:
+                if ident == self._loop_thread and not self._running_own_task():
+                    continue
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def _running_own_task(self) -> bool:
+        """Whether the shared loop is running this request's code rather than another request's."""
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            return False
+        if task is self._task:
+            return True
+        get_context = getattr(task, 'get_context', None)
+        return get_context is not None and get_context().get(_active_profiler) is self
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format: 'frame;frame;frame count'."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def speedscope(self, name: str) -> Dict:
+        """speedscope sampled-profile JSON (weights in milliseconds)."""
+        frames: List[Dict] = []
+        index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.most_common():
+            ids = []
+            for label in stack.split(';'):
+                if label not in index:
+                    index[label] = len(frames)
+                    func, _, location = label.rpartition(' (')
+                    file, _, line = location.rstrip(')').rpartition(':')
+                    frames.append({'name': func, 'file': file, 'line': int(line) if line.isdigit() else None})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(round(count * self.interval * 1000, 3))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'dia-profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+
+class ProfileStore:
+    """Size-bounded directory of saved profiles."""
+
+    FORMATS = {'collapsed': '.collapsed.txt', 'speedscope': '.speedscope.json'}
+
+    def __init__(self, profile_dir: str, max_files: int = 100, max_bytes: int = 50 * 1024 * 1024):
+        self.profile_dir = Path(profile_dir)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def save(self, profiler: SamplingProfiler, meta: Dict) -> str:
+        """Write a profile in both formats and return its id."""
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+        meta = {
+            'id': profile_id,
+            'created': time.time(),
+            'duration_ms': round(profiler.elapsed * 1000, 1),
+            'samples': sum(profiler.samples.values()),
+            'interval_ms': profiler.interval * 1000,
+            **meta
+        }
+        name = f"{meta.get('task', 'process')} {profile_id}"
+        with self._lock:
+            base = self.profile_dir / profile_id
+            write_atomic(f"{base}.collapsed.txt", profiler.collapsed())
+            write_atomic(f"{base}.speedscope.json", json.dumps(profiler.speedscope(name)))
+            write_atomic(f"{base}.meta.json", json.dumps(meta))
+            self._evict()
+        return profile_id
+
+    def _evict(self) -> None:
+        """Drop the oldest profiles beyond max_files or max_bytes."""
+        profiles = self.list()
+        total = 0
+        for position, meta in enumerate(profiles):
+            total += meta.get('bytes', 0)
+            if position >= self.max_files or total > self.max_bytes:
+                for path in self.profile_dir.glob(f"{meta['id']}.*"):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+    def list(self) -> List[Dict]:
+        """Saved profiles, newest first."""
+        profiles = []
+        for meta_path in self.profile_dir.glob('*.meta.json'):
+            try:
+                meta = json.loads(meta_path.read_text(encoding='utf-8'))
+                meta['bytes'] = sum(p.stat().st_size for p in self.profile_dir.glob(f"{meta['id']}.*"))
+            except (OSError, ValueError):
+                continue
+            profiles.append(meta)
+        return sorted(profiles, key=lambda m: m['created'], reverse=True)
+
+    def path(self, profile_id: str, fmt: str) -> Optional[str]:
+        """File of a saved profile in the given format, or None."""
+        if not _PROFILE_ID.match(profile_id) or fmt not in self.FORMATS:
+            return None
+        path = self.profile_dir / f"{profile_id}{self.FORMATS[fmt]}"
+        return str(path) if path.is_file() else None
@@ -0,0 +1,162 @@
+"""
+Durable result store for DIA.
+Completed /api/process responses are kept in SQLite with a TTL, addressable
+by result ID (with an ETag for conditional GET) and by the client's
+Idempotency-Key, so retried or double-submitted requests are answered from
+the store instead of starting another LLM call.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from persistence import json_fingerprint
+
+NEW = 'new'
+DONE = 'done'
+PENDING = 'pending'
+CONFLICT = 'conflict'
+
+# Expired rows are purged every this many writes
+_PURGE_EVERY = 100
+
+
+def request_hash(data: Any) -> str:
+    """Fingerprint of a request body, to detect a key reused for a different request."""
+    return json_fingerprint(data, sort_keys=True)
+
+
+class ResultStore:
+    """Completed results by ID and idempotency key, shared by all worker processes."""
+
+    def __init__(self, db_path: str, ttl: float = 86400.0, pending_ttl: float = 600.0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    result_id TEXT PRIMARY KEY,
+                    idempotency_key TEXT UNIQUE,
+                    request_hash TEXT,
+                    status TEXT NOT NULL,
+                    body TEXT,
+                    etag TEXT,
+                    created REAL NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process; never reuse one inherited across fork()."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def begin(self, idempotency_key: Optional[str], data: Any) -> Tuple[str, Optional[Dict]]:
+        """
+        Claim a request before processing it.
+
+        Returns (NEW, {'result_id'}) if the caller should process it,
+        (DONE, record) if it already completed, (PENDING, {'result_id'}) if
+        another request with the same key is in flight, and (CONFLICT, None)
+        if the key was used for a different request body.
+        """
+        result_id = uuid.uuid4().hex
+        now = time.time()
+        digest = request_hash(data)
+        conn = self._connect()
+        with conn:
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT result_id, request_hash, status, expires FROM results WHERE idempotency_key = ?",
+                    (idempotency_key,)
+                ).fetchone()
+                if row is not None and row[3] >= now:
+                    if row[1] != digest:
+                        return CONFLICT, None
+                    if row[2] == PENDING:
+                        return PENDING, {'result_id': row[0]}
+                    record = self.get(row[0])
+                    if record is not None:
+                        return DONE, record
+                if row is not None:
+                    # Expired, or a pending claim abandoned by a crashed worker
+                    conn.execute("DELETE FROM results WHERE result_id = ?", (row[0],))
+            try:
+                conn.execute(
+                    "INSERT INTO results (result_id, idempotency_key, request_hash, status, created, expires) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (result_id, idempotency_key or None, digest, PENDING, now, now + self.pending_ttl)
+                )
+            except sqlite3.IntegrityError:
+                # Another worker claimed the same key in the meantime
+                lost_race = True
+            else:
+                lost_race = False
+        if lost_race:
+            return self.begin(idempotency_key, data)
+        return NEW, {'result_id': result_id}
+
+    def complete(self, result_id: str, body: Dict) -> str:
+        """Store the response of a claimed request. Returns its ETag."""
+        data = json.dumps(body, ensure_ascii=False, sort_keys=True)
+        etag = '"' + hashlib.sha256(data.encode('utf-8')).hexdigest()[:32] + '"'
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE results SET status = ?, body = ?, etag = ?, expires = ? WHERE result_id = ?",
+                (DONE, data, etag, now + self.ttl, result_id)
+            )
+        self._maybe_purge(conn)
+        return etag
+
+    def abandon(self, result_id: str) -> None:
+        """Release a claim whose request failed, so a retry can run it again."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM results WHERE result_id = ? AND status = ?", (result_id, PENDING))
+
+    def get(self, result_id: str) -> Optional[Dict]:
+        """Completed result: {'result_id', 'body', 'etag', 'created', 'expires'}, or None."""
+        row = self._connect().execute(
+            "SELECT body, etag, created, expires FROM results WHERE result_id = ? AND status = ?",
+            (result_id, DONE)
+        ).fetchone()
+        if row is None or row[3] < time.time():
+            return None
+        return {'result_id': result_id, 'body': json.loads(row[0]), 'etag': row[1],
+                'created': row[2], 'expires': row[3]}
+
+    def status(self, result_id: str) -> Optional[str]:
+        """DONE or PENDING, or None if unknown or expired."""
+        row = self._connect().execute(
+            "SELECT status, expires FROM results WHERE result_id = ?", (result_id,)
+        ).fetchone()
+        return row[0] if row and row[1] >= time.time() else None
+
+    def _maybe_purge(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % _PURGE_EVERY == 0
+        if purge:
+            with conn:
+                conn.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
@@ -0,0 +1,284 @@
+"""
+Per-tenant fair scheduling of LLM calls for DIA.
+Shares the deployment's LLM capacity between offices: requests are tagged with
+a tenant and a priority, interactive work is always dispatched before batch
+work, and within a priority class tenants get capacity in proportion to their
+weight (self-clocked weighted fair queuing on estimated prompt tokens), subject
+to per-tenant concurrency and tokens-per-minute quotas.
+"""
+
+import time
+import asyncio
+import hashlib
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+DEFAULT_TENANT = 'default'
+
+# Tenant and priority of the request being served; set by the web layer
+_request_tenant = contextvars.ContextVar('dia_tenant', default=(DEFAULT_TENANT, INTERACTIVE))
+
+
+def tenant_from_headers(headers) -> Tuple[str, str]:
+    """Resolve (tenant, priority) from X-Tenant-ID / X-API-Key and X-Priority."""
+    tenant = (headers.get('X-Tenant-ID') or '').strip()[:64]
+    if not tenant:
+        api_key = (headers.get('X-API-Key') or '').strip()
+        # Never expose raw keys in metrics
+        tenant = 'key-' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12] if api_key else DEFAULT_TENANT
+    priority = BATCH if (headers.get('X-Priority') or '').strip().lower() == BATCH else INTERACTIVE
+    return tenant, priority
+
+
+@contextmanager
+def tenant_context(tenant: str, priority: str = INTERACTIVE):
+    """Attribute LLM calls made inside the block to a tenant."""
+    token = _request_tenant.set((tenant, priority))
+    try:
+        yield
+    finally:
+        _request_tenant.reset(token)
+
+
+def current_tenant() -> Tuple[str, str]:
+    """(tenant, priority) of the current request."""
+    return _request_tenant.get()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class _Request:
+    __slots__ = ('tenant', 'priority', 'cost', 'finish', 'seq', 'wake', 'granted', 'enqueued', 'started')
+
+    def __init__(self, tenant: str, priority: str, cost: int, finish: float, seq: int, wake, now: float):
+        self.tenant = tenant
+        self.priority = priority
+        self.cost = cost
+        self.finish = finish
+        self.seq = seq
+        self.wake = wake
+        self.granted = False
+        self.enqueued = now
+        self.started = 0.0
+
+
+class _TenantState:
+    __slots__ = ('active', 'last_finish', 'window', 'window_tokens', 'requests', 'completed',
+                 'tokens', 'queue_waits', 'latencies', 'last_seen')
+
+    def __init__(self):
+        self.active = 0
+        self.last_finish = 0.0
+        self.window: deque = deque()  # (dispatch time, tokens) in the last minute
+        self.window_tokens = 0
+        self.requests = 0
+        self.completed = 0
+        self.tokens = 0
+        self.queue_waits: deque = deque(maxlen=200)
+        self.latencies: deque = deque(maxlen=200)
+        self.last_seen = 0.0
+
+
+class FairScheduler:
+    """Weighted fair queue with priorities and per-tenant quotas in front of the LLM."""
+
+    # How often quota-blocked waiters re-check as the token window slides
+    RECHECK_INTERVAL = 1.0
+
+    def __init__(self, max_concurrency: int = 8, policies: Optional[Dict[str, Dict]] = None,
+                 max_tenants: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.policies = policies or {}
+        self.max_tenants = max_tenants
+
+        self._lock = threading.Lock()
+        self._waiting: List[_Request] = []
+        self._active = 0
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._tenants: Dict[str, _TenantState] = {}
+
+    # ------------------------------------------------------------------
+    # Internal state (call with self._lock held)
+    # ------------------------------------------------------------------
+
+    def _policy(self, tenant: str) -> Dict:
+        policy = {'weight': 1.0, 'max_concurrency': self.max_concurrency, 'tokens_per_minute': 0}
+        policy.update(self.policies.get(DEFAULT_TENANT, {}))
+        policy.update(self.policies.get(tenant, {}))
+        return policy
+
+    def _state(self, tenant: str, now: float) -> _TenantState:
+        state = self._tenants.get(tenant)
+        if state is None:
+            if len(self._tenants) >= self.max_tenants:
+                self._prune()
+            state = self._tenants[tenant] = _TenantState()
+        state.last_seen = now
+        return state
+
+    def _prune(self) -> None:
+        busy = {r.tenant for r in self._waiting}
+        idle = [t for t, s in self._tenants.items() if s.active == 0 and t not in busy]
+        for tenant in sorted(idle, key=lambda t: self._tenants[t].last_seen)[:max(1, len(idle) // 2)]:
+            del self._tenants[tenant]
+
+    def _slide_window(self, state: _TenantState, now: float) -> None:
+        while state.window and now - state.window[0][0] >= 60:
+            state.window_tokens -= state.window.popleft()[1]
+
+    def _eligible(self, request: _Request, now: float) -> bool:
+        policy = self._policy(request.tenant)
+        state = self._tenants[request.tenant]
+        if state.active >= policy['max_concurrency']:
+            return False
+        quota = policy['tokens_per_minute']
+        if quota:
+            self._slide_window(state, now)
+            # A single oversized prompt still runs once the window is empty
+            if state.window_tokens and state.window_tokens + request.cost > quota:
+                return False
+        return True
+
+    def _dispatch(self, now: float) -> None:
+        while self._active < self.max_concurrency and self._waiting:
+            best = None
+            for request in self._waiting:
+                key = (request.priority != INTERACTIVE, request.finish, request.seq)
+                if (best is None or key < best[0]) and self._eligible(request, now):
+                    best = (key, request)
+            if best is None:
+                return
+
+            request = best[1]
+            self._waiting.remove(request)
+            # Self-clocked: virtual time is the finish tag of the call last put in service
+            self._virtual_time = max(self._virtual_time, request.finish)
+            state = self._tenants[request.tenant]
+            state.active += 1
+            state.window.append((now, request.cost))
+            state.window_tokens += request.cost
+            state.tokens += request.cost
+            state.queue_waits.append(now - request.enqueued)
+            self._active += 1
+            request.granted = True
+            request.started = now
+            request.wake()
+
+    def _enqueue(self, tenant: str, priority: str, cost: int, wake) -> _Request:
+        now = time.monotonic()
+        state = self._state(tenant, now)
+        state.requests += 1
+        weight = max(0.01, float(self._policy(tenant)['weight']))
+        finish = max(self._virtual_time, state.last_finish) + cost / weight
+        state.last_finish = finish
+        request = _Request(tenant, priority, cost, finish, next(self._seq), wake, now)
+        self._waiting.append(request)
+        self._dispatch(now)
+        return request
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def acquire(self, tenant: str, priority: str, cost: int) -> _Request:
+        """Wait until the scheduler dispatches this LLM call."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+        with self._lock:
+            request = self._enqueue(tenant, priority, max(1, cost), wake)
+
+        try:
+            while True:
+                with self._lock:
+                    if not request.granted:
+                        self._dispatch(time.monotonic())
+                    if request.granted:
+                        return request
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), self.RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if not request.granted:
+                    self._waiting.remove(request)
+                    raise
+            self.release(request)
+            raise
+
+    def release(self, request: _Request) -> None:
+        """Finish an LLM call and dispatch the next waiter."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._tenants.get(request.tenant)
+            if state is not None:
+                state.active -= 1
+                state.completed += 1
+                state.latencies.append(now - request.enqueued)
+            self._active -= 1
+            self._dispatch(now)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, priority: str, cost: int):
+        """Hold an LLM slot for the duration of one call."""
+        request = await self.acquire(tenant, priority, cost)
+        try:
+            yield
+        finally:
+            self.release(request)
+
+    def idle(self) -> bool:
+        """True when no LLM call is running or waiting."""
+        with self._lock:
+            return not self._active and not self._waiting
+
+    def metrics(self) -> Dict:
+        """Per-tenant usage, queueing and latency."""
+        with self._lock:
+            now = time.monotonic()
+            queued: Dict[str, Dict[str, int]] = {}
+            for request in self._waiting:
+                counts = queued.setdefault(request.tenant, {INTERACTIVE: 0, BATCH: 0})
+                counts[request.priority] += 1
+
+            tenants = {}
+            for tenant, state in self._tenants.items():
+                self._slide_window(state, now)
+                waits = list(state.queue_waits)
+                latencies = list(state.latencies)
+                tenants[tenant] = {
+                    'requests': state.requests,
+                    'completed': state.completed,
+                    'active': state.active,
+                    'queued': queued.get(tenant, {INTERACTIVE: 0, BATCH: 0}),
+                    'tokens': state.tokens,
+                    'tokens_last_minute': state.window_tokens,
+                    'avg_queue_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    'p95_queue_ms': round(_percentile(waits, 0.95) * 1000, 1),
+                    'avg_latency_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                    'p95_latency_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+                    'policy': self._policy(tenant)
+                }
+            return {
+                'max_concurrency': self.max_concurrency,
+                'active': self._active,
+                'queued': len(self._waiting),
+                'tenants': tenants
+            }
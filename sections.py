@@ -0,0 +1,77 @@
+"""
+Section splitting for DIA.
+Splits government documents into stable, content-defined sections so that
+an amendment only changes the sections it actually touches.
+"""
+
+import re
+import hashlib
+from typing import List
+
+# Numbered clauses (1., 2.3, IV., A.), Odia numerals, and common heading words
+_HEADING_PATTERN = re.compile(
+    r'^\s*(?:\d+(?:\.\d+)*[.)]|[୦-୯]+[.)]|[IVX]+\.|[A-Z]\.|'
+    r'(?:chapter|section|annexure|schedule|part|appendix)\b)\s*\S',
+    re.IGNORECASE
+)
+_SEPARATOR_PATTERN = re.compile(r'^\s*[=\-_*━═─]{5,}\s*$')
+
+
+def is_heading(line: str) -> bool:
+    """Heuristic heading detection for circulars, GRs and tenders."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 100:
+        return False
+    if _HEADING_PATTERN.match(stripped):
+        return True
+    letters = [c for c in stripped if c.isascii() and c.isalpha()]
+    # All-caps English headings such as "ELIGIBILITY CRITERIA"
+    return len(letters) >= 4 and ' ' in stripped and all(c.isupper() for c in letters)
+
+
+def section_hash(text: str) -> str:
+    """Whitespace-insensitive content hash of a section."""
+    normalized = re.sub(r'\s+', ' ', text).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+def split_sections(text: str, max_chars: int = 4000, min_chars: int = 800) -> List[str]:
+    """
+    Split a document into sections.
+
+    Headings always start a new section. Long runs without headings are cut
+    at content-defined paragraph boundaries, so an edit early in the text
+    does not shift every later boundary.
+    """
+    sections: List[str] = []
+    current: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        body = '\n'.join(current).strip()
+        if body:
+            sections.append(body)
+        current = []
+        size = 0
+
+    for paragraph in re.split(r'\n\s*\n', text):
+        if not paragraph.strip() or _SEPARATOR_PATTERN.match(paragraph):
+            continue
+
+        first_line = paragraph.strip().split('\n', 1)[0]
+        if current and is_heading(first_line) and size >= min_chars // 4:
+            flush()
+
+        if current and size + len(paragraph) > max_chars:
+            flush()
+
+        current.append(paragraph.strip())
+        size += len(paragraph)
+
+        # Content-defined cut point: stable across insertions elsewhere
+        if size >= min_chars and int(section_hash(paragraph)[:4], 16) % 4 == 0:
+            flush()
+
+    flush()
+    return sections
@@ -0,0 +1,191 @@
+"""
+Host-wide shared cache for DIA.
+A SQLite (WAL) key/value store used by every worker process on the host, so
+parsed text, section indexes and LLM responses computed by one gunicorn worker
+are hits in all the others. Connections are per thread and per process, so
+the cache stays safe when the app is preloaded and then forked.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Reads refresh the LRU timestamp at most this often, to keep reads write-free
+_TOUCH_INTERVAL = 60.0
+# Size is checked against max_bytes every this many writes
+_EVICT_EVERY = 50
+
+
+class SharedCache:
+    """Namespaced key/value cache in SQLite shared by all worker processes."""
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._writes = 0
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL,
+                    used REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process; never reuse one inherited across fork()."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Cached value, or None if missing or expired."""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires, used FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < now):
+            with self._lock:
+                self._counts[f'{namespace}.misses'] += 1
+            return None
+
+        if now - row[2] > _TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE entries SET used = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        with self._lock:
+            self._counts[f'{namespace}.hits'] += 1
+        return json.loads(row[0])
+
+    def contains(self, namespace: str, key: str) -> bool:
+        """Whether a live entry exists, without reading its value."""
+        row = self._connect().execute(
+            "SELECT expires FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] >= time.time())
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a JSON-serializable value, optionally expiring after ttl seconds."""
+        data = json.dumps(value, ensure_ascii=False)
+        # Sized in bytes: Odia text takes three UTF-8 bytes per character
+        size = len(data.encode('utf-8'))
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, data, size, now + ttl if ttl else None, now)
+            )
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % _EVICT_EVERY == 0
+        if evict:
+            self._evict(conn)
+
+    def update(self, namespace: str, key: str, change: Callable[[Optional[Any]], Optional[Any]],
+               ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Replace a value with change(current value, or None) and return it.
+
+        Runs under SQLite's write lock, so read-modify-write updates from
+        several workers are never lost. Returning None deletes the entry.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            current = json.loads(row[0]) if row is not None and (row[1] is None or row[1] >= now) else None
+            value = change(current)
+            if value is None:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            else:
+                data = json.dumps(value, ensure_ascii=False)
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires, used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, data, len(data.encode('utf-8')), now + ttl if ttl else None, now)
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % _EVICT_EVERY == 0
+        if evict:
+            self._evict(conn)
+        return value
+
+    def delete(self, namespace: str, key: str, prefix: bool = False) -> int:
+        """Remove an entry (or every entry whose key starts with key). Returns the count removed."""
+        conn = self._connect()
+        with conn:
+            if prefix:
+                cursor = conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND substr(key, 1, ?) = ?", (namespace, len(key), key)
+                )
+            else:
+                cursor = conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop expired entries, then least recently used ones beyond max_bytes."""
+        with conn:
+            conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            freed = 0
+            victims = []
+            for namespace, key, size in conn.execute("SELECT namespace, key, size FROM entries ORDER BY used"):
+                victims.append((namespace, key))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+
+    def stats(self) -> Dict:
+        """Host-wide entry counts and this process's hit/miss counters."""
+        rows = self._connect().execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+        ).fetchall()
+        with self._lock:
+            counts = dict(self._counts)
+        namespaces = {}
+        for namespace, entries, size in rows:
+            hits = counts.get(f'{namespace}.hits', 0)
+            misses = counts.get(f'{namespace}.misses', 0)
+            namespaces[namespace] = {
+                'entries': entries,
+                'bytes': size,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None
+            }
+        return {'pid': os.getpid(), 'max_bytes': self.max_bytes, 'namespaces': namespaces}
@@ -10,12 +10,27 @@ const state = {
     file1: null,
     file2: null,
     file1Path: null,
-    file2Path: null
+    file2Path: null,
+    // Links the uploads and the process call of one analysis in server traces
+    traceId: newTraceId()
 };
 
 // API Configuration
 const API_BASE = window.location.origin;
 
+function newTraceId() {
+    const bytes = new Uint8Array(16);
+    crypto.getRandomValues(bytes);
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Same analysis in the same session => same key, so retries and repeat clicks reuse the stored result
+async function idempotencyKey(payload) {
+    const data = new TextEncoder().encode(`${state.traceId}:${JSON.stringify(payload)}`);
+    const digest = await crypto.subtle.digest('SHA-256', data);
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
 // ============================================
 // Initialization
 // ============================================
@@ -194,6 +209,9 @@ async function uploadFile(file, fileNumber) {
     try {
         const response = await fetch(`${API_BASE}/api/upload`, {
             method: 'POST',
+            headers: {
+                'X-Trace-Id': state.traceId
+            },
             body: formData
         });
         
@@ -286,15 +304,17 @@ async function processDocument() {
         const payload = {
             task: state.task,
             language: state.language,
-            document_1: state.file1Path,
-            document_2: state.file2Path,
+            document_1: state.file1Path ? { path: state.file1Path } : undefined,
+            document_2: state.file2Path ? { path: state.file2Path } : undefined,
             query: document.getElementById('queryInput').value.trim() || undefined
         };
         
-        const response = await fetch(`${API_BASE}/api/process`, {
+        const response = await fetchWithRetry(`${API_BASE}/api/process`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Trace-Id': state.traceId,
+                'Idempotency-Key': await idempotencyKey(payload)
             },
             body: JSON.stringify(payload)
         });
@@ -316,6 +336,34 @@ async function processDocument() {
     }
 }
 
+const MAX_RETRIES = 4;
+// A duplicate of a request still running (409) is retried until the original finishes
+const MAX_PENDING_RETRIES = 120;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function fetchWithRetry(url, options) {
+    // Retry shed requests (429), honouring Retry-After with jittered exponential backoff
+    for (let attempt = 0, pending = 0; ; attempt++) {
+        const response = await fetch(url, options);
+        const retryAfter = parseFloat(response.headers.get('Retry-After'));
+        if (response.status === 409 && !isNaN(retryAfter) && pending < MAX_PENDING_RETRIES) {
+            pending++;
+            attempt--;
+            await sleep(retryAfter * 1000);
+            continue;
+        }
+        if (response.status !== 429 || attempt >= MAX_RETRIES) {
+            return response;
+        }
+        
+        const backoff = Math.min(30, 2 ** attempt) * (0.5 + Math.random() / 2);
+        await sleep(Math.max(isNaN(retryAfter) ? 0 : retryAfter, backoff) * 1000);
+    }
+}
+
 // ============================================
 // Results Display
 // ============================================
@@ -324,8 +372,8 @@ function displayResults(result) {
     const resultsSection = document.getElementById('resultsSection');
     const resultsContent = document.getElementById('resultsContent');
     
-    // Format output
-    let formattedOutput = result.output;
+    // Format output (escaped: it may echo text from the document)
+    let formattedOutput = escapeHtml(result.output);
     
     // Convert line breaks to HTML
     formattedOutput = formattedOutput.replace(/\n\n/g, '</p><p>');
@@ -338,7 +386,47 @@ function displayResults(result) {
     if (result.missing_info) {
         html += `
             <div class="missing-info">
-                <strong>⚠️ Note:</strong> ${result.missing_info}
+                <strong>⚠️ Note:</strong> ${escapeHtml(result.missing_info)}
+            </div>
+        `;
+    }
+    
+    // Add cache note if the result was reused
+    if (result.cache_note) {
+        html += `
+            <div class="cache-note">
+                <strong>♻️ Reused:</strong> ${escapeHtml(result.cache_note)}
+            </div>
+        `;
+    }
+    
+    // Quotes and figures of the answer, checked against the document
+    if (result.citations) {
+        const items = [
+            ...result.citations.verified.map(c =>
+                `<li class="verified">✓ ${escapeHtml(c.text)} <span class="citation-page">(page ${c.page})</span></li>`),
+            ...result.citations.unverified.map(c =>
+                `<li class="unverified">✗ ${escapeHtml(c.text)} <span class="citation-page">(not found in the document)</span></li>`)
+        ];
+        if (items.length) {
+            html += `
+                <div class="citations">
+                    <strong>Citations checked:</strong>
+                    <ul>${items.join('')}</ul>
+                </div>
+            `;
+        }
+    }
+    
+    // List the lines in which a near-duplicate differs from the earlier document
+    if (result.near_duplicate && result.near_duplicate.changes) {
+        const changes = result.near_duplicate.changes
+            .map(line => `<li class="${line.startsWith('+') ? 'added' : 'removed'}">${escapeHtml(line)}</li>`)
+            .join('');
+        html += `
+            <div class="near-duplicate">
+                <strong>Changes from the earlier document:</strong>
+                <ul>${changes}</ul>
             </div>
         `;
     }
@@ -364,6 +452,12 @@ function formatFileSize(bytes) {
     return Math.round(bytes / Math.pow(k, i) * 100) / 100 + ' ' + sizes[i];
 }
 
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
 function showError(message) {
     alert(message); // In production, use a nicer toast notification
 }
@@ -402,6 +496,9 @@ function resetForm() {
     // Clear query
     document.getElementById('queryInput').value = '';
     
+    // Start a new trace for the next analysis
+    state.traceId = newTraceId();
+    
     // Hide results
     document.getElementById('resultsSection').style.display = 'none';
     
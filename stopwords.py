@@ -0,0 +1,17 @@
+"""
+Stopwords for DIA question and search terms.
+One list of English and Odia function and question words, shared by corpus
+search and the page index so they agree on which words of a query to look for.
+The semantic answer cache keeps its own, narrower list.
+"""
+
+# Negations ("not", "no", "except") are deliberately absent: passages that
+# state an exception should still match
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'did', 'do', 'does', 'for', 'from',
+    'has', 'have', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'of', 'on', 'or', 'that', 'the', 'their',
+    'there', 'these', 'this', 'to', 'was', 'we', 'were', 'what', 'when', 'where', 'which', 'who', 'whom',
+    'why', 'will', 'with', 'about', 'please', 'tell', 'give', 'list', 'show', 'say', 'says', 'said',
+    'state', 'states', 'mention', 'mentioned', 'document', 'documents', 'notice', 'page', 'pages', 'ki',
+    'କଣ', "କ'ଣ", 'କି', 'ଏହି', 'ଓ', 'ଏବଂ', 'ର', 'ରେ', 'ପୃଷ୍ଠା'
+})
@@ -0,0 +1,228 @@
+"""
+Upload storage management for DIA.
+Keeps the upload folder under a byte quota. A background thread scans the
+folder a small batch of entries at a time and evicts expired (TTL) and least
+recently used uploads together with their derived caches, so requests never
+wait on a directory scan and a full disk never takes the service down.
+"""
+
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+class UploadStore:
+    """Byte quota with LRU/TTL eviction for the upload folder."""
+
+    def __init__(self):
+        self.folder: Optional[Path] = None
+        self.max_bytes = 0
+        self.ttl = 0.0
+        self.grace = 300.0
+        self.batch = 500
+        self.interval = 30.0
+        self.on_evict: Optional[Callable[[str], None]] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # path -> (size, last used); sizes are kept current by the sweep and by add()
+        self._files: Dict[str, Tuple[int, float]] = {}
+        self._total = 0
+        self._scan = None
+        self._seen: set = set()
+        self._sweeper_pid = None
+        self._evicted = 0
+        self._evicted_bytes = 0
+        self._passes = 0
+
+    def configure(self, folder: str, max_bytes: int, ttl: float = 0.0, grace: float = 300.0,
+                  batch: int = 500, interval: float = 30.0,
+                  on_evict: Optional[Callable[[str], None]] = None) -> None:
+        """Manage a folder; ttl=0 disables expiry, max_bytes=0 disables the quota."""
+        self.folder = Path(folder).resolve()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.grace = grace
+        self.batch = batch
+        self.interval = interval
+        self.on_evict = on_evict
+
+    def manages(self, path: str) -> bool:
+        """Whether a file lives in the managed folder."""
+        return self.folder is not None and Path(path).resolve().parent == self.folder
+
+    def add(self, path: str) -> None:
+        """Account for a newly saved upload; wakes the sweeper if over quota."""
+        self._ensure_sweeper()
+        path = str(Path(path).resolve())
+        now = time.time()
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            old = self._files.get(path)
+            self._total += size - (old[0] if old else 0)
+            self._files[path] = (size, now)
+            over = self.max_bytes and self._total > self.max_bytes
+        if over:
+            self._wake.set()
+
+    def touch(self, path: str) -> None:
+        """Mark an upload as used (sets its atime, so recency survives restarts)."""
+        if not self.manages(path):
+            return
+        path = str(Path(path).resolve())
+        now = time.time()
+        try:
+            os.utime(path, (now, os.stat(path).st_mtime))
+        except OSError:
+            return
+        with self._lock:
+            if path in self._files:
+                self._files[path] = (self._files[path][0], now)
+
+    def _ensure_sweeper(self) -> None:
+        """Start the sweep thread once per process (threads do not survive fork())."""
+        if self.folder is None:
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            self._scan = None
+        threading.Thread(target=self._run, name='dia-upload-sweeper', daemon=True).start()
+
+    def start(self) -> None:
+        """Begin background sweeping."""
+        self._ensure_sweeper()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.sweep_step()
+            except OSError:
+                # Sweeping must never crash the worker (e.g. folder removed)
+                pass
+
+    def sweep_step(self) -> int:
+        """Scan the next batch of entries, then evict. Returns the number evicted."""
+        self._scan_batch()
+        return self._evict()
+
+    def _scan_batch(self) -> None:
+        if self._scan is None:
+            self._scan = os.scandir(self.folder)
+            self._seen = set()
+
+        scanned = {}
+        done = False
+        for _ in range(self.batch):
+            entry = next(self._scan, None)
+            if entry is None:
+                done = True
+                break
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    scanned[str(Path(entry.path).resolve())] = (stat.st_size, max(stat.st_atime, stat.st_mtime))
+            except OSError:
+                continue
+
+        with self._lock:
+            for path, (size, used) in scanned.items():
+                old = self._files.get(path)
+                self._total += size - (old[0] if old else 0)
+                # Keep in-process recency if it is newer than the filesystem's
+                self._files[path] = (size, max(used, old[1]) if old else used)
+            self._seen.update(scanned)
+            unseen = [p for p in self._files if p not in self._seen] if done else []
+        if not done:
+            return
+
+        self._scan.close()
+        self._scan = None
+        # Forget files deleted behind our back since the last full pass
+        gone = [path for path in unseen if not os.path.exists(path)]
+        with self._lock:
+            for path in gone:
+                if path in self._files:
+                    self._total -= self._files.pop(path)[0]
+            self._passes += 1
+
+    def ensure_room(self, nbytes: int) -> bool:
+        """
+        Make room for an upload of nbytes, evicting right away if the sweeper
+        has fallen behind. False if the quota is taken by uploads in use.
+        """
+        if not self.max_bytes:
+            return True
+        with self._lock:
+            if self._total + nbytes <= self.max_bytes:
+                return True
+        self._evict(reserve=nbytes)
+        with self._lock:
+            return self._total + nbytes <= self.max_bytes
+
+    def _evict(self, reserve: int = 0) -> int:
+        """Remove expired uploads, then least recently used ones down to 90% of the quota."""
+        now = time.time()
+        with self._lock:
+            # Over the quota: evict down to 90% of it, so eviction does not run on every upload
+            over_quota = self.max_bytes and self._total + reserve > self.max_bytes
+            if not self.ttl and not over_quota:
+                return 0
+            candidates = sorted(
+                ((used, path, size) for path, (size, used) in self._files.items() if now - used > self.grace)
+            )
+            victims = []
+            total = self._total + reserve
+            for used, path, size in candidates:
+                expired = self.ttl and now - used > self.ttl
+                over = over_quota and total > self.max_bytes * 0.9
+                if not (expired or over):
+                    # Oldest first: nothing newer is expired, and the quota is met
+                    break
+                victims.append(path)
+                total -= size
+
+        evicted = 0
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            with self._lock:
+                size = self._files.pop(path, (0, 0))[0]
+                self._total -= size
+                self._evicted += 1
+                self._evicted_bytes += size
+            evicted += 1
+            if self.on_evict:
+                try:
+                    self.on_evict(path)
+                except Exception:
+                    pass
+        return evicted
+
+    def stats(self) -> Dict:
+        """Tracked usage and eviction counters for this process."""
+        with self._lock:
+            return {
+                'folder': str(self.folder) if self.folder else None,
+                'files': len(self._files),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'evicted_files': self._evicted,
+                'evicted_bytes': self._evicted_bytes,
+                'full_passes': self._passes
+            }
+
+
+upload_store = UploadStore()
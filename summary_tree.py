@@ -0,0 +1,174 @@
+"""
+Hierarchical summary trees for DIA.
+A long document's section summaries are rolled up level by level into a
+single root summary. The tree is built once (in the background when the LLM
+is idle) and shared by all workers, so summaries are read straight from it
+and questions are answered from the few sections the tree routes them to
+instead of the whole document.
+"""
+
+import os
+import time
+import queue
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from answer_cache import cosine, question_vector
+
+# Target children per node; groups end at content-defined points so an
+# amendment only changes the nodes above the sections it touches
+FANOUT = 4
+
+
+def node_key(child_keys: List[str]) -> str:
+    """Content hash of an interior node, from its children's keys."""
+    return hashlib.sha256('|'.join(child_keys).encode('utf-8')).hexdigest()[:32]
+
+
+def group_children(keys: List[str], fanout: int = FANOUT) -> List[List[int]]:
+    """
+    Split one level into consecutive groups of 2 to 2*fanout nodes.
+
+    A group ends after a node whose key hashes to 0 mod fanout, so the
+    grouping of unchanged nodes survives insertions elsewhere.
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    for i, key in enumerate(keys):
+        current.append(i)
+        if len(current) >= 2 * fanout or (len(current) >= 2 and int(key[:4], 16) % fanout == 0):
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+class SummaryTree:
+    """
+    Summary levels of one document; levels[0] are the sections, the last level is the root.
+
+    Each node is {'key', 'summary', 'start', 'end', 'children'}, where start/end
+    are the (inclusive) section indexes it covers and children index the level below.
+    """
+
+    def __init__(self, doc_id: str, levels: List[List[Dict]]):
+        self.doc_id = doc_id
+        self.levels = levels
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SummaryTree':
+        return cls(data['doc_id'], data['levels'])
+
+    def to_dict(self) -> Dict:
+        return {'doc_id': self.doc_id, 'levels': self.levels}
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1][0]['summary']
+
+    @property
+    def sections(self) -> int:
+        return len(self.levels[0])
+
+    def outline(self, max_chars: int) -> str:
+        """The most detailed level whose summaries fit in max_chars (the root if none does)."""
+        for level in self.levels[:-1]:
+            text = '\n\n'.join(node['summary'] for node in level)
+            if len(text) <= max_chars:
+                return text
+        return self.root
+
+    def route(self, query: str, section_texts: List[str], beam: int = 2, leaves: int = 3) -> List[int]:
+        """
+        Sections relevant to a query, found by walking down from the root.
+
+        Nodes are scored by similarity of the query to their summary plus the
+        best score of a section they cover (so details a summary dropped still
+        count). The best `beam` nodes are expanded at each level. Returns
+        section indexes in document order; empty if nothing matches.
+        """
+        vector = question_vector(query)
+        leaf_scores = [
+            cosine(vector, question_vector(node['summary'])) + cosine(vector, question_vector(text))
+            for node, text in zip(self.levels[0], section_texts)
+        ]
+
+        def score(node: Dict, level: int) -> float:
+            if level == 0:
+                return leaf_scores[node['start']]
+            best = max(leaf_scores[node['start']:node['end'] + 1])
+            return cosine(vector, question_vector(node['summary'])) + best
+
+        frontier = [self.levels[-1][0]]
+        for level in range(len(self.levels) - 2, -1, -1):
+            children = [child for node in frontier for child in node['children']]
+            ranked = sorted(children, key=lambda i: score(self.levels[level][i], level), reverse=True)
+            keep = leaves if level == 0 else beam
+            frontier = [self.levels[level][i] for i in ranked[:keep]]
+
+        return sorted(node['start'] for node in frontier if leaf_scores[node['start']] > 0)
+
+
+class IdleBuilder:
+    """Background queue that builds trees one document at a time while the LLM is otherwise idle."""
+
+    def __init__(self, build: Callable[[str, str], None], idle: Callable[[], bool],
+                 poll_interval: float = 1.0, max_pending: int = 1000):
+        self.build = build
+        self.idle = idle
+        self.poll_interval = poll_interval
+        self._queue: 'queue.Queue[Tuple[str, str]]' = queue.Queue(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._worker_pid: Optional[int] = None
+        self.built = 0
+        self.failed = 0
+
+    def schedule(self, kind: str, value: str) -> bool:
+        """Queue a document handle (kind, value). Returns False if already queued or the queue is full."""
+        document = (kind, value)
+        with self._lock:
+            if document in self._pending:
+                return False
+            self._pending.add(document)
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(document)
+            return False
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self) -> None:
+        """Start the worker thread once per process (threads do not survive fork())."""
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+        threading.Thread(target=self._run, name='dia-summary-tree', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            document = self._queue.get()
+            # Leave the LLM to requests (including the one that queued this document);
+            # batch priority keeps later calls behind them too
+            time.sleep(self.poll_interval)
+            while not self.idle():
+                time.sleep(self.poll_interval)
+            try:
+                self.build(*document)
+                self.built += 1
+            except Exception:
+                # A failed build must never stop the worker; the next request can retry
+                self.failed += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(document)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {'pending': pending, 'built': self.built, 'failed': self.failed}
@@ -0,0 +1,45 @@
+import pytest
+
+from answer_cache import SemanticAnswerCache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def answer_cache(tmp_path):
+    return SemanticAnswerCache(SharedCache(str(tmp_path / 'shared_cache.db')), str(tmp_path / 'answers'))
+
+
+def remember(cache, question, output):
+    cache.store('doc', 'qa', 'english', question, {'output': output, 'missing_info': ''})
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('Who signed the order?', 'When was the order signed?'),
+    ('Who issued the circular?', 'Why was the circular issued?'),
+    ('Where was the meeting held?', 'How was the meeting held?'),
+    ('Who approved the budget?', 'What approved the budget?'),
+])
+def test_questions_differing_only_by_wh_word_miss(answer_cache, stored, asked):
+    remember(answer_cache, stored, 'earlier answer')
+    assert answer_cache.lookup('doc', 'qa', 'english', asked) is None
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('What is the last date?', 'deadline?'),
+    ('Who can apply?', 'Who is eligible?'),
+    ('When was the order signed?', 'When was this order signed?'),
+])
+def test_paraphrases_hit(answer_cache, stored, asked):
+    remember(answer_cache, stored, 'earlier answer')
+    entry, _ = answer_cache.lookup('doc', 'qa', 'english', asked)
+    assert entry['output'] == 'earlier answer'
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('Who is eligible?', 'Who is not eligible?'),
+    ('What is the phone number?', 'What is the email address?'),
+    ('What is the fee on page 4?', 'What is the fee?'),
+])
+def test_different_content_words_miss(answer_cache, stored, asked):
+    remember(answer_cache, stored, 'earlier answer')
+    assert answer_cache.lookup('doc', 'qa', 'english', asked) is None
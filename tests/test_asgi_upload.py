@@ -0,0 +1,36 @@
+import os
+
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+
+BOUNDARY = 'dia-test-boundary'
+
+
+@pytest.fixture
+def client():
+    return TestClient(asgi.app)
+
+
+def multipart(filename, chunks):
+    yield (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+           'Content-Type: text/plain\r\n\r\n').encode()
+    yield from chunks
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def test_declared_oversized_upload_is_rejected_before_reading(client):
+    response = client.post('/api/upload', files={'file': ('big.txt', b'x' * (asgi.MAX_FILE_SIZE + 1))})
+    assert response.status_code == 413
+    assert not os.path.exists(os.path.join(asgi.UPLOAD_FOLDER, 'big.txt'))
+
+
+def test_chunked_upload_stops_once_past_the_limit(client):
+    chunk = b'x' * (1024 * 1024)
+    chunks = (chunk for _ in range(asgi.MAX_FILE_SIZE // len(chunk) + 2))
+    # A generator body is sent chunked, without Content-Length
+    response = client.post('/api/upload', content=multipart('big.txt', chunks),
+                           headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+    assert response.status_code == 413
+    assert not os.path.exists(os.path.join(asgi.UPLOAD_FOLDER, 'big.txt'))
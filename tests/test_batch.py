@@ -0,0 +1,40 @@
+import json
+
+import batch
+
+
+def write_manifest(folder, *jobs):
+    manifest = folder / 'jobs.jsonl'
+    manifest.write_text(''.join(json.dumps(job) + '\n' for job in jobs), encoding='utf-8')
+    return str(manifest)
+
+
+def test_string_paths_resolve_against_the_manifest_folder(tmp_path):
+    (tmp_path / 'archive').mkdir()
+    (tmp_path / 'archive' / '101.txt').write_text('Applications close on 5 May.', encoding='utf-8')
+    manifest = write_manifest(tmp_path, {'task': 'qa', 'document_1': 'archive/101.txt', 'query': 'deadline?'})
+
+    [job] = batch.load_jobs(manifest, {'language': 'en'})
+    assert job['document_1'] == {'path': str(tmp_path / 'archive' / '101.txt')}
+    assert batch.validate_job(job) is None
+
+
+def test_missing_file_fails_the_job_instead_of_becoming_text(tmp_path):
+    manifest = write_manifest(
+        tmp_path,
+        {'task': 'qa', 'document_1': 'archive/101.pdf', 'query': 'deadline?'},
+        {'task': 'compare', 'document_1': 'Inline text.', 'document_2': 'Other text.',
+         'documents': [{'path': 'archive/102.docx'}]},
+    )
+
+    first, second = batch.load_jobs(manifest, {'language': 'en'})
+    assert batch.validate_job(first) == f"document_1: File not found: {tmp_path / 'archive' / '101.pdf'}"
+    assert batch.validate_job(second) == f"documents[0]: File not found: {tmp_path / 'archive' / '102.docx'}"
+
+
+def test_inline_text_stays_text(tmp_path):
+    manifest = write_manifest(tmp_path, {'task': 'qa', 'document_1': 'Applications close on 5 May.', 'query': 'deadline?'})
+
+    [job] = batch.load_jobs(manifest, {'language': 'en'})
+    assert job['document_1'] == 'Applications close on 5 May.'
+    assert batch.validate_job(job) is None
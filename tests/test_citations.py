@@ -0,0 +1,47 @@
+from citations import CitationIndex, figures, verify
+
+DOCUMENT = (
+    "Circular No. 4471 dated 12.03.2025. The office opens at 10:00 and closes at 5:30. "
+    "There are 3 counters for applications and 12 staff on duty. "
+    + "Applicants should read the instructions carefully and keep copies of every document they submit. " * 4
+    + "Applications must be submitted before 31 March 2025 with a fee of Rs. 1,200. "
+    + "Late applications attract a penalty of Rs. 250 per day. "
+)
+
+
+def texts(citations, kind):
+    return [c['text'] for c in citations[kind]]
+
+
+def test_invented_figure_next_to_a_verified_quote_is_flagged():
+    # "1" and "3" appear elsewhere in the document, but not next to the quoted passage
+    answer = 'The notice says "Applications must be submitted before 31 March 2025", so there is 1 day left across 3 counters.'
+    citations = verify(answer, CitationIndex(DOCUMENT))
+
+    assert texts(citations, 'verified') == ['Applications must be submitted before 31 March 2025', '31', '2025']
+    assert texts(citations, 'unverified') == ['1', '3']
+
+
+def test_figure_next_to_its_quote_is_verified():
+    answer = 'The fee is Rs. 1,200: "Applications must be submitted before 31 March 2025 with a fee".'
+    citations = verify(answer, CitationIndex(DOCUMENT))
+
+    assert '1,200' in texts(citations, 'verified')
+    assert citations['unverified'] == []
+
+
+def test_trivial_figures_without_a_quote_are_not_verified():
+    citations = verify('The office opens at 9:00 with 7 counters and a fee of Rs. 1,200.', CitationIndex(DOCUMENT))
+
+    assert texts(citations, 'verified') == ['1,200']
+    assert citations['unverified'] == []
+
+
+def test_invented_figure_without_a_quote_is_flagged():
+    citations = verify('The penalty is Rs. 350 per day.', CitationIndex(DOCUMENT))
+
+    assert texts(citations, 'unverified') == ['350']
+
+
+def test_times_are_one_figure():
+    assert figures('Opens at 3:00, closes at 17:30 on page 4.') == ['3:00', '17:30']
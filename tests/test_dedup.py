@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from dedup import MinHashIndex
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def index(tmp_path):
+    return MinHashIndex(SharedCache(str(tmp_path / 'shared_cache.db')))
+
+
+def circular(seed, words=3000):
+    rng = random.Random(seed)
+    vocabulary = [f'word{i}' for i in range(2000)]
+    return [rng.choice(vocabulary) for _ in range(words)]
+
+
+def test_identical_documents_have_identical_signatures(index):
+    text = ' '.join(circular(1))
+    assert index.signature(text) == index.signature(text)
+    assert index.similarity(index.signature('Notice'), index.signature('notice')) == 1.0
+
+
+def test_reissued_document_is_a_near_duplicate(index):
+    words = circular(1)
+    reissued = ['No. 102/2025', 'dated 5 May 2025'] + words[2:]
+    index.add('old', index.signature(' '.join(words)))
+
+    matches = index.find_similar(index.signature(' '.join(reissued)))
+    assert [doc_id for doc_id, _ in matches] == ['old']
+
+
+def test_unrelated_documents_do_not_match(index):
+    index.add('old', index.signature(' '.join(circular(1))))
+    assert index.find_similar(index.signature(' '.join(circular(2)))) == []
+    assert index.similarity(index.signature('a b c d'), index.signature('w x y z')) == 0.0
@@ -0,0 +1,188 @@
+"""
+Lightweight request tracing for DIA.
+Nested spans (upload, process, document loading, parsing, LLM calls) carry a
+trace ID propagated from the browser via the X-Trace-Id header, so an upload
+can be linked to the process call that follows it. Finished spans are
+appended to a JSON-lines file, either flat or as OTLP/JSON export requests.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+OFF = 'off'
+JSONL = 'jsonl'
+OTLP = 'otlp'
+
+_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+# W3C traceparent: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$')
+
+_current_span = contextvars.ContextVar('dia_span', default=None)
+_current_trace = contextvars.ContextVar('dia_trace', default=None)
+
+
+def trace_id_from_headers(headers) -> str:
+    """Incoming trace ID (X-Trace-Id or traceparent), or a new one."""
+    trace_id = (headers.get('X-Trace-Id') or '').strip().lower().replace('-', '')
+    if _TRACE_ID.match(trace_id):
+        return trace_id
+    match = _TRACEPARENT.match((headers.get('traceparent') or '').strip().lower())
+    return match.group(1) if match else uuid.uuid4().hex
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        """Add attributes (bytes, pages, tokens, model, ...)."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+    def to_otlp(self) -> Dict:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Creates spans and appends finished ones to a JSON-lines file."""
+
+    def __init__(self):
+        self.mode = OFF
+        self.path: Optional[str] = None
+        self.max_bytes = 50 * 1024 * 1024
+        self.service = 'dia'
+        self._lock = threading.Lock()
+
+    def configure(self, mode: str = OFF, path: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024) -> None:
+        """Select the exporter: off, jsonl or otlp."""
+        if mode not in (OFF, JSONL, OTLP):
+            raise ValueError(f"Invalid trace export: {mode}. Must be one of: {OFF}, {JSONL}, {OTLP}")
+        self.mode = mode
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def begin(trace_id: str) -> contextvars.Token:
+        """Join a trace until end() is called with the returned token."""
+        return _current_trace.set(trace_id)
+
+    @staticmethod
+    def end(token: contextvars.Token) -> None:
+        """Leave the trace joined by begin()."""
+        _current_trace.reset(token)
+
+    @contextmanager
+    def trace(self, trace_id: str):
+        """Run the block as part of the given trace."""
+        token = self.begin(trace_id)
+        try:
+            yield trace_id
+        finally:
+            self.end(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the block as a child of the current span."""
+        if self.mode == OFF:
+            yield _NOOP
+            return
+
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else (_current_trace.get() or uuid.uuid4().hex)
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        if self.mode == OTLP:
+            record = {'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service}}]},
+                'scopeSpans': [{'scope': {'name': self.service}, 'spans': [span.to_otlp()]}]
+            }]}
+        else:
+            record = span.to_dict()
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+        with self._lock:
+            try:
+                path = Path(self.path)
+                if path.exists() and path.stat().st_size > self.max_bytes:
+                    # Keep one rotated file so the directory stays bounded
+                    os.replace(path, f"{path}.1")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                # Tracing must never fail a request (e.g. read-only filesystems)
+                pass
+
+
+tracer = Tracer()
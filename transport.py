@@ -0,0 +1,126 @@
+"""
+Record/replay transport for DIA LLM calls.
+In record mode every successful LLM call is appended, with its latency, to a
+JSONL cassette; in replay mode calls are answered from the cassette without a
+network or API key, either at the recorded latency or instantly. This makes
+parser, prompt and serving benchmarks reproducible offline.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from persistence import json_fingerprint
+
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+
+MODES = (LIVE, RECORD, REPLAY)
+
+# Returned (in the agent's usual error format) when a replayed prompt was never recorded
+REPLAY_MISS = "Error calling LLM: no recorded response for this prompt in the cassette"
+
+
+def request_key(model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+    """Identity of an LLM request inside a cassette."""
+    return json_fingerprint([model, round(temperature, 3), system_prompt, user_prompt])
+
+
+class LLMTransport:
+    """Live, record or replay transport for LLM calls."""
+
+    def __init__(self, mode: str = LIVE, cassette_path: Optional[str] = None, replay_latency: str = 'recorded'):
+        if mode not in MODES:
+            raise ValueError(f"Invalid LLM transport: {mode}. Must be one of: {', '.join(MODES)}")
+        if mode != LIVE and not cassette_path:
+            raise ValueError(f"LLM transport '{mode}' requires a cassette path")
+
+        self.mode = mode
+        self.cassette_path = cassette_path
+        self.replay_latency = replay_latency != 'instant'
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._stats = {'recorded': 0, 'replayed': 0, 'misses': 0}
+        if mode == REPLAY:
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self) -> None:
+        try:
+            with open(self.cassette_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry['key']].append(entry)
+        except OSError:
+            pass
+
+    def record(self, model: str, temperature: float, system_prompt: str, user_prompt: str,
+               output: str, elapsed: float) -> None:
+        """Append one successful call to the cassette."""
+        entry = {
+            'key': request_key(model, temperature, system_prompt, user_prompt),
+            'model': model,
+            'temperature': temperature,
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt,
+            'output': output,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'recorded_at': time.time()
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            Path(self.cassette_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cassette_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._stats['recorded'] += 1
+
+    def _next(self, model: str, temperature: float, system_prompt: str, user_prompt: str) -> Optional[Dict]:
+        """Next recording for a request; repeated prompts cycle through their takes."""
+        key = request_key(model, temperature, system_prompt, user_prompt)
+        with self._lock:
+            takes = self._entries.get(key)
+            if not takes:
+                self._stats['misses'] += 1
+                return None
+            entry = takes[self._cursor[key] % len(takes)]
+            self._cursor[key] += 1
+            self._stats['replayed'] += 1
+            return entry
+
+    def replay(self, model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+        """Serve a recorded response (blocking)."""
+        entry = self._next(model, temperature, system_prompt, user_prompt)
+        if entry is None:
+            return REPLAY_MISS
+        if self.replay_latency:
+            time.sleep(entry['elapsed_ms'] / 1000)
+        return entry['output']
+
+    async def replay_async(self, model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+        """Serve a recorded response without blocking the event loop."""
+        entry = self._next(model, temperature, system_prompt, user_prompt)
+        if entry is None:
+            return REPLAY_MISS
+        if self.replay_latency:
+            await asyncio.sleep(entry['elapsed_ms'] / 1000)
+        return entry['output']
+
+    def stats(self) -> Dict:
+        """Mode and record/replay counters."""
+        with self._lock:
+            return {'mode': self.mode, 'cassette': self.cassette_path, **self._stats}